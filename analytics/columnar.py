@@ -0,0 +1,240 @@
+# Колоночный снимок заказов для аналитических запросов.
+# Таблицы:
+# orders: order_id, user_id, order_date (datetime64[D]), total (float64)
+# order_items: order_id, product_id, quantity (int64)
+# products: product_id, name, price (float64), category
+# ID и строки хранятся в словарном кодировании: колонка содержит целочисленные коды,
+# а словарь — исходные значения. ID одной сущности кодируются общим словарём во всех таблицах,
+# поэтому соединения выполняются по целочисленным кодам.
+#
+# Формат на диске (каталог):
+# meta.json — список таблиц и колонок;
+# <table>/<column>.npy — значения или коды; <table>/<column>.dict.npy — словарь колонки.
+# Файлы открываются через np.load(mmap_mode="r").
+import json
+import logging
+import os
+import numpy as np
+
+from analytics.storage import IdIndex, save_arrays, load_array
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+AGGREGATES = ("sum", "count", "mean", "min", "max")
+
+
+def _encode_strings(values):
+    values = np.asarray(["" if value is None else str(value) for value in values], dtype=np.str_)
+    dictionary, codes = np.unique(values, return_inverse=True)
+    return codes.astype(np.int32), dictionary
+
+
+def _to_date(value):
+    if value is None:
+        return np.datetime64("NaT", "D")
+    return np.datetime64(str(value)[:10], "D")
+
+
+def _to_float(value):
+    return np.nan if value is None else float(value)
+
+
+class Table:
+    def __init__(self, columns, dictionaries=None):
+        self.columns = dict(columns)
+        self.dictionaries = dict(dictionaries or {})
+        lengths = {len(column) for column in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Колонки таблицы имеют разную длину: {lengths}")
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def decoded(self, name):
+        column = self.columns[name]
+        dictionary = self.dictionaries.get(name)
+        return column if dictionary is None else np.asarray(dictionary)[column]
+
+    def _take(self, rows):
+        return Table({name: np.asarray(column)[rows] for name, column in self.columns.items()}, self.dictionaries)
+
+    def filter(self, mask):
+        return self._take(np.asarray(mask, dtype=bool))
+
+    def where(self, name, value):
+        dictionary = self.dictionaries.get(name)
+        if dictionary is None:
+            return self.filter(self.columns[name] == value)
+        codes = np.flatnonzero(np.asarray(dictionary) == value)
+        return self.filter(np.isin(self.columns[name], codes))
+
+    def between(self, name, low, high):
+        column = self.columns[name]
+        return self.filter((column >= low) & (column <= high))
+
+    def group_by(self, keys, aggregations):
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        stacked = np.stack([np.asarray(self.columns[key]) for key in keys], axis=1)
+        if np.issubdtype(stacked.dtype, np.datetime64):
+            stacked = stacked.astype(np.int64)
+        unique, inverse = np.unique(stacked, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        groups = len(unique)
+
+        columns = {key: unique[:, position].astype(self.columns[key].dtype) for position, key in enumerate(keys)}
+        counts = np.bincount(inverse, minlength=groups)
+        for output, (name, function) in aggregations.items():
+            if function not in AGGREGATES:
+                raise ValueError(f"Неизвестная агрегатная функция {function}, допустимые: {AGGREGATES}")
+            if function == "count":
+                columns[output] = counts
+                continue
+            values = np.asarray(self.columns[name], dtype=np.float64)
+            if function in ("sum", "mean"):
+                sums = np.bincount(inverse, weights=values, minlength=groups)
+                columns[output] = sums if function == "sum" else sums / counts
+            else:
+                result = np.full(groups, np.inf if function == "min" else -np.inf)
+                (np.minimum if function == "min" else np.maximum).at(result, inverse, values)
+                columns[output] = result
+        dictionaries = {key: self.dictionaries[key] for key in keys if key in self.dictionaries}
+        return Table(columns, dictionaries)
+
+    def top_k(self, name, k, ascending=False):
+        values = np.asarray(self.columns[name])
+        k = min(k, len(values))
+        if k == 0:
+            return self._take(np.arange(0))
+        ranked = values if ascending else -values
+        selected = np.argpartition(ranked, k - 1)[:k]
+        return self._take(selected[np.argsort(ranked[selected], kind="stable")])
+
+    def join(self, other, left_on, right_on=None):
+        right_on = right_on or left_on
+        right_keys = np.asarray(other.columns[right_on])
+        order = np.argsort(right_keys, kind="stable")
+        sorted_keys = right_keys[order]
+        left_keys = np.asarray(self.columns[left_on])
+        positions = np.searchsorted(sorted_keys, left_keys)
+        positions[positions == len(sorted_keys)] = 0
+        matched = sorted_keys[positions] == left_keys if len(sorted_keys) else np.zeros(len(left_keys), dtype=bool)
+
+        left = self.filter(matched)
+        right = other._take(order[positions[matched]])
+        columns = dict(left.columns)
+        dictionaries = dict(left.dictionaries)
+        for name, column in right.columns.items():
+            if name == right_on:
+                continue
+            target = name if name not in columns else f"{name}_right"
+            columns[target] = column
+            if name in right.dictionaries:
+                dictionaries[target] = right.dictionaries[name]
+        return Table(columns, dictionaries)
+
+    def to_rows(self):
+        decoded = {name: self.decoded(name).tolist() for name in self.columns}
+        return [dict(zip(decoded, values)) for values in zip(*decoded.values())]
+
+    def save(self, path):
+        arrays = {name: np.asarray(column) for name, column in self.columns.items()}
+        arrays.update({f"{name}.dict": np.asarray(dictionary) for name, dictionary in self.dictionaries.items()})
+        save_arrays(path, arrays)
+
+    @classmethod
+    def load(cls, path, names, encoded, mmap=True):
+        columns = {name: load_array(path, name, mmap) for name in names}
+        dictionaries = {name: load_array(path, f"{name}.dict", mmap) for name in encoded}
+        return cls(columns, dictionaries)
+
+
+class AnalyticsSnapshot:
+    TABLES = ("orders", "order_items", "products")
+
+    def __init__(self, orders, order_items, products):
+        self.orders = orders
+        self.order_items = order_items
+        self.products = products
+
+    @classmethod
+    def from_client(cls, client):
+        order_ids, user_ids, product_ids = IdIndex(), IdIndex(), IdIndex()
+
+        orders = list(client.iter_orders())
+        order_items = list(client.iter_order_items())
+        products = list(client.iter_products())
+
+        names, names_dictionary = _encode_strings(row[1] for row in products)
+        categories, categories_dictionary = _encode_strings(row[3] for row in products)
+
+        orders_table = Table({
+            "order_id": order_ids.encode_many(row[0] for row in orders),
+            "user_id": user_ids.encode_many(row[1] for row in orders),
+            "order_date": np.array([_to_date(row[2]) for row in orders], dtype="datetime64[D]"),
+            "total": np.array([_to_float(row[3]) for row in orders], dtype=np.float64),
+        })
+        items_table = Table({
+            "order_id": order_ids.encode_many(row[0] for row in order_items),
+            "product_id": product_ids.encode_many(row[1] for row in order_items),
+            "quantity": np.array([row[2] or 0 for row in order_items], dtype=np.int64),
+        })
+        products_table = Table({
+            "product_id": product_ids.encode_many(row[0] for row in products),
+            "name": names,
+            "price": np.array([_to_float(row[2]) for row in products], dtype=np.float64),
+            "category": categories,
+        }, {"name": names_dictionary, "category": categories_dictionary})
+
+        # Словари ID заполняются последними, когда все таблицы уже закодированы
+        for table, ids in ((orders_table, {"order_id": order_ids, "user_id": user_ids}),
+                           (items_table, {"order_id": order_ids, "product_id": product_ids}),
+                           (products_table, {"product_id": product_ids})):
+            table.dictionaries.update({name: index.to_array() for name, index in ids.items()})
+
+        logger.info(f"Колоночный снимок построен: {len(orders_table)} заказов, "
+                    f"{len(items_table)} позиций, {len(products_table)} товаров")
+        return cls(orders_table, items_table, products_table)
+
+    def revenue_by_category(self):
+        sales = self.order_items.join(self.products, "product_id")
+        sales.columns["revenue"] = sales["quantity"] * sales["price"]
+        return sales.group_by("category", {"revenue": ("revenue", "sum")})
+
+    def top_products(self, n, by="quantity"):
+        sales = self.order_items.join(self.products, "product_id")
+        sales.columns["revenue"] = sales["quantity"] * sales["price"]
+        per_product = sales.group_by("product_id", {"quantity": ("quantity", "sum"), "revenue": ("revenue", "sum")})
+        return per_product.top_k(by, n).join(self.products, "product_id")
+
+    def orders_per_day(self, start=None, end=None):
+        orders = self.orders.filter(~np.isnat(self.orders["order_date"]))
+        if start is not None or end is not None:
+            low = np.datetime64(start or "0001-01-01", "D")
+            high = np.datetime64(end or "9999-12-31", "D")
+            orders = orders.between("order_date", low, high)
+        return orders.group_by("order_date", {"orders": ("order_id", "count"), "revenue": ("total", "sum")})
+
+    def save(self, path):
+        meta = {}
+        for name in self.TABLES:
+            table = getattr(self, name)
+            table.save(os.path.join(path, name))
+            meta[name] = {"columns": list(table.columns), "encoded": list(table.dictionaries)}
+        with open(os.path.join(path, "meta.json"), "w") as meta_file:
+            json.dump(meta, meta_file)
+        logger.info(f"Колоночный снимок сохранён в {path}")
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        tables = {
+            name: Table.load(os.path.join(path, name), meta[name]["columns"], meta[name]["encoded"], mmap)
+            for name in cls.TABLES
+        }
+        logger.info(f"Колоночный снимок загружен из {path}")
+        return cls(**tables)
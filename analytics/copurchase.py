@@ -0,0 +1,125 @@
+# Разреженная матрица совместных покупок пользователь × товар.
+# Хранится в двух CSR-представлениях:
+# by_user: строка — пользователь, столбцы — купленные им товары;
+# by_product: строка — товар, столбцы — купившие его пользователи.
+# Количество общих товаров пользователя u со всеми остальными — это by_user[u] @ by_product,
+# т.е. разреженное произведение, затрагивающее только покупателей товаров пользователя u.
+#
+# Снимок на диске (каталог):
+# by_user_indptr.npy, by_user_indices.npy, by_product_indptr.npy, by_product_indices.npy,
+# user_ids.npy, product_ids.npy — открываются через np.load(mmap_mode="r") без перестроения.
+import logging
+import numpy as np
+from scipy import sparse
+
+from analytics.storage import IdIndex, save_arrays, load_array, index_dtype
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+METRICS = ("count", "cosine")
+
+
+class CoPurchaseIndex:
+    def __init__(self, by_user=None, user_ids=None, product_ids=None, by_product=None):
+        self.user_ids = user_ids if user_ids is not None else IdIndex()
+        self.product_ids = product_ids if product_ids is not None else IdIndex()
+        if by_user is None:
+            by_user = sparse.csr_matrix((len(self.user_ids), len(self.product_ids)), dtype=np.int32)
+        self.by_user = by_user
+        self.by_product = by_product if by_product is not None else by_user.T.tocsr()
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        index = cls()
+        index.add_purchases(pairs)
+        return index
+
+    @classmethod
+    def from_client(cls, client):
+        index = cls.from_pairs(client.iter_purchase_pairs())
+        logger.info(f"Матрица совместных покупок построена: {index.by_user.shape[0]} пользователей, "
+                    f"{index.by_user.shape[1]} товаров, {index.by_user.nnz} покупок")
+        return index
+
+    def add_purchases(self, pairs):
+        user_codes = []
+        product_codes = []
+        for user_id, product_id in pairs:
+            user_codes.append(self.user_ids.encode(user_id))
+            product_codes.append(self.product_ids.encode(product_id))
+        if not user_codes:
+            return
+
+        shape = (len(self.user_ids), len(self.product_ids))
+        added = sparse.csr_matrix(
+            (np.ones(len(user_codes), dtype=np.int32), (user_codes, product_codes)), shape=shape
+        )
+        current = self.by_user
+        if current.shape != shape:
+            current = sparse.csr_matrix(
+                (current.data, current.indices, current.indptr.copy()), shape=(current.shape[0], shape[1])
+            )
+            current.resize(shape)
+        by_user = (current + added).tocsr()
+        # Повторная покупка того же товара не увеличивает число общих товаров
+        by_user.data = np.ones(by_user.nnz, dtype=np.int32)
+        by_user.sort_indices()
+        self.by_user = by_user
+        self.by_product = by_user.T.tocsr()
+
+    def _scores(self, code, metric):
+        row = self.by_user[code]
+        scores = (row @ self.by_product).tocsr()
+        users = scores.indices
+        values = scores.data.astype(np.float64)
+        keep = users != code
+        users, values = users[keep], values[keep]
+        if metric == "cosine":
+            degrees = np.diff(self.by_user.indptr)
+            values = values / np.sqrt(float(degrees[code]) * degrees[users])
+        return users, values
+
+    def similar_users(self, user_id, top_k=None, metric="count"):
+        if metric not in METRICS:
+            raise ValueError(f"Неизвестная метрика {metric}, допустимые: {METRICS}")
+        code = self.user_ids.lookup(user_id)
+        if code is None:
+            return []
+
+        users, values = self._scores(code, metric)
+        if top_k is not None and top_k < len(values):
+            selected = np.argpartition(-values, top_k - 1)[:top_k]
+            users, values = users[selected], values[selected]
+        order = np.lexsort((users, -values))
+        if metric == "count":
+            return [(self.user_ids.decode(u), int(v)) for u, v in zip(users[order], values[order])]
+        return [(self.user_ids.decode(u), float(v)) for u, v in zip(users[order], values[order])]
+
+    def save(self, path):
+        index_type = index_dtype(max(self.by_user.nnz, *self.by_user.shape))
+        save_arrays(path, {
+            "by_user_indptr": self.by_user.indptr.astype(index_type),
+            "by_user_indices": self.by_user.indices.astype(index_type),
+            "by_product_indptr": self.by_product.indptr.astype(index_type),
+            "by_product_indices": self.by_product.indices.astype(index_type),
+            "user_ids": self.user_ids.to_array(),
+            "product_ids": self.product_ids.to_array(),
+        })
+        logger.info(f"Снимок матрицы совместных покупок сохранён в {path}")
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        user_ids = IdIndex.from_array(load_array(path, "user_ids", mmap))
+        product_ids = IdIndex.from_array(load_array(path, "product_ids", mmap))
+        shape = (len(user_ids), len(product_ids))
+
+        def csr(prefix, shape):
+            indptr = load_array(path, f"{prefix}_indptr", mmap)
+            indices = load_array(path, f"{prefix}_indices", mmap)
+            data = np.ones(len(indices), dtype=np.int32)
+            return sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+        index = cls(csr("by_user", shape), user_ids, product_ids, csr("by_product", shape[::-1]))
+        logger.info(f"Снимок матрицы совместных покупок загружен из {path}")
+        return index
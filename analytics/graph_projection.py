@@ -0,0 +1,282 @@
+# Проекция графа покупок в память процесса для обходов без запросов к базе.
+# Двудольный граф пользователь — товар хранится в двух CSR-списках смежности NumPy:
+# users: строка — пользователь, соседи — купленные им товары;
+# products: строка — товар, соседи — купившие его пользователи.
+# Связь товар — категория: product_category[код товара] = код категории (-1, если категории нет);
+# обратный индекс категория -> товары строится по требованию.
+# Соседи в строке CSR отсортированы и не повторяются: повторная покупка не добавляет ребро.
+#
+# Обходы (two_hop_users, copurchase_counts, also_bought) собирают соседей второго шага одним gather по
+# индексам CSR. max_degree ограничивает степень промежуточных вершин: товары (или пользователи) с большим
+# числом соседей пропускаются, чтобы хиты продаж и «оптовые» покупатели не давали взрывного fan-out.
+#
+# Добавление рёбер между полными перезагрузками (add_purchases) пишет в буфер delta поверх CSR;
+# обходы учитывают буфер, а compact() перестраивает CSR, когда буфер превышает compact_threshold
+# от числа рёбер (но не раньше COMPACT_MIN_EDGES).
+#
+# Снимок на диске (каталог): users_indptr.npy, users_indices.npy, products_indptr.npy, products_indices.npy,
+# product_category.npy, user_ids.npy, product_ids.npy, category_ids.npy — открываются через
+# np.load(mmap_mode="r") без перестроения.
+import logging
+import numpy as np
+
+from analytics.storage import IdIndex, save_arrays, load_array, index_dtype
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+COMPACT_MIN_EDGES = 10000
+
+
+class Adjacency:
+    """CSR-список смежности одной доли графа с буфером добавленных рёбер."""
+
+    def __init__(self, indptr=None, indices=None):
+        self.indptr = indptr if indptr is not None else np.zeros(1, dtype=np.int64)
+        self.indices = indices if indices is not None else np.zeros(0, dtype=np.int32)
+        self.delta = {}
+        self.delta_size = 0
+
+    @classmethod
+    def from_edges(cls, rows, columns, row_count):
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        order = np.lexsort((columns, rows))
+        rows, columns = rows[order], columns[order]
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+        rows, columns = rows[keep], columns[keep]
+        index_type = index_dtype(max(len(columns), row_count, int(columns.max(initial=0)) + 1))
+        indptr = np.zeros(row_count + 1, dtype=index_type)
+        np.cumsum(np.bincount(rows, minlength=row_count), out=indptr[1:])
+        return cls(indptr, columns.astype(index_type))
+
+    @property
+    def base_rows(self):
+        return len(self.indptr) - 1
+
+    @property
+    def edge_count(self):
+        return len(self.indices) + self.delta_size
+
+    def _base_row(self, code):
+        if code >= self.base_rows:
+            return self.indices[:0]
+        return self.indices[self.indptr[code]:self.indptr[code + 1]]
+
+    def row(self, code):
+        base = self._base_row(code)
+        extra = self.delta.get(code)
+        if not extra:
+            return base
+        return np.concatenate((base, np.fromiter(extra, dtype=base.dtype, count=len(extra))))
+
+    def add(self, row, column):
+        base = self._base_row(row)
+        position = np.searchsorted(base, column)
+        if position < len(base) and base[position] == column:
+            return False
+        extra = self.delta.setdefault(row, set())
+        if column in extra:
+            return False
+        extra.add(column)
+        self.delta_size += 1
+        return True
+
+    def degrees(self, codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        degrees = np.zeros(len(codes), dtype=np.int64)
+        inside = codes < self.base_rows
+        degrees[inside] = self.indptr[codes[inside] + 1] - self.indptr[codes[inside]]
+        if self.delta:
+            degrees += np.fromiter((len(self.delta.get(code, ())) for code in codes.tolist()), dtype=np.int64, count=len(codes))
+        return degrees
+
+    def gather(self, codes):
+        # Соседи всех строк codes подряд; внутри строки без повторов, между строками — с повторами
+        codes = np.asarray(codes, dtype=np.int64)
+        inside = codes[codes < self.base_rows]
+        starts = self.indptr[inside].astype(np.int64)
+        lengths = self.indptr[inside + 1].astype(np.int64) - starts
+        total = int(lengths.sum())
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        parts = [self.indices[offsets].astype(np.int64)]
+        if self.delta:
+            parts += [np.fromiter(self.delta[code], dtype=np.int64) for code in codes.tolist() if code in self.delta]
+        return np.concatenate(parts)
+
+    def edges(self):
+        rows = [np.repeat(np.arange(self.base_rows, dtype=np.int64), np.diff(self.indptr))]
+        columns = [self.indices.astype(np.int64)]
+        for row, extra in self.delta.items():
+            rows.append(np.full(len(extra), row, dtype=np.int64))
+            columns.append(np.fromiter(extra, dtype=np.int64, count=len(extra)))
+        return np.concatenate(rows), np.concatenate(columns)
+
+    def compacted(self, row_count):
+        return Adjacency.from_edges(*self.edges(), row_count)
+
+
+class BipartiteGraph:
+    def __init__(self, users=None, products=None, product_category=None, user_ids=None, product_ids=None,
+                 category_ids=None, compact_threshold=0.1):
+        self.user_ids = user_ids if user_ids is not None else IdIndex()
+        self.product_ids = product_ids if product_ids is not None else IdIndex()
+        self.category_ids = category_ids if category_ids is not None else IdIndex()
+        self.users = users if users is not None else Adjacency()
+        self.products = products if products is not None else Adjacency()
+        self.product_category = product_category if product_category is not None else np.zeros(0, dtype=np.int32)
+        self.compact_threshold = compact_threshold
+        self._categories = None
+
+    @classmethod
+    def from_edges(cls, purchases, product_categories=(), **kwargs):
+        graph = cls(**kwargs)
+        user_codes, product_codes = [], []
+        for user_id, product_id in purchases:
+            user_codes.append(graph.user_ids.encode(user_id))
+            product_codes.append(graph.product_ids.encode(product_id))
+        graph.set_categories(product_categories)
+        graph.users = Adjacency.from_edges(user_codes, product_codes, len(graph.user_ids))
+        graph.products = Adjacency.from_edges(product_codes, user_codes, len(graph.product_ids))
+        return graph
+
+    @classmethod
+    def from_client(cls, client, **kwargs):
+        # Полная загрузка: покупки из iter_purchase_pairs, категории товаров из iter_products
+        categories = [(product[0], product[3]) for product in client.iter_products()]
+        graph = cls.from_edges(client.iter_purchase_pairs(), categories, **kwargs)
+        logger.info(f"Граф покупок загружен: {len(graph.user_ids)} пользователей, {len(graph.product_ids)} товаров, "
+                    f"{graph.users.edge_count} рёбер, {len(graph.category_ids)} категорий")
+        return graph
+
+    def set_categories(self, product_categories):
+        codes = [(self.product_ids.encode(product_id), -1 if category_id is None else self.category_ids.encode(category_id))
+                 for product_id, category_id in product_categories]
+        # Массив мог быть открыт из снимка только для чтения, поэтому изменяется копия
+        product_category = np.full(len(self.product_ids), -1, dtype=np.int32)
+        product_category[:len(self.product_category)] = self.product_category
+        for product_code, category_code in codes:
+            product_category[product_code] = category_code
+        self.product_category = product_category
+        self._categories = None
+
+    def add_purchases(self, pairs):
+        added = 0
+        for user_id, product_id in pairs:
+            user_code = self.user_ids.encode(user_id)
+            product_code = self.product_ids.encode(product_id)
+            if self.users.add(user_code, product_code):
+                self.products.add(product_code, user_code)
+                added += 1
+        if self.users.delta_size > max(COMPACT_MIN_EDGES, self.compact_threshold * len(self.users.indices)):
+            self.compact()
+        return added
+
+    def compact(self):
+        self.users = self.users.compacted(len(self.user_ids))
+        self.products = self.products.compacted(len(self.product_ids))
+        logger.info(f"Граф покупок перестроен: {len(self.users.indices)} рёбер")
+
+    def products_of(self, user_id):
+        code = self.user_ids.lookup(user_id)
+        return [] if code is None else self.product_ids.decode_many(np.sort(self.users.row(code)))
+
+    def buyers_of(self, product_id):
+        code = self.product_ids.lookup(product_id)
+        return [] if code is None else self.user_ids.decode_many(np.sort(self.products.row(code)))
+
+    def category_of(self, product_id):
+        code = self.product_ids.lookup(product_id)
+        if code is None or code >= len(self.product_category) or self.product_category[code] < 0:
+            return None
+        return self.category_ids.decode(self.product_category[code])
+
+    def _categories_of(self, codes):
+        # Товары, добавленные через add_purchases, могут быть за пределами product_category
+        categories = np.full(len(codes), -1, dtype=np.int64)
+        inside = codes < len(self.product_category)
+        categories[inside] = self.product_category[codes[inside]]
+        return categories
+
+    def _category_index(self):
+        if self._categories is None:
+            has_category = np.flatnonzero(self.product_category >= 0)
+            self._categories = Adjacency.from_edges(self.product_category[has_category], has_category, len(self.category_ids))
+        return self._categories
+
+    def products_in_category(self, category_id):
+        code = self.category_ids.lookup(category_id)
+        return [] if code is None else self.product_ids.decode_many(self._category_index().row(code))
+
+    def _two_hop(self, source, target, code, max_degree=None):
+        # Вершины на расстоянии 2 от code и число путей до них (число общих соседей)
+        middle = source.row(code)
+        if max_degree is not None:
+            middle = middle[target.degrees(middle) <= max_degree]
+        codes, counts = np.unique(target.gather(middle), return_counts=True)
+        keep = codes != code
+        return codes[keep], counts[keep]
+
+    @staticmethod
+    def _top(ids, codes, counts, top_k=None):
+        if top_k is not None and top_k < len(counts):
+            selected = np.argpartition(-counts, top_k - 1)[:top_k]
+            codes, counts = codes[selected], counts[selected]
+        order = np.lexsort((codes, -counts))
+        return [(ids.decode(code), int(count)) for code, count in zip(codes[order], counts[order])]
+
+    def two_hop_users(self, user_id, max_degree=None):
+        code = self.user_ids.lookup(user_id)
+        if code is None:
+            return []
+        codes, _ = self._two_hop(self.users, self.products, code, max_degree)
+        return self.user_ids.decode_many(codes)
+
+    def copurchase_counts(self, user_id, top_k=None, max_degree=None):
+        # Пользователи с общими покупками и число общих товаров, по убыванию
+        code = self.user_ids.lookup(user_id)
+        if code is None:
+            return []
+        codes, counts = self._two_hop(self.users, self.products, code, max_degree)
+        return self._top(self.user_ids, codes, counts, top_k)
+
+    def also_bought(self, product_id, top_k=10, max_degree=None, same_category=False):
+        # Товары, которые покупали покупатели product_id, и число таких покупателей
+        code = self.product_ids.lookup(product_id)
+        if code is None:
+            return []
+        codes, counts = self._two_hop(self.products, self.users, code, max_degree)
+        if same_category:
+            categories = self._categories_of(np.append(codes, code))
+            keep = (categories[:-1] == categories[-1]) & (categories[-1] >= 0)
+            codes, counts = codes[keep], counts[keep]
+        return self._top(self.product_ids, codes, counts, top_k)
+
+    def save(self, path):
+        self.compact()
+        save_arrays(path, {
+            "users_indptr": self.users.indptr,
+            "users_indices": self.users.indices,
+            "products_indptr": self.products.indptr,
+            "products_indices": self.products.indices,
+            "product_category": self.product_category,
+            "user_ids": self.user_ids.to_array(),
+            "product_ids": self.product_ids.to_array(),
+            "category_ids": self.category_ids.to_array(),
+        })
+        logger.info(f"Снимок графа покупок сохранён в {path}")
+
+    @classmethod
+    def load(cls, path, mmap=True, **kwargs):
+        graph = cls(
+            Adjacency(load_array(path, "users_indptr", mmap), load_array(path, "users_indices", mmap)),
+            Adjacency(load_array(path, "products_indptr", mmap), load_array(path, "products_indices", mmap)),
+            load_array(path, "product_category", mmap),
+            IdIndex.from_array(load_array(path, "user_ids", mmap)),
+            IdIndex.from_array(load_array(path, "product_ids", mmap)),
+            IdIndex.from_array(load_array(path, "category_ids", mmap)),
+            **kwargs,
+        )
+        logger.info(f"Снимок графа покупок загружен из {path}")
+        return graph
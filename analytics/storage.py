@@ -0,0 +1,72 @@
+import os
+import numpy as np
+
+
+def normalize_id(value):
+    # Целочисленные ID (PostgreSQL) храним как int, остальные (UUID, ObjectId, строки Redis/Neo4j) — как str
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return int(value)
+    return str(value)
+
+
+class IdIndex:
+    """Словарь внешних ID сущностей в плотные целочисленные коды."""
+
+    def __init__(self, values=()):
+        self._values = []
+        self._codes = {}
+        for value in values:
+            self.encode(value)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, value):
+        return normalize_id(value) in self._codes
+
+    def encode(self, value):
+        key = normalize_id(value)
+        code = self._codes.get(key)
+        if code is None:
+            code = len(self._values)
+            self._codes[key] = code
+            self._values.append(key)
+        return code
+
+    def encode_many(self, values):
+        return np.fromiter((self.encode(value) for value in values), dtype=np.int64)
+
+    def lookup(self, value):
+        return self._codes.get(normalize_id(value))
+
+    def decode(self, code):
+        return self._values[code]
+
+    def decode_many(self, codes):
+        return [self._values[code] for code in codes]
+
+    def to_array(self):
+        if all(isinstance(value, int) for value in self._values):
+            return np.asarray(self._values, dtype=np.int64)
+        return np.asarray([str(value) for value in self._values], dtype=np.str_)
+
+    @classmethod
+    def from_array(cls, array):
+        index = cls()
+        index._values = array.tolist()
+        index._codes = {value: code for code, value in enumerate(index._values)}
+        return index
+
+
+def save_arrays(path, arrays):
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+
+
+def load_array(path, name, mmap=True):
+    return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+
+
+def index_dtype(max_value):
+    return np.int32 if max_value < np.iinfo(np.int32).max else np.int64
@@ -0,0 +1,60 @@
+# Сравнение кодеков поля items заказа Redis: размер значения, время кодирования и декодирования.
+# Запуск: python -m benchmark.codec_benchmark [--sizes 1 5 20 100] [--iterations 20000] [--redis]
+# С флагом --redis заказы дополнительно записываются через RedisClient и для них
+# измеряется MEMORY USAGE ключа order:{order_id} (используется база REDIS_DB, она будет очищена).
+import argparse
+import random
+import timeit
+
+from clients.codecs import CODECS, get_codec, decode_items
+
+
+def make_items(size, rng):
+    return [{"product_id": str(rng.randint(1, 1_000_000)), "quantity": rng.randint(1, 5)} for _ in range(size)]
+
+
+def measure_codec(name, items, iterations):
+    codec = get_codec(name)
+    encoded = codec.encode(items)
+    encode_time = timeit.timeit(lambda: codec.encode(items), number=iterations)
+    decode_time = timeit.timeit(lambda: decode_items(encoded), number=iterations)
+    size = len(encoded.encode() if isinstance(encoded, str) else encoded)
+    return size, encode_time / iterations * 1e6, decode_time / iterations * 1e6
+
+
+def measure_redis_memory(name, items, orders=100):
+    from clients.redis_client import RedisClient
+
+    client = RedisClient(codec=name)
+    client.client.flushdb()
+    for order_id in range(orders):
+        client.create_order(str(order_id), "1", items)
+    usage = sum(client.client.memory_usage(f"order:{order_id}") for order_id in range(orders)) / orders
+    client.client.flushdb()
+    return usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение кодеков состава заказа для Redis")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 20, 100])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--redis", action="store_true", help="измерить MEMORY USAGE заказов в Redis")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    header = f"{'codec':<8} {'items':>6} {'bytes':>8} {'encode, us':>11} {'decode, us':>11}"
+    if args.redis:
+        header += f" {'redis, B':>9}"
+    print(header)
+    for size in args.sizes:
+        items = make_items(size, rng)
+        for name in CODECS:
+            encoded_size, encode_us, decode_us = measure_codec(name, items, args.iterations)
+            line = f"{name:<8} {size:>6} {encoded_size:>8} {encode_us:>11.2f} {decode_us:>11.2f}"
+            if args.redis:
+                line += f" {measure_redis_memory(name, items):>9.0f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
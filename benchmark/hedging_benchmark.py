@@ -0,0 +1,150 @@
+# Хеджированные чтения (clients/hedging.py): хвостовые задержки и цена в дополнительных запросах.
+# Одна и та же смесь чтений прогоняется с одинаковым seed в вариантах:
+# - baseline — без хеджирования;
+# - hedged — HedgedClient с задержкой --delay (с) или, без неё, перцентилем --percentile последних задержек;
+# - speculative (только cassandra) — speculative execution драйвера с задержкой --delay (по умолчанию 0.05 с).
+# Для каждого варианта выводятся перцентили задержек, изменение p99 и p99.9 относительно baseline и
+# дополнительная нагрузка — доля запросов, отправленных повторно (для speculative драйвер её не сообщает).
+# Медленные реплики и паузы GC можно имитировать без кластера: --slow-fraction доля вызовов клиента
+# задерживается на --slow-delay секунд, каждый вызов — независимо, как обращение к другой реплике.
+# PostgreSQL не участвует: его клиенты не допускают одновременных вызовов (см. clients/hedging.py).
+# Запуск: python -m benchmark.hedging_benchmark --backend mongodb --duration 30
+#         python -m benchmark.hedging_benchmark --backend cassandra --delay 0.02 --budget 0.05
+#         python -m benchmark.hedging_benchmark --backend redis --slow-fraction 0.02 --slow-delay 0.05
+import argparse
+import functools
+import json
+import logging
+import random
+import time
+
+from benchmark.load_generator import (
+    BACKENDS, PERCENTILES, build_operations, load_backend, load_dataset, parse_mix, run_closed_loop, run_open_loop,
+    warm_up,
+)
+from clients.hedging import HedgedClient, HedgingPolicy
+from clients.tuning import tuning_for
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+HEDGED_BACKENDS = [backend for backend in BACKENDS if not backend.startswith("postgresql")]
+DEFAULT_MIX = "get_orders_by_user_id=40,get_products_by_category_id=40,get_user=10,get_product=10"
+REDIS_MIX = "get_orders_by_user_id=40,get_products_by_category_id=40,get_user=20"
+SPECULATIVE_DELAY = 0.05
+
+
+def build_read_operations(backend, client_class):
+    # Чтения смеси load_generator и чтения одной записи по ключу (у RedisClient нет get_product)
+    operations = {name: operation for name, operation in build_operations(backend).items() if name.startswith("get_")}
+    operations["get_user"] = lambda client, dataset, rng: client.get_user(dataset.user_id(rng))
+    if hasattr(client_class, "get_product"):
+        operations["get_product"] = lambda client, dataset, rng: client.get_product(dataset.product(rng)[0])
+    return operations
+
+
+class SlowClient:
+    # Задерживает долю вызовов методов клиента, имитируя медленную реплику
+    def __init__(self, client, fraction, delay, seed=None):
+        self.client = client
+        self.fraction = fraction
+        self.delay = delay
+        self.rng = random.Random(seed)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute) or not name.startswith("get_"):
+            return attribute
+
+        @functools.wraps(attribute)
+        def slowed(*args, **kwargs):
+            if self.rng.random() < self.fraction:
+                time.sleep(self.delay)
+            return attribute(*args, **kwargs)
+        return slowed
+
+
+def client_factory(client_class, args, policy=None, tuning=None):
+    # Клиент подключается до обёртывания и до начала замеров
+    def create():
+        client = warm_up(args.backend, client_class() if tuning is None else client_class(tuning=tuning))
+        if args.slow_fraction:
+            client = SlowClient(client, args.slow_fraction, args.slow_delay)
+        return HedgedClient(client, policy) if policy is not None else client
+    return create
+
+
+def run(args, factory, operations, weights, dataset):
+    if args.mode == "open":
+        return run_open_loop(factory, operations, weights, dataset, args.qps, args.duration, args.workers or 32, args.seed)
+    return run_closed_loop(factory, operations, weights, dataset, args.duration, args.workers or 8, args.seed)
+
+
+def gain(baseline, value):
+    return (1 - value / baseline) * 100 if baseline else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Хвостовые задержки чтений с хеджированием и без")
+    parser.add_argument("--backend", choices=HEDGED_BACKENDS, required=True)
+    parser.add_argument("--mode", choices=("open", "closed"), default="open")
+    parser.add_argument("--qps", type=float, default=200, help="целевая частота операций в режиме open")
+    parser.add_argument("--duration", type=float, default=30, help="длительность прогона каждого варианта, с")
+    parser.add_argument("--workers", type=int, default=None, help="число потоков (по умолчанию 32 для open, 8 для closed)")
+    parser.add_argument("--mix", default=None, help="веса операций чтения: name=weight,...")
+    parser.add_argument("--delay", type=float, default=None, help="фиксированная задержка второго запроса, с")
+    parser.add_argument("--percentile", type=float, default=95, help="перцентиль задержек для адаптивной задержки")
+    parser.add_argument("--budget", type=float, default=0.1, help="наибольшая доля хеджированных запросов")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="доля вызовов, задерживаемых искусственно")
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="искусственная задержка, с")
+    parser.add_argument("--dataset-limit", type=int, default=10000, help="сколько ID загрузить из базы")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="путь к JSON с результатами")
+    args = parser.parse_args()
+
+    client_class = load_backend(args.backend)
+    operations = build_read_operations(args.backend, client_class)
+    weights = parse_mix(args.mix or (REDIS_MIX if args.backend == "redis" else DEFAULT_MIX), operations)
+    dataset = load_dataset(args.backend, args.dataset_limit)
+
+    variants = [("baseline", None, None), ("hedged", HedgingPolicy(args.delay, args.percentile, budget=args.budget), None)]
+    if args.backend == "cassandra":
+        speculative = dict(tuning_for("cassandra"), speculative_execution={"delay": args.delay or SPECULATIVE_DELAY})
+        variants.append(("speculative", None, speculative))
+
+    rows = []
+    for label, policy, tuning in variants:
+        logger.info(f"Прогон {args.backend}: {label}")
+        try:
+            result = run(args, client_factory(client_class, args, policy, tuning), operations, weights, dataset)
+        finally:
+            if policy is not None:
+                policy.close()
+        total = result.total()
+        rows.append({
+            "label": label,
+            "throughput": result.throughput(),
+            "errors": sum(result.errors.values()),
+            "latency_us": {str(p): value for p, value in total.percentiles(PERCENTILES).items()},
+            "hedging": policy.stats() if policy is not None else None,
+        })
+
+    print(f"{'variant':<12} {'ops/s':>10} {'errors':>7}" + "".join(f" {f'p{p}, ms':>10}" for p in PERCENTILES)
+          + f" {'p99 gain':>9} {'p99.9 gain':>11} {'extra load':>11} {'hedge wins':>11}")
+    baseline = rows[0]["latency_us"]
+    for row in rows:
+        latency, hedging = row["latency_us"], row["hedging"]
+        extra = f"{hedging['extra_load'] * 100:>10.1f}%" if hedging else f"{'-':>11}"
+        wins = f"{hedging['hedge_wins']:>11}" if hedging else f"{'-':>11}"
+        print(f"{row['label']:<12} {row['throughput']:>10.1f} {row['errors']:>7}"
+              + "".join(f" {latency[str(p)] / 1000:>10.2f}" for p in PERCENTILES)
+              + f" {gain(baseline['99'], latency['99']):>+8.1f}% {gain(baseline['99.9'], latency['99.9']):>+10.1f}% {extra} {wins}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(dict(backend=args.backend, mode=args.mode, mix=weights, runs=rows), output_file, indent=2, default=str)
+        logger.info(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
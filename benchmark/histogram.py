@@ -0,0 +1,77 @@
+# Гистограмма задержек в духе HdrHistogram: логарифмически-линейные корзины с фиксированной
+# относительной точностью. Значения (целые микросекунды) до 2^sub_bucket_bits хранятся точно,
+# дальше каждая степень двойки делится на 2^(sub_bucket_bits - 1) равных корзин.
+# При significant_figures=2 относительная ошибка не превышает 1%, а память не зависит от числа измерений.
+# Гистограммы складываются через merge(), поэтому каждый поток пишет в свою и они объединяются в конце.
+import math
+
+
+class Histogram:
+    def __init__(self, significant_figures=2):
+        if not 1 <= significant_figures <= 5:
+            raise ValueError("significant_figures должно быть от 1 до 5")
+        self.significant_figures = significant_figures
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_figures))
+        self.sub_bucket_count = 1 << self.sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count >> 1
+        self.counts = {}
+        self.total_count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self.sub_bucket_count + (shift - 1) * self.sub_bucket_half + (value >> shift) - self.sub_bucket_half
+
+    def _bounds(self, index):
+        # Нижняя и верхняя границы значений, попадающих в корзину index
+        if index < self.sub_bucket_count:
+            return index, index
+        shift, offset = divmod(index - self.sub_bucket_count, self.sub_bucket_half)
+        shift += 1
+        low = (offset + self.sub_bucket_half) << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, value, count=1):
+        value = int(value)
+        if value < 0:
+            raise ValueError(f"Отрицательное значение {value} не может быть записано в гистограмму")
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        if other.significant_figures != self.significant_figures:
+            raise ValueError("Нельзя объединить гистограммы с разной точностью")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def mean(self):
+        return self.total / self.total_count if self.total_count else 0.0
+
+    def value_at_percentile(self, percentile):
+        # Возвращает верхнюю границу корзины (как HdrHistogram), но не больше реального максимума
+        if not self.total_count:
+            return 0
+        threshold = max(1, math.ceil(self.total_count * percentile / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= threshold:
+                return min(self._bounds(index)[1], self.max)
+        return self.max
+
+    def percentiles(self, percentiles=(50, 90, 99, 99.9)):
+        return {percentile: self.value_at_percentile(percentile) for percentile in percentiles}
@@ -0,0 +1,396 @@
+# Генератор нагрузки для клиентов баз данных.
+# Запуск: python -m benchmark.load_generator --backend postgresql --mode open --qps 200 --duration 30
+#         python -m benchmark.load_generator --backend redis --mode closed --workers 8 --duration 30
+#
+# Режимы:
+# - open (открытый цикл): операции планируются по фиксированному расписанию с частотой --qps,
+#   независимо от того, успевает ли база. Задержка считается от запланированного момента старта,
+#   поэтому время ожидания в очереди при «подвисании» базы попадает в измерения
+#   (нет coordinated omission, как у простого цикла вызовов).
+# - closed (закрытый цикл): --workers потоков выполняют операции одну за другой без пауз;
+#   измеряется только время обслуживания, а пропускная способность ограничена самой базой.
+#
+# Смесь операций задаётся весами: --mix get_orders_by_user_id=40,get_products_by_category_id=40,create_order=15,...
+# ID для операций берутся из уже существующих данных (Dataset.from_client).
+# Каждый поток работает со своим экземпляром клиента и пишет задержки (в микросекундах) в свои гистограммы,
+# которые объединяются по окончании прогона.
+#
+# С --output результаты сохраняются в JSON. С --plans перед прогоном каждая операция смеси выполняется
+# --plan-samples раз с захватом серверных планов (clients/plans.py), и планы сохраняются в тот же JSON рядом
+# с задержками. Два таких файла сравниваются командой python -m benchmark.plan_diff old.json new.json.
+# С --restore NAME перед прогоном восстанавливается снимок данных (python -m clients.dataset_snapshots),
+# чтобы прогоны начинались с одного и того же набора данных, а не с накопленного предыдущими записями.
+import argparse
+import datetime
+import importlib
+import json
+import logging
+import queue
+import random
+import threading
+import time
+
+from benchmark.histogram import Histogram
+from clients.plans import PlanRecorder, capture_plans
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+BACKENDS = {
+    "postgresql": ("clients.postgresql_client", "PostgreSQLClient"),
+    "postgresql_b": ("clients.postgresql_b_client", "PostgreSQLBClient"),
+    "mongodb": ("clients.mongo_client", "MongoDBClient"),
+    "redis": ("clients.redis_client", "RedisClient"),
+    "neo4j": ("clients.neo4j_client", "Neo4jClient"),
+    "cassandra": ("clients.cassandra_client", "CassandraClient"),
+}
+
+# Первое обращение, открывающее соединение клиента: подключение и проверка схемы выполняются при первом
+# обращении, и рабочие потоки делают его до начала замеров, чтобы оно не попадало в задержки первых операций
+FIRST_USE = {
+    "postgresql": lambda client: client.connection,
+    "postgresql_b": lambda client: client.connection,
+    "mongodb": lambda client: client.db,
+    "redis": lambda client: client.client.ping(),
+    "neo4j": lambda client: client.driver,
+    "cassandra": lambda client: client.session,
+}
+
+DEFAULT_MIX = "get_orders_by_user_id=40,get_products_by_category_id=40,create_order=15,get_users_with_similar_purchases=5"
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def warm_up(backend, client):
+    FIRST_USE[backend](client)
+    return client
+
+
+def load_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный backend {name}, допустимые: {', '.join(BACKENDS)}")
+    module_name, class_name = BACKENDS[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class Dataset:
+    """Существующие ID, из которых выбираются аргументы операций."""
+
+    def __init__(self, user_ids, products):
+        if not user_ids or not products:
+            raise ValueError("Для генерации нагрузки нужны хотя бы один пользователь с заказом и один продукт")
+        self.user_ids = list(user_ids)
+        self.products = list(products)
+        self.category_ids = sorted({product[3] for product in self.products if product[3] is not None}, key=str)
+
+    @classmethod
+    def from_client(cls, client, limit=None):
+        user_ids, products = {}, []
+        for _, user_id, _, _ in client.iter_orders():
+            user_ids.setdefault(user_id, None)
+            if limit is not None and len(user_ids) >= limit:
+                break
+        for product in client.iter_products():
+            products.append(tuple(product))
+            if limit is not None and len(products) >= limit:
+                break
+        logger.info(f"Набор данных для нагрузки: {len(user_ids)} пользователей, {len(products)} продуктов")
+        return cls(list(user_ids), products)
+
+    def user_id(self, rng):
+        return rng.choice(self.user_ids)
+
+    def product(self, rng):
+        return rng.choice(self.products)
+
+    def category_id(self, rng):
+        return rng.choice(self.category_ids)
+
+
+# Создание заказа из одного товара: сигнатуры create_order у клиентов различаются
+
+def _create_order_postgresql(client, user_id, product, quantity, order_date):
+    order_id = client.create_order(user_id, order_date, product[2] * quantity)
+    client.create_order_item(order_id, product[0], quantity)
+
+
+def _create_order_postgresql_b(client, user_id, product, quantity, order_date):
+    client.create_order(user_id, [{"product_id": product[0], "quantity": quantity}], order_date, float(product[2]) * quantity)
+
+
+def _create_order_mongodb(client, user_id, product, quantity, order_date):
+    client.create_order(str(user_id), order_date, float(product[2]) * quantity,
+                        [{"product_id": product[0], "quantity": quantity}])
+
+
+def _create_order_redis(client, user_id, product, quantity, order_date):
+    client.create_order(f"load-{time.time_ns()}-{threading.get_ident()}", user_id,
+                        [{"product_id": product[0], "quantity": quantity}], order_date, float(product[2]) * quantity)
+
+
+def _create_order_neo4j(client, user_id, product, quantity, order_date):
+    order_id = f"load-{time.time_ns()}-{threading.get_ident()}"
+    client.create_order(order_id, order_date, float(product[2]) * quantity, user_id)
+    client.create_order_item(order_id, product[0])
+
+
+def _create_order_cassandra(client, user_id, product, quantity, order_date):
+    order_id = client.create_order(user_id, order_date, product[2] * quantity)
+    client.create_order_item(order_id, product[0], product[1], product[2], quantity, category_id=product[3])
+
+
+CREATE_ORDER = {
+    "postgresql": _create_order_postgresql,
+    "postgresql_b": _create_order_postgresql_b,
+    "mongodb": _create_order_mongodb,
+    "redis": _create_order_redis,
+    "neo4j": _create_order_neo4j,
+    "cassandra": _create_order_cassandra,
+}
+
+
+def build_operations(backend):
+    create_order = CREATE_ORDER[backend]
+    return {
+        "get_orders_by_user_id": lambda client, dataset, rng: client.get_orders_by_user_id(dataset.user_id(rng)),
+        "get_products_by_category_id": lambda client, dataset, rng: client.get_products_by_category_id(dataset.category_id(rng)),
+        "get_users_with_similar_purchases": lambda client, dataset, rng: client.get_users_with_similar_purchases(dataset.user_id(rng)),
+        "create_order": lambda client, dataset, rng: create_order(
+            client, dataset.user_id(rng), dataset.product(rng), rng.randint(1, 3), datetime.date.today().isoformat()),
+    }
+
+
+def parse_mix(mix, operations):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in operations:
+            raise ValueError(f"Неизвестная операция {name}, допустимые: {', '.join(operations)}")
+        weights[name] = float(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError("Сумма весов смеси операций должна быть положительной")
+    return weights
+
+
+class RunResult:
+    def __init__(self, mode, elapsed, histograms, errors):
+        self.mode = mode
+        self.elapsed = elapsed
+        self.histograms = histograms
+        self.errors = errors
+
+    @classmethod
+    def merge(cls, results):
+        # Объединение результатов параллельных процессов: гистограммы складываются,
+        # длительность — наибольшая из процессов, так как они работали одновременно
+        results = list(results)
+        histograms, errors = {}, {}
+        for result in results:
+            for name, histogram in result.histograms.items():
+                histograms.setdefault(name, Histogram(histogram.significant_figures)).merge(histogram)
+            for name, count in result.errors.items():
+                errors[name] = errors.get(name, 0) + count
+        return cls(results[0].mode, max(result.elapsed for result in results), histograms, errors)
+
+    def total(self):
+        total = Histogram()
+        for histogram in self.histograms.values():
+            total.merge(histogram)
+        return total
+
+    def throughput(self):
+        return self.total().total_count / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        header = f"{'operation':<34} {'count':>8} {'errors':>7}" + "".join(f" {f'p{p}, ms':>10}" for p in PERCENTILES) + f" {'max, ms':>10}"
+        lines = [header]
+        rows = sorted(self.histograms.items()) + [("total", self.total())]
+        for name, histogram in rows:
+            errors = sum(self.errors.values()) if name == "total" else self.errors.get(name, 0)
+            values = histogram.percentiles(PERCENTILES)
+            lines.append(f"{name:<34} {histogram.total_count:>8} {errors:>7}"
+                         + "".join(f" {values[p] / 1000:>10.2f}" for p in PERCENTILES)
+                         + f" {(histogram.max or 0) / 1000:>10.2f}")
+        lines.append(f"mode={self.mode} elapsed={self.elapsed:.1f}s throughput={self.throughput():.1f} ops/s")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        operations = {}
+        for name, histogram in sorted(self.histograms.items()) + [("total", self.total())]:
+            operations[name] = {
+                "count": histogram.total_count,
+                "errors": sum(self.errors.values()) if name == "total" else self.errors.get(name, 0),
+                "mean_us": histogram.mean(),
+                "max_us": histogram.max,
+                "percentiles_us": {str(p): value for p, value in histogram.percentiles(PERCENTILES).items()},
+            }
+        return {"mode": self.mode, "elapsed": self.elapsed, "throughput": self.throughput(), "operations": operations}
+
+
+class _Worker:
+    def __init__(self, client_factory, operations, dataset, seed, backend=None):
+        self.client = client_factory()
+        if backend is not None:
+            warm_up(backend, self.client)
+        self.operations = operations
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        self.histograms = {name: Histogram() for name in operations}
+        self.errors = {}
+
+    def execute(self, name, intended_start):
+        try:
+            self.operations[name](self.client, self.dataset, self.rng)
+        except Exception as error:
+            if not self.errors:
+                logger.warning(f"Ошибка при выполнении операции {name}: {error}")
+            self.errors[name] = self.errors.get(name, 0) + 1
+            # После ошибки PostgreSQL оставляет транзакцию прерванной, откатываем её
+            rollback = getattr(getattr(self.client, "connection", None), "rollback", None)
+            if rollback is not None:
+                rollback()
+            return
+        self.histograms[name].record((time.perf_counter() - intended_start) * 1e6)
+
+    def close(self):
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            close()
+
+
+def _collect(mode, elapsed, workers):
+    histograms, errors = {}, {}
+    for worker in workers:
+        for name, histogram in worker.histograms.items():
+            histograms.setdefault(name, Histogram()).merge(histogram)
+        for name, count in worker.errors.items():
+            errors[name] = errors.get(name, 0) + count
+        worker.close()
+    return RunResult(mode, elapsed, {name: histogram for name, histogram in histograms.items() if histogram.total_count}, errors)
+
+
+def _wait_until(start_at):
+    # start_at — общий момент старта (time.time()) для нескольких процессов, которые подключаются к базе неодновременно
+    if start_at is not None:
+        time.sleep(max(0.0, start_at - time.time()))
+
+
+def run_open_loop(client_factory, operations, weights, dataset, qps, duration, workers=32, seed=42,
+                  start_at=None, phase=0.0, backend=None):
+    # С backend клиенты подключаются до старта (warm_up), иначе — при первой операции
+    rng = random.Random(seed)
+    names, weights = list(weights), list(weights.values())
+    pool = [_Worker(client_factory, operations, dataset, seed + index + 1, backend) for index in range(workers)]
+    schedule = queue.Queue()
+
+    def work(worker):
+        while True:
+            task = schedule.get()
+            if task is None:
+                return
+            worker.execute(*task)
+
+    threads = [threading.Thread(target=work, args=(worker,), daemon=True) for worker in pool]
+    for thread in threads:
+        thread.start()
+
+    # Операция i планируется на момент start + phase + i / qps. Если все потоки заняты, задача ждёт в очереди,
+    # и это ожидание входит в задержку, так как она отсчитывается от запланированного момента.
+    _wait_until(start_at)
+    start = time.perf_counter()
+    for i in range(int(qps * duration)):
+        intended_start = start + phase + i / qps
+        delay = intended_start - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        schedule.put((rng.choices(names, weights)[0], intended_start))
+    for _ in threads:
+        schedule.put(None)
+    for thread in threads:
+        thread.join()
+    return _collect("open", time.perf_counter() - start, pool)
+
+
+def run_closed_loop(client_factory, operations, weights, dataset, duration, workers=8, seed=42, start_at=None,
+                    backend=None):
+    names, weights = list(weights), list(weights.values())
+    pool = [_Worker(client_factory, operations, dataset, seed + index + 1, backend) for index in range(workers)]
+
+    def work(worker):
+        while time.perf_counter() < deadline:
+            worker.execute(worker.rng.choices(names, weights)[0], time.perf_counter())
+
+    _wait_until(start_at)
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [threading.Thread(target=work, args=(worker,), daemon=True) for worker in pool]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _collect("closed", time.perf_counter() - start, pool)
+
+
+def load_dataset(backend, limit=None):
+    client = _Worker(load_backend(backend), {}, None, 0)
+    try:
+        return Dataset.from_client(client.client, limit)
+    finally:
+        client.close()
+
+
+def capture_operation_plans(backend, operations, weights, dataset, samples=3, seed=42):
+    worker = _Worker(load_backend(backend), operations, dataset, seed)
+    recorder = capture_plans(worker.client, backend, PlanRecorder())
+    try:
+        for name in weights:
+            for _ in range(samples):
+                worker.execute(name, time.perf_counter())
+    finally:
+        worker.close()
+    return recorder.plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор нагрузки для клиентов баз данных")
+    parser.add_argument("--backend", choices=list(BACKENDS), required=True)
+    parser.add_argument("--mode", choices=("open", "closed"), default="open")
+    parser.add_argument("--qps", type=float, default=100, help="целевая частота операций в режиме open")
+    parser.add_argument("--duration", type=float, default=30, help="длительность прогона, с")
+    parser.add_argument("--workers", type=int, default=None, help="число потоков (по умолчанию 32 для open, 8 для closed)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса операций: name=weight,...")
+    parser.add_argument("--dataset-limit", type=int, default=10000, help="сколько ID загрузить из базы")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="путь к JSON с результатами прогона")
+    parser.add_argument("--plans", action="store_true", help="снять серверные планы запросов и сохранить их в --output")
+    parser.add_argument("--plan-samples", type=int, default=3, help="сколько раз выполнить каждую операцию при снятии планов")
+    parser.add_argument("--restore", metavar="NAME", help="восстановить снимок данных перед прогоном (clients/dataset_snapshots.py)")
+    args = parser.parse_args()
+
+    if args.restore:
+        from clients.dataset_snapshots import restore
+
+        restore(args.backend, args.restore)
+
+    client_class = load_backend(args.backend)
+    operations = build_operations(args.backend)
+    weights = parse_mix(args.mix, operations)
+    dataset = load_dataset(args.backend, args.dataset_limit)
+    plans = capture_operation_plans(args.backend, operations, weights, dataset, args.plan_samples, args.seed) if args.plans else None
+
+    if args.mode == "open":
+        result = run_open_loop(client_class, operations, weights, dataset, args.qps, args.duration,
+                               args.workers or 32, args.seed, backend=args.backend)
+    else:
+        result = run_closed_loop(client_class, operations, weights, dataset, args.duration,
+                                 args.workers or 8, args.seed, backend=args.backend)
+    print(result.report())
+
+    if args.output:
+        output = dict(result.to_dict(), backend=args.backend, mix=weights, plans=plans)
+        with open(args.output, "w") as output_file:
+            json.dump(output, output_file, indent=2, default=str)
+        logger.info(f"Результаты прогона сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Сравнение раскладок заказов MongoDB: ссылки на продукты (items: {product_id, quantity}) против встроенных
+# снимков продуктов (MongoDBClient(embed_products=True)). Одни и те же данные записываются в две базы,
+# затем измеряются задержки get_purchased_products_by_user_id и get_order_details и средний размер
+# документа заказа. Задержки в микросекундах, гистограммы benchmark/histogram.py.
+# Запуск: python -m benchmark.mongo_layout_benchmark [--users 200] [--products 1000] [--orders 5000] [--requests 2000] [--keep]
+# Используются базы --database-prefix + "_referenced" / "_embedded"; без --keep они удаляются в конце.
+import argparse
+import random
+import time
+
+from benchmark.histogram import Histogram
+from clients.migrations import connect, migrate
+from clients.mongo_client import MongoDBClient
+
+LAYOUTS = {"referenced": False, "embedded": True}
+
+
+def seed(client, users, products, orders, items_per_order, rng):
+    category_ids = [client.create_category(f"Category {index}") for index in range(max(1, products // 100))]
+    user_ids = client.create_users({"name": f"User {index}", "email": f"user{index}@example.com",
+                                    "registration_date": "2024-01-01"} for index in range(users)).ids
+    product_ids = client.create_products({"name": f"Product {index}", "price": round(rng.uniform(1, 500), 2),
+                                          "category_id": rng.choice(category_ids)} for index in range(products)).ids
+    order_ids = client.create_orders({
+        "user_id": rng.choice(user_ids),
+        "order_date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "total": 0.0,
+        "items": [{"product_id": product_id, "quantity": rng.randint(1, 5)}
+                  for product_id in rng.sample(product_ids, items_per_order)],
+    } for _ in range(orders)).ids
+    return user_ids, order_ids
+
+
+def measure(method, arguments):
+    histogram = Histogram()
+    for argument in arguments:
+        start = time.perf_counter()
+        method(argument)
+        histogram.record(int((time.perf_counter() - start) * 1e6))
+    return histogram
+
+
+def average_order_size(client):
+    stats = client.db.command("collStats", "orders")
+    return stats.get("avgObjSize", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение ссылочной и встроенной раскладки заказов MongoDB")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=5, help="позиций в заказе")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов на каждый метод")
+    parser.add_argument("--database-prefix", default="layout_benchmark")
+    parser.add_argument("--keep", action="store_true", help="не удалять базы после замера")
+    args = parser.parse_args()
+
+    print(f"{'layout':<11} {'method':<34} {'p50, us':>9} {'p99, us':>9} {'mean, us':>9}")
+    sizes = {}
+    for layout, embed_products in LAYOUTS.items():
+        # Одинаковое зерно — одинаковые данные и последовательность запросов в обеих раскладках
+        rng = random.Random(42)
+        database = f"{args.database_prefix}_{layout}"
+        # Чистая база с индексами из миграций; клиент только сверяет версию схемы
+        db, _, close = connect("mongodb", database)
+        db.client.drop_database(database)
+        migrate("mongodb", db)
+        close()
+        client = MongoDBClient(raw=True, embed_products=embed_products, database=database)
+        try:
+            user_ids, order_ids = seed(client, args.users, args.products, args.orders, args.items, rng)
+            for name, arguments in (
+                ("get_purchased_products_by_user_id", [rng.choice(user_ids) for _ in range(args.requests)]),
+                ("get_order_details", [rng.choice(order_ids) for _ in range(args.requests)]),
+            ):
+                histogram = measure(getattr(client, name), arguments)
+                print(f"{layout:<11} {name:<34} {histogram.value_at_percentile(50):>9} "
+                      f"{histogram.value_at_percentile(99):>9} {histogram.mean():>9.0f}")
+            sizes[layout] = average_order_size(client)
+        finally:
+            if not args.keep:
+                client.client.drop_database(database)
+            client.client.close()
+    for layout, size in sizes.items():
+        print(f"Средний размер документа заказа ({layout}): {size} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Многопроцессный драйвер нагрузки: обходит ограничение GIL на стороне клиента.
+# В одном процессе Python ядро процессора упирается в разбор ответов драйвером (кортежи psycopg2,
+# декодирование BSON, сборка записей Neo4j, row factory Cassandra) раньше, чем насыщается сама база.
+#
+# Запуск: python -m benchmark.multiprocess_driver --backends postgresql redis --processes 1 2 4 8 \
+#             --mode closed --duration 20 --plot scaling.png --output scaling.json
+#
+# Каждый процесс создаёт свои экземпляры клиента (и свои соединения) и выполняет свою долю общего расписания:
+# в режиме open процесс p из N берёт операции p, p + N, p + 2N, ... (частота qps / N со сдвигом фазы p / qps),
+# поэтому суммарный поток операций остаётся равномерным с частотой qps. Все процессы стартуют в общий момент
+# времени, а их гистограммы объединяются по окончании. Для каждого числа процессов выводится пропускная
+# способность и задержки; с флагом --plot строится график пропускной способности от числа процессов
+# (требуется matplotlib).
+import argparse
+import json
+import logging
+import multiprocessing
+import time
+
+from benchmark.load_generator import (
+    BACKENDS, DEFAULT_MIX, PERCENTILES, RunResult, build_operations, load_backend, load_dataset, parse_mix,
+    run_closed_loop, run_open_loop,
+)
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+# Время на запуск процессов и подключение клиентов до общего старта
+STARTUP_DELAY = 2.0
+
+
+def process_share(qps, processes, index):
+    # Частота и сдвиг фазы процесса index, при которых объединённое расписание совпадает с однопроцессным
+    return qps / processes, index / qps
+
+
+def _run_process(task):
+    backend, mode, weights, dataset, qps, duration, threads, seed, start_at, phase = task
+    client_class = load_backend(backend)
+    operations = build_operations(backend)
+    if mode == "open":
+        return run_open_loop(client_class, operations, weights, dataset, qps, duration, threads, seed, start_at, phase, backend)
+    return run_closed_loop(client_class, operations, weights, dataset, duration, threads, seed, start_at, backend)
+
+
+def run_processes(backend, processes, mode, weights, dataset, duration, threads, qps=None, seed=42):
+    start_at = time.time() + STARTUP_DELAY
+    tasks = []
+    for index in range(processes):
+        process_qps, phase = process_share(qps, processes, index) if mode == "open" else (None, 0.0)
+        # Разные seed, чтобы процессы не выбирали одни и те же ID в одном порядке
+        tasks.append((backend, mode, weights, dataset, process_qps, duration, threads, seed + index * 1000, start_at, phase))
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(_run_process, tasks)
+    return RunResult.merge(results)
+
+
+def plot_scaling(rows, path):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        logger.warning("matplotlib не установлен, график масштабирования не построен")
+        return
+    figure, axis = plt.subplots(figsize=(8, 5))
+    for backend in sorted({row["backend"] for row in rows}):
+        points = sorted((row["processes"], row["throughput"]) for row in rows if row["backend"] == backend)
+        axis.plot([point[0] for point in points], [point[1] for point in points], marker="o", label=backend)
+    axis.set_xlabel("processes")
+    axis.set_ylabel("throughput, ops/s")
+    axis.set_title("Throughput vs worker processes")
+    axis.grid(True, alpha=0.3)
+    axis.legend()
+    figure.savefig(path, bbox_inches="tight")
+    logger.info(f"График масштабирования сохранён в {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Многопроцессный драйвер нагрузки")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), required=True)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--mode", choices=("open", "closed"), default="closed")
+    parser.add_argument("--qps", type=float, default=1000, help="суммарная частота операций в режиме open")
+    parser.add_argument("--duration", type=float, default=20, help="длительность прогона, с")
+    parser.add_argument("--threads", type=int, default=None, help="потоков в процессе (по умолчанию 32 для open, 4 для closed)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса операций: name=weight,...")
+    parser.add_argument("--dataset-limit", type=int, default=10000, help="сколько ID загрузить из базы")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--plot", help="путь к PNG с графиком пропускной способности")
+    parser.add_argument("--output", help="путь к JSON с результатами")
+    args = parser.parse_args()
+
+    threads = args.threads or (32 if args.mode == "open" else 4)
+    rows = []
+    print(f"{'backend':<14} {'processes':>9} {'ops/s':>10} {'errors':>7}" + "".join(f" {f'p{p}, ms':>10}" for p in PERCENTILES))
+    for backend in args.backends:
+        weights = parse_mix(args.mix, build_operations(backend))
+        dataset = load_dataset(backend, args.dataset_limit)
+        for processes in args.processes:
+            result = run_processes(backend, processes, args.mode, weights, dataset, args.duration, threads, args.qps, args.seed)
+            total = result.total()
+            row = {
+                "backend": backend,
+                "processes": processes,
+                "throughput": result.throughput(),
+                "errors": sum(result.errors.values()),
+                "latency_us": {str(p): value for p, value in total.percentiles(PERCENTILES).items()},
+            }
+            rows.append(row)
+            print(f"{backend:<14} {processes:>9} {row['throughput']:>10.1f} {row['errors']:>7}"
+                  + "".join(f" {total.value_at_percentile(p) / 1000:>10.2f}" for p in PERCENTILES))
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(rows, output_file, indent=2)
+    if args.plot:
+        plot_scaling(rows, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Сравнение двух прогонов генератора нагрузки (файлы --output с --plans):
+# изменение задержек по операциям и изменения форм планов по методам клиента.
+# Запуск: python -m benchmark.plan_diff baseline.json current.json
+# Если задержка выросла, а форма плана метода не изменилась, причину стоит искать не в планировщике
+# (объём данных, кеш, блокировки); если план сменился — регрессия, скорее всего, из-за него.
+import argparse
+import json
+
+from benchmark.load_generator import PERCENTILES
+from clients.plans import diff_plans
+
+
+def latency_changes(old, new):
+    rows = []
+    for name in sorted(set(old["operations"]) & set(new["operations"])):
+        before = old["operations"][name]["percentiles_us"]
+        after = new["operations"][name]["percentiles_us"]
+        rows.append((name, {p: (before[p], after[p]) for p in before if p in after}))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение задержек и планов запросов двух прогонов")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        old, new = json.load(baseline_file), json.load(current_file)
+
+    print(f"{'operation':<34}" + "".join(f" {f'p{p}, ms':>22}" for p in PERCENTILES))
+    for name, values in latency_changes(old, new):
+        print(f"{name:<34}" + "".join(
+            f" {values[str(p)][0] / 1000:>9.2f} -> {values[str(p)][1] / 1000:>9.2f}" for p in PERCENTILES if str(p) in values))
+
+    if not old.get("plans") or not new.get("plans"):
+        print("\nПланы не сохранены в одном из прогонов (запустите генератор с --plans)")
+        return
+    changes = diff_plans(old["plans"], new["plans"])
+    print(f"\nИзменения планов: {len(changes)}")
+    for change in changes:
+        print(f"\n{change['backend']}.{change['method']}")
+        for shape in change["old"]:
+            if shape not in change["new"]:
+                print(f"  - {shape}")
+        for shape in change["new"]:
+            if shape not in change["old"]:
+                print(f"  + {shape}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Холодный старт клиентов. Каждый замер — новый процесс интерпретатора, чтобы загруженные модули
+# и соединения не переживали между повторами. Фазы (миллисекунды, медиана по --repeat запускам):
+# - import: импорт модуля клиента (драйвер импортируется лениво, см. clients/lazy_import.py);
+# - construct: создание клиента — без сетевых обращений;
+# - connect: первое обращение к базе — подключение и проверка версии схемы (только с --connect,
+#   нужна запущенная база);
+# - process: время всего процесса, включая запуск интерпретатора.
+# Колонка drivers — драйверы, загруженные сразу после импорта модуля клиента (ожидается пусто).
+# --output сохраняет результаты в JSON; --baseline сравнивает медианы с сохранённым прогоном и завершается
+# с кодом 1, если фаза стала медленнее больше чем на --max-regression процентов и на --min-delta мс.
+# Запуск: python -m benchmark.startup_benchmark [--backend postgresql redis] [--repeat 10] [--connect]
+#         [--output startup.json] [--baseline startup.json]
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmark.load_generator import BACKENDS
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+DRIVERS = ("psycopg2", "pymongo", "neo4j", "cassandra", "redis")
+PHASES = ("import", "construct", "connect", "process")
+
+CHILD = """
+import importlib, json, sys, time
+drivers = json.loads(sys.argv[4])
+started = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+loaded = [name for name in drivers if name in sys.modules]
+client = getattr(module, sys.argv[2])()
+constructed = time.perf_counter()
+if sys.argv[3]:
+    # Импорт load_generator ради FIRST_USE не входит в замер подключения
+    from benchmark.load_generator import FIRST_USE
+    connect_start = time.perf_counter()
+    FIRST_USE[sys.argv[3]](client)
+    connected = time.perf_counter()
+print(json.dumps({
+    "import": (imported - started) * 1000,
+    "construct": (constructed - imported) * 1000,
+    "connect": (connected - connect_start) * 1000 if sys.argv[3] else None,
+    "drivers": loaded,
+}))
+"""
+
+
+def measure(backend, connect=False):
+    module, class_name = BACKENDS[backend]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (root, os.getenv("PYTHONPATH")))))
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD, module, class_name, backend if connect else "", json.dumps(DRIVERS)],
+        capture_output=True, text=True, env=env, cwd=root,
+    )
+    process = (time.perf_counter() - start) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError(f"Замер {backend} завершился с ошибкой:\n{completed.stderr}")
+    sample = json.loads(completed.stdout.strip().splitlines()[-1])
+    sample["process"] = process
+    return sample
+
+
+def summarize(samples):
+    summary = {phase: statistics.median(sample[phase] for sample in samples) if samples[0][phase] is not None else None
+               for phase in PHASES}
+    summary["drivers"] = sorted({name for sample in samples for name in sample["drivers"]})
+    return summary
+
+
+def regressions(results, baseline, max_regression, min_delta):
+    found = []
+    for backend, summary in results.items():
+        for phase in PHASES:
+            before, after = baseline.get(backend, {}).get(phase), summary[phase]
+            if before is None or after is None:
+                continue
+            if after > before * (1 + max_regression / 100) and after - before > min_delta:
+                found.append((backend, phase, before, after))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного старта клиентов")
+    parser.add_argument("--backend", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--repeat", type=int, default=10, help="число запусков процесса на каждый backend")
+    parser.add_argument("--connect", action="store_true", help="замерить и первое подключение к базе")
+    parser.add_argument("--output", help="путь к JSON с результатами")
+    parser.add_argument("--baseline", help="JSON предыдущего прогона для поиска регрессий")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="допустимое замедление фазы, %%")
+    parser.add_argument("--min-delta", type=float, default=5.0, help="замедление меньше этого, мс, не считается регрессией")
+    args = parser.parse_args()
+
+    results = {}
+    for backend in args.backend:
+        results[backend] = summarize([measure(backend, args.connect) for _ in range(args.repeat)])
+
+    print(f"{'backend':<14}" + "".join(f" {f'{phase}, ms':>14}" for phase in PHASES) + "  drivers")
+    for backend, summary in results.items():
+        print(f"{backend:<14}" + "".join(f" {'-':>14}" if summary[phase] is None else f" {summary[phase]:>14.1f}" for phase in PHASES)
+              + f"  {', '.join(summary['drivers']) or '-'}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        logger.info(f"Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        found = regressions(results, baseline, args.max_regression, args.min_delta)
+        for backend, phase, before, after in found:
+            print(f"Регрессия {backend} {phase}: {before:.1f} -> {after:.1f} мс ({(after / before - 1) * 100:+.0f}%)")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
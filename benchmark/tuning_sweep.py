@@ -0,0 +1,131 @@
+# Перебор настроек драйвера (clients/tuning.py) под одной и той же нагрузкой benchmark/load_generator.py.
+# Запуск: python -m benchmark.tuning_sweep --backend mongodb --profile tuned --sweep compressors=[],["zstd"],["snappy"]
+#         python -m benchmark.tuning_sweep --backend cassandra --sweep compression=false,"lz4" --sweep fetch_size=500,5000
+#         python -m benchmark.tuning_sweep --backend postgresql --profiles default tuned
+#
+# --sweep key=v1,v2,... задаёт значения одного параметра раздела backend базового профиля (--profile);
+# значения разбираются как JSON (строка без кавычек тоже допустима), null удаляет параметр из профиля.
+# Несколько --sweep перебираются декартовым произведением. --profiles сравнивает профили целиком.
+# Для каждой комбинации выполняется прогон с одинаковым seed, выводятся пропускная способность, задержки
+# и изменение пропускной способности относительно первой комбинации.
+import argparse
+import functools
+import itertools
+import json
+import logging
+
+from benchmark.load_generator import (
+    BACKENDS, DEFAULT_MIX, PERCENTILES, build_operations, load_backend, load_dataset, parse_mix, run_closed_loop,
+    run_open_loop,
+)
+from clients.tuning import tuning_for
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+
+def _split_values(values):
+    # Запятые внутри JSON-массивов и объектов не разделяют значения
+    parts, depth, current = [], 0, ""
+    for char in values:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += char in "[{"
+        depth -= char in "]}"
+        current += char
+    return parts + [current]
+
+
+def _parse_value(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_sweep(specs):
+    sweeps = []
+    for spec in specs:
+        key, separator, values = spec.partition("=")
+        if not separator or not key.strip() or not values:
+            raise ValueError(f"Ожидалось key=v1,v2,... в --sweep, получено {spec!r}")
+        sweeps.append((key.strip(), [_parse_value(value.strip()) for value in _split_values(values)]))
+    return sweeps
+
+
+def sweep_settings(base, sweeps):
+    # Возвращает пары (подпись, настройки backend) для всех комбинаций значений
+    combinations = []
+    for values in itertools.product(*(values for _, values in sweeps)):
+        settings = dict(base)
+        for (key, _), value in zip(sweeps, values):
+            if value is None:
+                settings.pop(key, None)
+            else:
+                settings[key] = value
+        label = " ".join(f"{key}={json.dumps(value)}" for (key, _), value in zip(sweeps, values)) or "base"
+        combinations.append((label, settings))
+    return combinations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перебор настроек драйверов под нагрузкой")
+    parser.add_argument("--backend", choices=list(BACKENDS), required=True)
+    parser.add_argument("--profile", default=None, help="базовый профиль (по умолчанию DB_TUNING_PROFILE или default)")
+    parser.add_argument("--sweep", action="append", default=[], help="key=v1,v2,... — значения параметра профиля")
+    parser.add_argument("--profiles", nargs="+", help="сравнить профили целиком вместо --sweep")
+    parser.add_argument("--mode", choices=("open", "closed"), default="closed")
+    parser.add_argument("--qps", type=float, default=100, help="целевая частота операций в режиме open")
+    parser.add_argument("--duration", type=float, default=20, help="длительность прогона каждой комбинации, с")
+    parser.add_argument("--workers", type=int, default=None, help="число потоков (по умолчанию 32 для open, 8 для closed)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса операций: name=weight,...")
+    parser.add_argument("--dataset-limit", type=int, default=10000, help="сколько ID загрузить из базы")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="путь к JSON с результатами")
+    args = parser.parse_args()
+
+    if args.profiles:
+        combinations = [(profile, tuning_for(args.backend, profile)) for profile in args.profiles]
+    else:
+        combinations = sweep_settings(tuning_for(args.backend, args.profile), parse_sweep(args.sweep))
+    client_class = load_backend(args.backend)
+    operations = build_operations(args.backend)
+    weights = parse_mix(args.mix, operations)
+    dataset = load_dataset(args.backend, args.dataset_limit)
+
+    rows = []
+    for label, settings in combinations:
+        logger.info(f"Прогон {args.backend} с настройками {label}: {settings}")
+        client_factory = functools.partial(client_class, tuning=settings)
+        if args.mode == "open":
+            result = run_open_loop(client_factory, operations, weights, dataset, args.qps, args.duration,
+                                   args.workers or 32, args.seed, backend=args.backend)
+        else:
+            result = run_closed_loop(client_factory, operations, weights, dataset, args.duration,
+                                     args.workers or 8, args.seed, backend=args.backend)
+        total = result.total()
+        rows.append({
+            "label": label,
+            "settings": settings,
+            "throughput": result.throughput(),
+            "errors": sum(result.errors.values()),
+            "latency_us": {str(p): value for p, value in total.percentiles(PERCENTILES).items()},
+        })
+
+    print(f"{'settings':<40} {'ops/s':>10} {'change':>8} {'errors':>7}" + "".join(f" {f'p{p}, ms':>10}" for p in PERCENTILES))
+    baseline = rows[0]["throughput"] if rows else 0.0
+    for row in rows:
+        change = (row["throughput"] / baseline - 1) * 100 if baseline else 0.0
+        print(f"{row['label']:<40} {row['throughput']:>10.1f} {change:>+7.1f}% {row['errors']:>7}"
+              + "".join(f" {row['latency_us'][str(p)] / 1000:>10.2f}" for p in PERCENTILES))
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(dict(backend=args.backend, mode=args.mode, mix=weights, runs=rows), output_file, indent=2, default=str)
+        logger.info(f"Результаты перебора сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,164 @@
+# Чтение широких разделов (заказы и продукты пользователя, продукты категории) идёт страницами по fetch_size строк
+# (параметр конструктора или CASSANDRA_FETCH_SIZE): драйвер запрашивает следующую страницу только по мере чтения.
+# Для каждого такого чтения есть три формы:
+# - get_*(...) — список всех строк (все страницы читаются в память);
+# - get_*_page(..., page_size=None, paging_state=None) — одна страница и paging_state для продолжения
+#   (None на последней странице); состояние непрозрачно и передаётся в следующий вызов как есть;
+# - iter_*(...) — генератор, держащий в памяти не больше одной страницы.
+#
+# Продукты категории можно разложить по бакетам (category_buckets или CASSANDRA_CATEGORY_BUCKETS):
+# таблица products_by_category_bucketed с ключом раздела (category_id, bucket), где bucket = product_id % N,
+# ограничивает размер раздела при неограниченном росте категории. N подбирается так, чтобы в разделе было не больше
+# PARTITION_ROWS_TARGET строк, см. category_buckets_for(). Бакеты читаются по очереди; страница может оказаться
+# короче page_size на границе бакета.
+#
+# Предагрегаты в таблицах-счётчиках обновляются при записи заказа и читаются одним обращением к разделу:
+# - product_purchase_counts: units (продано единиц) и orders (заказов с товаром) по product_id;
+# - user_spend: orders и spend_cents (сумма заказов в копейках) по user_id;
+# - category_sales: order_lines (позиций заказов), units и revenue_cents по category_id
+#   (обновляется, если в create_order_item передан category_id).
+# Обновления счётчиков не идемпотентны: повтор запроса после таймаута может учесть его дважды.
+# reconcile_counters() пересчитывает счётчики по базовым таблицам, сканируя их параллельно по диапазонам токенов,
+# и прибавляет к каждому счётчику разницу с пересчитанным значением. Записи, идущие во время пересчёта, могут
+# внести расхождение, которое исправит следующий запуск.
+import functools
+import math
 import os
-
-from cassandra.cluster import Cluster
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 import uuid
 
+from clients.date_range import date_bounds, days_between
+from clients.instrumentation import instrumented
+from clients.lazy_import import lazy_import
+from clients.migrations import VERSION_TABLE, check_schema
+from clients.records import Order, Product, from_mapping
+from clients.tuning import cassandra_options, tuning_for
+
+cassandra_cluster = lazy_import("cassandra.cluster")
+cassandra_concurrent = lazy_import("cassandra.concurrent")
+cassandra_query = lazy_import("cassandra.query")
+
+PRODUCT_FIELDS = {"name": "product_name"}
+# Сколько дневных разделов orders_by_day читается одновременно
+DAY_QUERY_CONCURRENCY = 32
+DEFAULT_FETCH_SIZE = 1000
+# Ориентир на число строк в одном разделе products_by_category_bucketed
+PARTITION_ROWS_TARGET = 100000
+# Границы токенов Murmur3Partitioner
+MIN_TOKEN = -2 ** 63
+MAX_TOKEN = 2 ** 63 - 1
+# Таблицы-счётчики: ключ раздела и колонки-счётчики
+COUNTER_TABLES = {
+    "product_purchase_counts": ("product_id", ("units", "orders")),
+    "user_spend": ("user_id", ("orders", "spend_cents")),
+    "category_sales": ("category_id", ("order_lines", "units", "revenue_cents")),
+}
+# Поля записей, доступные для проекции (параметр fields), и соответствующие им колонки таблиц
+TABLE_FIELDS = {
+    "orders_by_user": {"order_id": "order_id", "user_id": "user_id", "order_date": "order_date", "total": "total"},
+    "orders_by_day": {"order_id": "order_id", "user_id": "user_id", "order_date": "order_date", "total": "total"},
+    "products_by_user": {"product_id": "product_id", "name": "product_name", "price": "price"},
+    "products_by_category": {"product_id": "product_id", "name": "product_name", "price": "price", "category_id": "category_id"},
+    "products_by_category_bucketed": {"product_id": "product_id", "name": "product_name", "price": "price", "category_id": "category_id"},
+}
+
+
+def category_buckets_for(expected_products, target_rows=PARTITION_ROWS_TARGET):
+    return max(1, math.ceil(expected_products / target_rows))
+
+
+def product_bucket(product_id, buckets):
+    return uuid.UUID(str(product_id)).int % buckets
+
+
+def token_ranges(splits):
+    # Делит кольцо токенов на splits непересекающихся диапазонов [start, end]
+    step = (MAX_TOKEN - MIN_TOKEN) // splits
+    starts = [MIN_TOKEN + step * index for index in range(splits)]
+    return [(start, end - 1) for start, end in zip(starts, starts[1:])] + [(starts[-1], MAX_TOKEN)]
+
 
+def to_cents(value):
+    return int((Decimal(str(value)) * 100).quantize(Decimal(1)))
+
+
+def _encode_paging_state(index, paging_state):
+    # Состояние чтения по бакетам: номер бакета (2 байта) и состояние драйвера внутри него
+    return index.to_bytes(2, "big") + (paging_state or b"")
+
+
+def _decode_paging_state(paging_state):
+    return int.from_bytes(paging_state[:2], "big"), paging_state[2:] or None
+
+
+@instrumented("cassandra")
 class CassandraClient:
 
-    def __init__(self):
-        contact_points = os.getenv("CASSANDRA_CONTACT_POINTS", "localhost").split(",")
-        port = int(os.getenv("CASSANDRA_PORT", 9042))
-        keyspace = os.getenv("CASSANDRA_KEYSPACE", "test_keyspace")
-        self.cluster = Cluster(contact_points, port=port)
-        self.session = self.cluster.connect()
-        self._initialize_keyspace_and_tables(keyspace)
-        self.session.set_keyspace(keyspace)
-
-    def _initialize_keyspace_and_tables(self, keyspace: str):
-        self.session.execute(f"""
-           CREATE KEYSPACE IF NOT EXISTS {keyspace}
-           WITH replication = {{'class': 'SimpleStrategy', 'replication_factor': 1}};
-           """)
-
-        self.session.set_keyspace(keyspace)
-
-        self.session.execute("""
-           CREATE TABLE IF NOT EXISTS users (
-               user_id UUID PRIMARY KEY,
-               name TEXT,
-               email TEXT,
-               registration_date DATE
-           );
-           """)
-
-        self.session.execute("""
-           CREATE TABLE IF NOT EXISTS orders_by_user (
-               user_id UUID,
-               order_id UUID,
-               order_date DATE,
-               total DECIMAL,
-               PRIMARY KEY (user_id, order_date, order_id)
-           ) WITH CLUSTERING ORDER BY (order_date DESC);
-           """)
-
-        self.session.execute("""
-           CREATE TABLE IF NOT EXISTS order_items_by_order (
-               order_id UUID,
-               product_id UUID,
-               product_name TEXT,
-               price DECIMAL,
-               quantity INT,
-               PRIMARY KEY (order_id, product_id)
-           );
-           """)
-
-        self.session.execute("""
-           CREATE TABLE IF NOT EXISTS products_by_category (
-               category_id UUID,
-               product_id UUID,
-               product_name TEXT,
-               price DECIMAL,
-               PRIMARY KEY (category_id, product_id)
-           );
-           """)
-
-        self.session.execute("""
-           CREATE TABLE IF NOT EXISTS products_by_user (
-               user_id UUID,
-               product_id UUID,
-               product_name TEXT,
-               price DECIMAL,
-               PRIMARY KEY (user_id, product_id)
-           );
-           """)
+    def __init__(self, raw=False, fetch_size=None, category_buckets=None, tuning=None):
+        self.raw = raw
+        self.tuning = tuning_for("cassandra", tuning)
+        self.cluster_options, self.session_settings = cassandra_options(self.tuning)
+        self.fetch_size = fetch_size or int(os.getenv("CASSANDRA_FETCH_SIZE", self.session_settings.pop("default_fetch_size", DEFAULT_FETCH_SIZE)))
+        self.category_buckets = category_buckets if category_buckets is not None else int(os.getenv("CASSANDRA_CATEGORY_BUCKETS", 0))
+        self.contact_points = os.getenv("CASSANDRA_CONTACT_POINTS", "localhost").split(",")
+        self.port = int(os.getenv("CASSANDRA_PORT", 9042))
+        self.keyspace = os.getenv("CASSANDRA_KEYSPACE", "test_keyspace")
+
+    # Подключение к кластеру (обнаружение узлов, пулы соединений) и проверка версии схемы — при первом запросе
+    @functools.cached_property
+    def cluster(self):
+        return cassandra_cluster.Cluster(self.contact_points, port=self.port, **self.cluster_options)
+
+    @functools.cached_property
+    def session(self):
+        session = self.cluster.connect()
+        session.default_fetch_size = self.fetch_size
+        for attribute, value in self.session_settings.items():
+            setattr(session, attribute, value)
+        check_schema("cassandra", session, keyspace=self.keyspace)
+        session.set_keyspace(self.keyspace)
+        return session
+
+    def _columns(self, table, fields=None):
+        if not fields:
+            return "*"
+        unknown = [field for field in fields if field not in TABLE_FIELDS[table]]
+        if unknown:
+            raise ValueError(f"Таблица {table} не содержит полей: {', '.join(unknown)}")
+        return ", ".join(TABLE_FIELDS[table][field] for field in fields)
+
+    def _decode_rows(self, cls, rows, aliases=None):
+        if self.raw:
+            return list(rows)
+        return [from_mapping(cls, row._asdict(), aliases) for row in rows]
+
+    def _statement(self, query, fetch_size=None, idempotent=True):
+        # Идемпотентные чтения драйвер может повторить на другой реплике (speculative_execution в профиле настройки);
+        # сканы по диапазонам токенов и ALLOW FILTERING не дублируются, чтобы не удваивать нагрузку
+        return cassandra_query.SimpleStatement(query, fetch_size=fetch_size or self.fetch_size, is_idempotent=idempotent)
+
+    def _iter_rows(self, cls, queries, aliases=None):
+        # queries: [(query, params), ...] — разделы читаются по очереди, страницы запрашиваются по мере чтения
+        for query, params in queries:
+            for row in self.session.execute(self._statement(query), params):
+                yield row if self.raw else from_mapping(cls, row._asdict(), aliases)
+
+    def _read_page(self, cls, queries, page_size=None, paging_state=None, aliases=None):
+        index, state = (0, paging_state) if len(queries) == 1 or paging_state is None else _decode_paging_state(paging_state)
+        while True:
+            query, params = queries[index]
+            result = self.session.execute(self._statement(query, page_size), params, paging_state=state)
+            rows, state = self._decode_rows(cls, result.current_rows, aliases), result.paging_state
+            if state is None and index + 1 < len(queries):
+                # Раздел прочитан: продолжаем со следующего, пустые пропускаем
+                index += 1
+                if not rows:
+                    continue
+                return rows, _encode_paging_state(index, None)
+            if len(queries) == 1 or state is None:
+                return rows, state
+            return rows, _encode_paging_state(index, state)
 
     def create_user(self, name, email, registration_date):
         user_id = uuid.uuid4()
@@ -84,21 +171,73 @@ class CassandraClient:
 
     def create_order(self, user_id, order_date, total):
         order_id = uuid.uuid4()
-        query = """
+        # Обе таблицы заказов пишутся атомарно одним logged batch
+        batch = cassandra_query.BatchStatement()
+        batch.add("""
         INSERT INTO orders_by_user (user_id, order_id, order_date, total)
         VALUES (%s, %s, %s, %s)
-        """
-        self.session.execute(query, (user_id, order_id, order_date, total))
+        """, (user_id, order_id, order_date, total))
+        batch.add("""
+        INSERT INTO orders_by_day (order_date, order_id, user_id, total)
+        VALUES (%s, %s, %s, %s)
+        """, (order_date, order_id, user_id, total))
+        self.session.execute(batch)
+        # Счётчики нельзя смешивать с обычными записями в одном batch
+        self._increment_counter("user_spend", user_id, orders=1, spend_cents=to_cents(total))
         return order_id
 
-    def create_order_item(self, order_id, product_id, product_name, price, quantity):
+    def create_order_item(self, order_id, product_id, product_name, price, quantity, category_id=None):
         query = """
         INSERT INTO order_items_by_order (order_id, product_id, product_name, price, quantity)
         VALUES (%s, %s, %s, %s, %s)
         """
         self.session.execute(query, (order_id, product_id, product_name, price, quantity))
+        batch = cassandra_query.BatchStatement(batch_type=cassandra_query.BatchType.COUNTER)
+        self._increment_counter("product_purchase_counts", product_id, batch, units=quantity, orders=1)
+        if category_id is not None:
+            self._increment_counter("category_sales", category_id, batch, order_lines=1, units=quantity,
+                                    revenue_cents=to_cents(price) * quantity)
+        self.session.execute(batch)
+
+    def _increment_counter(self, table, key, batch=None, **deltas):
+        key_column, _ = COUNTER_TABLES[table]
+        assignments = ", ".join(f"{column} = {column} + %s" for column in deltas)
+        query = f"UPDATE {table} SET {assignments} WHERE {key_column} = %s"
+        params = (*deltas.values(), key)
+        if batch is None:
+            self.session.execute(query, params)
+        else:
+            batch.add(query, params)
+
+    def _read_counter(self, table, key):
+        key_column, columns = COUNTER_TABLES[table]
+        query = f"SELECT {', '.join(columns)} FROM {table} WHERE {key_column} = %s"
+        row = self.session.execute(self._statement(query), (key,)).one()
+        # Отсутствующий раздел означает нулевые счётчики
+        return {key_column: key, **{column: (getattr(row, column) or 0) if row else 0 for column in columns}}
+
+    def get_product_purchase_count(self, product_id):
+        return self._read_counter("product_purchase_counts", product_id)
+
+    def get_user_spend(self, user_id):
+        counters = self._read_counter("user_spend", user_id)
+        counters["spend"] = counters.pop("spend_cents") / 100
+        return counters
+
+    def get_category_sales(self, category_id):
+        counters = self._read_counter("category_sales", category_id)
+        counters["revenue"] = counters.pop("revenue_cents") / 100
+        return counters
 
     def add_product_to_category(self, category_id, product_id, product_name, price):
+        if self.category_buckets:
+            query = """
+            INSERT INTO products_by_category_bucketed (category_id, bucket, product_id, product_name, price)
+            VALUES (%s, %s, %s, %s, %s)
+            """
+            bucket = product_bucket(product_id, self.category_buckets)
+            self.session.execute(query, (category_id, bucket, product_id, product_name, price))
+            return
         query = """
         INSERT INTO products_by_category (category_id, product_id, product_name, price)
         VALUES (%s, %s, %s, %s)
@@ -112,25 +251,79 @@ class CassandraClient:
         """
         self.session.execute(query, (user_id, product_id, product_name, price))
 
-    def get_orders_by_user_id(self, user_id):
-        query = """
-        SELECT * FROM orders_by_user WHERE user_id = %s
+    def _orders_by_user_queries(self, user_id, fields=None):
+        query = f"""
+        SELECT {self._columns("orders_by_user", fields)} FROM orders_by_user WHERE user_id = %s
+        """
+        return [(query, (user_id,))]
+
+    def get_orders_by_user_id(self, user_id, fields=None):
+        return list(self._iter_rows(Order, self._orders_by_user_queries(user_id, fields)))
+
+    def get_orders_by_user_id_page(self, user_id, page_size=None, paging_state=None, fields=None):
+        return self._read_page(Order, self._orders_by_user_queries(user_id, fields), page_size, paging_state)
+
+    def iter_orders_by_user_id(self, user_id, fields=None):
+        return self._iter_rows(Order, self._orders_by_user_queries(user_id, fields))
+
+    def get_orders_by_user_in_range(self, user_id, start_date, end_date, fields=None):
+        # Диапазон по кластерному ключу order_date внутри раздела пользователя; ASC обращает порядок хранения
+        start_date, end_date = date_bounds(start_date, end_date)
+        query = f"""
+        SELECT {self._columns("orders_by_user", fields)} FROM orders_by_user
+        WHERE user_id = %s AND order_date >= %s AND order_date <= %s
+        ORDER BY order_date ASC
+        """
+        rows = self.session.execute(self._statement(query), (user_id, start_date, end_date))
+        return self._decode_rows(Order, rows)
+
+    def _query_days(self, query, start_date, end_date):
+        # Дневные разделы читаются параллельно; результаты возвращаются в порядке дат
+        days = days_between(start_date, end_date)
+        results = cassandra_concurrent.execute_concurrent_with_args(self.session, self._statement(query), [(day,) for day in days],
+                                                                    concurrency=DAY_QUERY_CONCURRENCY)
+        return [(day, result) for day, (_, result) in zip(days, results)]
+
+    def get_orders_in_range(self, start_date, end_date, fields=None):
+        query = f"""
+        SELECT {self._columns("orders_by_day", fields)} FROM orders_by_day WHERE order_date = %s
         """
-        rows = self.session.execute(query, (user_id,))
-        return list(rows)
+        rows = [row for _, day_rows in self._query_days(query, start_date, end_date) for row in day_rows]
+        return self._decode_rows(Order, rows)
 
-    def get_products_by_user_id(self, user_id):
+    def get_daily_revenue(self, start_date, end_date):
+        # Агрегат считается на узле в пределах одного раздела; дни без заказов пропускаются
         query = """
-        SELECT * FROM products_by_user WHERE user_id = %s
+        SELECT COUNT(*) AS orders, SUM(total) AS revenue FROM orders_by_day WHERE order_date = %s
         """
-        rows = self.session.execute(query, (user_id,))
-        return list(rows)
+        revenue = []
+        for day, rows in self._query_days(query, start_date, end_date):
+            row = rows.one()
+            if row.orders:
+                revenue.append((day, row.revenue) if self.raw else (day.isoformat(), float(row.revenue)))
+        return revenue
+
+    def _products_by_user_queries(self, user_id, fields=None):
+        query = f"""
+        SELECT {self._columns("products_by_user", fields)} FROM products_by_user WHERE user_id = %s
+        """
+        return [(query, (user_id,))]
+
+    def get_products_by_user_id(self, user_id, fields=None):
+        return list(self._iter_rows(Product, self._products_by_user_queries(user_id, fields), PRODUCT_FIELDS))
+
+    def get_products_by_user_id_page(self, user_id, page_size=None, paging_state=None, fields=None):
+        return self._read_page(Product, self._products_by_user_queries(user_id, fields), page_size, paging_state,
+                               PRODUCT_FIELDS)
+
+    def iter_products_by_user_id(self, user_id, fields=None):
+        return self._iter_rows(Product, self._products_by_user_queries(user_id, fields), PRODUCT_FIELDS)
 
     def get_users_with_similar_purchases(self, user_id):
         query = """
         SELECT product_id FROM products_by_user WHERE user_id = %s
         """
-        purchased_products = [row.product_id for row in self.session.execute(query, (user_id,))]
+        purchased_products = [row.product_id for row in self.session.execute(self._statement(query), (user_id,))]
 
         if not purchased_products:
             return []
@@ -141,19 +334,156 @@ class CassandraClient:
             query = """
             SELECT user_id FROM products_by_user WHERE product_id = %s ALLOW FILTERING
             """
-            rows = self.session.execute(query, (product_id,))
+            rows = self.session.execute(self._statement(query, idempotent=False), (product_id,))
             for row in rows:
                 if row.user_id != user_id:
                     similar_users.add(row.user_id)
 
         return list(similar_users)
 
-    def get_products_by_category_id(self, category_id):
+    def _products_by_category_queries(self, category_id, fields=None):
+        if not self.category_buckets:
+            query = f"""
+            SELECT {self._columns("products_by_category", fields)} FROM products_by_category WHERE category_id = %s
+            """
+            return [(query, (category_id,))]
+        query = f"""
+        SELECT {self._columns("products_by_category_bucketed", fields)} FROM products_by_category_bucketed
+        WHERE category_id = %s AND bucket = %s
+        """
+        return [(query, (category_id, bucket)) for bucket in range(self.category_buckets)]
+
+    def get_products_by_category_id(self, category_id, fields=None):
+        return list(self._iter_rows(Product, self._products_by_category_queries(category_id, fields), PRODUCT_FIELDS))
+
+    def get_products_by_category_id_page(self, category_id, page_size=None, paging_state=None, fields=None):
+        return self._read_page(Product, self._products_by_category_queries(category_id, fields), page_size,
+                               paging_state, PRODUCT_FIELDS)
+
+    def iter_products_by_category_id(self, category_id, fields=None):
+        return self._iter_rows(Product, self._products_by_category_queries(category_id, fields), PRODUCT_FIELDS)
+
+    def iter_purchase_pairs(self):
+        query = """
+        SELECT user_id, product_id FROM products_by_user
+        """
+        for row in self.session.execute(query):
+            yield row.user_id, row.product_id
+
+    def iter_orders(self):
         query = """
-        SELECT * FROM products_by_category WHERE category_id = %s
+        SELECT order_id, user_id, order_date, total FROM orders_by_user
         """
-        rows = self.session.execute(query, (category_id,))
-        return list(rows)
+        for row in self.session.execute(query):
+            yield row.order_id, row.user_id, row.order_date, row.total
+
+    def iter_order_items(self):
+        query = """
+        SELECT order_id, product_id, quantity FROM order_items_by_order
+        """
+        for row in self.session.execute(query):
+            yield row.order_id, row.product_id, row.quantity
+
+    def iter_products(self):
+        table = "products_by_category_bucketed" if self.category_buckets else "products_by_category"
+        query = f"""
+        SELECT product_id, product_name, price, category_id FROM {table}
+        """
+        for row in self.session.execute(query):
+            yield row.product_id, row.product_name, row.price, row.category_id
+
+    def _scan(self, table, partition_key, columns, token_range):
+        # Полное чтение одного диапазона токенов таблицы; страницы подгружаются по мере чтения
+        query = f"""
+        SELECT {', '.join(columns)} FROM {table}
+        WHERE token({partition_key}) >= %s AND token({partition_key}) <= %s
+        """
+        return self.session.execute(self._statement(query, idempotent=False), token_range)
+
+    def _scan_ranges(self, aggregate, table, partition_key, columns, splits, workers):
+        # aggregate(rows) считается для каждого диапазона токенов в своём потоке; возвращается список результатов
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(
+                lambda token_range: aggregate(self._scan(table, partition_key, columns, token_range)),
+                token_ranges(splits)))
+
+    def _sum_counters(self, aggregate, table, partition_key, columns, splits, workers):
+        # Частичные суммы {key: {column: value}} по диапазонам складываются
+        totals = {}
+        for partial in self._scan_ranges(aggregate, table, partition_key, columns, splits, workers):
+            for key, values in partial.items():
+                merged = totals.setdefault(key, {})
+                for column, value in values.items():
+                    merged[column] = merged.get(column, 0) + value
+        return totals
+
+    def reconcile_counters(self, splits=64, workers=8):
+        def spend(rows):
+            result = {}
+            for row in rows:
+                values = result.setdefault(row.user_id, {"orders": 0, "spend_cents": 0})
+                values["orders"] += 1
+                values["spend_cents"] += to_cents(row.total or 0)
+            return result
+
+        def purchases(rows):
+            result = {}
+            for row in rows:
+                values = result.setdefault(row.product_id, {"units": 0, "orders": 0, "revenue_cents": 0})
+                values["units"] += row.quantity or 0
+                values["orders"] += 1
+                values["revenue_cents"] += to_cents(row.price or 0) * (row.quantity or 0)
+            return result
+
+        def counters(rows):
+            return {row[0]: {column: getattr(row, column) or 0 for column in row._fields[1:]} for row in rows}
+
+        user_spend = self._sum_counters(spend, "orders_by_user", "user_id", ("user_id", "total"), splits, workers)
+        items = self._sum_counters(purchases, "order_items_by_order", "order_id",
+                                   ("order_id", "product_id", "price", "quantity"), splits, workers)
+        if self.category_buckets:
+            product_table, product_key = "products_by_category_bucketed", "category_id, bucket"
+        else:
+            product_table, product_key = "products_by_category", "category_id"
+        product_categories = {}
+        for partial in self._scan_ranges(lambda rows: {row.product_id: row.category_id for row in rows},
+                                         product_table, product_key, ("product_id", "category_id"), splits, workers):
+            product_categories.update(partial)
+
+        product_counts = {product_id: {"units": values["units"], "orders": values["orders"]}
+                          for product_id, values in items.items()}
+        category_sales = {}
+        for product_id, values in items.items():
+            category_id = product_categories.get(product_id)
+            if category_id is None:
+                continue
+            sales = category_sales.setdefault(category_id, {"order_lines": 0, "units": 0, "revenue_cents": 0})
+            sales["order_lines"] += values["orders"]
+            sales["units"] += values["units"]
+            sales["revenue_cents"] += values["revenue_cents"]
+
+        # Счётчик нельзя присвоить, поэтому к нему прибавляется разница с пересчитанным значением
+        corrected = {}
+        for table, expected in (("user_spend", user_spend), ("product_purchase_counts", product_counts),
+                                ("category_sales", category_sales)):
+            key_column, columns = COUNTER_TABLES[table]
+            actual = self._sum_counters(counters, table, key_column, (key_column, *columns), splits, workers)
+            corrected[table] = 0
+            for key in set(expected) | set(actual):
+                deltas = {column: expected.get(key, {}).get(column, 0) - actual.get(key, {}).get(column, 0)
+                          for column in columns}
+                if any(deltas.values()):
+                    self._increment_counter(table, key, **deltas)
+                    corrected[table] += 1
+        return corrected
+
+    def truncate_all(self):
+        # TRUNCATE всех таблиц keyspace, включая таблицы счётчиков, кроме версии схемы
+        tables = sorted(set(self.session.cluster.metadata.keyspaces[self.keyspace].tables) - {VERSION_TABLE})
+        for table in tables:
+            self.session.execute(f"TRUNCATE {table}")
+        return tables
 
     def close(self):
-        self.cluster.shutdown()
+        if "cluster" in self.__dict__:
+            self.cluster.shutdown()
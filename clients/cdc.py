@@ -0,0 +1,197 @@
+# CDC (change data capture) из PostgreSQL в Redis: PostgreSQL остаётся источником истины,
+# а Redis — кешем для чтения в раскладке ключей RedisClient, без двойной записи в коде приложения.
+#
+# Схема: триггеры из миграций migrations/postgresql_cdc пишут изменённые строки Users, Categories,
+# Products, Orders и Order_Items в change_log и шлют NOTIFY change_log. ChangeFeed забирает журнал пачками
+# (DELETE ... RETURNING с FOR UPDATE SKIP LOCKED), схлопывает изменения до множества затронутых ключей,
+# перечитывает их текущее состояние из PostgreSQL и записывает в Redis. Транзакция с удалением пачки
+# фиксируется только после записи в Redis, поэтому при сбое пачка будет применена повторно (at-least-once);
+# применение идемпотентно: повторная запись того же состояния ничего не меняет (см. RedisClient.upsert_order).
+# Изменения одного ключа применяются по текущему состоянию, поэтому порядок внутри пачки не важен.
+# SKIP LOCKED не даёт второму экземпляру блокироваться, но рассчитана схема на одного потребителя на Redis.
+#
+# Задержка (lag): после каждой пачки в Redis пишется хеш cdc:status с ID и временем последнего применённого
+# изменения; backlog() возвращает число непримененных записей и возраст самой старой из них.
+# Запуск: python -m clients.cdc [--batch-size 500] [--install]
+import argparse
+import datetime
+import logging
+import os
+import select
+
+from clients.lazy_import import lazy_import
+from clients.migrations import migrate
+from clients.redis_client import RedisClient
+
+psycopg2 = lazy_import("psycopg2")
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+CHANNEL = "change_log"
+
+DRAIN_QUERY = """
+DELETE FROM change_log WHERE change_id IN (
+    SELECT change_id FROM change_log ORDER BY change_id LIMIT %s FOR UPDATE SKIP LOCKED
+) RETURNING change_id, table_name, row_data, changed_at
+"""
+
+# Ключ строки журнала по таблице; изменения позиций заказа применяются как изменения заказа
+KEYS = {"users": "user_id", "categories": "category_id", "products": "product_id", "orders": "order_id", "order_items": "order_id"}
+TARGETS = {"order_items": "orders"}
+
+# Порядок применения: продукты до заказов, так как популярность товаров считается по их категории
+CURRENT_STATE = {
+    "users": """SELECT user_id, name, email FROM Users WHERE user_id = ANY(%s)""",
+    "categories": """SELECT category_id, category_name FROM Categories WHERE category_id = ANY(%s)""",
+    "products": """SELECT product_id, name, price, category_id FROM Products WHERE product_id = ANY(%s)""",
+    "orders": """
+        SELECT o.order_id, o.user_id,
+               COALESCE(json_agg(json_build_object('product_id', oi.product_id::text, 'quantity', oi.quantity)
+                                 ORDER BY oi.product_id) FILTER (WHERE oi.order_id IS NOT NULL), '[]'),
+               o.order_date, o.total
+        FROM Orders o
+        LEFT JOIN Order_Items oi ON oi.order_id = o.order_id
+        WHERE o.order_id = ANY(%s)
+        GROUP BY o.order_id, o.order_date
+    """,
+}
+
+
+def _upsert(redis_client, table, row):
+    if table == "users":
+        redis_client.create_user(str(row[0]), row[1], row[2])
+    elif table == "categories":
+        redis_client.create_category(str(row[0]), row[1])
+    elif table == "products":
+        # NULL цены или категории передаётся как None: такой продукт не попадает в соответствующие индексы
+        redis_client.create_product(str(row[0]), row[1], None if row[2] is None else str(row[2]),
+                                    None if row[3] is None else str(row[3]))
+    else:
+        redis_client.upsert_order(str(row[0]), str(row[1]), row[2], row[3], None if row[4] is None else float(row[4]))
+
+
+def _delete(redis_client, table, key):
+    {
+        "users": redis_client.delete_user,
+        "categories": redis_client.delete_category,
+        "products": redis_client.delete_product,
+        "orders": redis_client.delete_order,
+    }[table](str(key))
+
+
+class ChangeFeed:
+    def __init__(self, redis_client=None, database_url=None, batch_size=500):
+        self.database_url = database_url or os.getenv("DATABASE_URL")
+        if not self.database_url:
+            raise ValueError("DATABASE_URL is not set in the environment")
+        self.connection = psycopg2.connect(self.database_url)
+        self.redis = redis_client or RedisClient()
+        self.batch_size = batch_size
+        self.applied = 0
+        self.last_lag = None
+        logging.info("CDC: подключение к PostgreSQL и Redis установлено")
+
+    def install(self):
+        migrate("postgresql_cdc", self.connection)
+        logging.info("CDC: журнал изменений и триггеры установлены")
+
+    def apply(self, cursor, keys):
+        # keys: {table: {key, ...}}; записывает в Redis текущее состояние ключей или удаляет исчезнувшие
+        for table, query in CURRENT_STATE.items():
+            table_keys = keys.get(table)
+            if not table_keys:
+                continue
+            cursor.execute(query, (list(table_keys),))
+            rows = cursor.fetchall()
+            for row in rows:
+                _upsert(self.redis, table, row)
+            for key in table_keys - {row[0] for row in rows}:
+                _delete(self.redis, table, key)
+
+    def drain_batch(self):
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(DRAIN_QUERY, (self.batch_size,))
+                changes = cursor.fetchall()
+                if changes:
+                    keys = {}
+                    for _, table, row_data, _ in changes:
+                        keys.setdefault(TARGETS.get(table, table), set()).add(row_data[KEYS[table]])
+                    self.apply(cursor, keys)
+            self.connection.commit()
+        except Exception:
+            # Пачка остаётся в журнале и будет применена повторно
+            self.connection.rollback()
+            raise
+        if changes:
+            self._record_progress(max(changes))
+        return len(changes)
+
+    def _record_progress(self, last_change):
+        change_id, _, _, changed_at = last_change
+        applied_at = datetime.datetime.now(datetime.timezone.utc)
+        self.last_lag = (applied_at - changed_at).total_seconds()
+        self.redis.client.hset("cdc:status", mapping={
+            "last_change_id": change_id,
+            "last_changed_at": changed_at.isoformat(),
+            "applied_at": applied_at.isoformat(),
+            "lag_seconds": self.last_lag,
+        })
+        logging.info(f"CDC: применены изменения до {change_id}, задержка {self.last_lag:.3f} с")
+
+    def drain(self):
+        total = 0
+        while True:
+            count = self.drain_batch()
+            total += count
+            if count < self.batch_size:
+                self.applied += total
+                return total
+
+    def backlog(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("""SELECT count(*), EXTRACT(EPOCH FROM clock_timestamp() - min(changed_at)) FROM change_log""")
+            pending, oldest_age = cursor.fetchone()
+        self.connection.commit()
+        return pending, float(oldest_age or 0.0)
+
+    def run(self, poll_timeout=5.0):
+        # LISTEN на отдельном соединении в autocommit; таймаут страхует от пропущенных уведомлений
+        listener = psycopg2.connect(self.database_url)
+        listener.autocommit = True
+        listener.cursor().execute(f"LISTEN {CHANNEL}")
+        logging.info("CDC: ожидание изменений")
+        try:
+            while True:
+                self.drain()
+                if select.select([listener], [], [], poll_timeout) != ([], [], []):
+                    listener.poll()
+                    listener.notifies.clear()
+        finally:
+            listener.close()
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CDC из PostgreSQL в Redis")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--poll-timeout", type=float, default=5.0)
+    parser.add_argument("--install", action="store_true", help="создать журнал изменений и триггеры перед запуском")
+    args = parser.parse_args()
+
+    feed = ChangeFeed(batch_size=args.batch_size)
+    if args.install:
+        feed.install()
+    try:
+        feed.run(args.poll_timeout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        feed.close()
+
+
+if __name__ == "__main__":
+    main()
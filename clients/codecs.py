@@ -0,0 +1,90 @@
+# Кодеки для поля items заказа в Redis (order:{order_id} -> items).
+# Исторический формат — JSON-строка без метки: '[{"product_id": "1", "quantity": 1}]'.
+# Компактные форматы начинаются с однобайтовой метки версии, поэтому при чтении
+# формат определяется по первому байту и старые JSON-заказы продолжают читаться:
+# 0x01 — msgpack: массив пар [product_id, quantity];
+# 0x02 — struct: последовательность пар (uint64 product_id, uint32 quantity), little-endian.
+import json
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_TAG = 0x01
+STRUCT_TAG = 0x02
+
+
+class JsonCodec:
+    name = "json"
+
+    def encode(self, items):
+        return json.dumps(items)
+
+    def decode(self, value):
+        return json.loads(value)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("Для кодека msgpack требуется пакет msgpack")
+
+    def encode(self, items):
+        pairs = [[item["product_id"], item["quantity"]] for item in items]
+        return bytes((MSGPACK_TAG,)) + msgpack.packb(pairs, use_bin_type=True)
+
+    def decode(self, value):
+        pairs = msgpack.unpackb(value[1:], raw=False)
+        return [{"product_id": product_id, "quantity": quantity} for product_id, quantity in pairs]
+
+
+class StructCodec:
+    # Фиксированная ширина записи: подходит только для целочисленных ID товаров.
+    # Ключи Redis строковые, поэтому product_id возвращается строкой.
+    name = "struct"
+    pair = struct.Struct("<QI")
+
+    def encode(self, items):
+        values = []
+        try:
+            for item in items:
+                values.append(int(item["product_id"]))
+                values.append(int(item["quantity"]))
+            # struct.error — значение вне диапазона uint64/uint32 (например, отрицательное)
+            return struct.pack(f"<B{'QI' * len(items)}", STRUCT_TAG, *values)
+        except (ValueError, TypeError, struct.error):
+            raise ValueError("Кодек struct поддерживает только целочисленные product_id, используйте msgpack")
+
+    def decode(self, value):
+        return [{"product_id": str(product_id), "quantity": quantity}
+                for product_id, quantity in self.pair.iter_unpack(memoryview(value)[1:])]
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec, MsgpackCodec, StructCodec)}
+
+
+def get_codec(name):
+    if name not in CODECS:
+        raise ValueError(f"Неизвестный кодек {name}, допустимые: {', '.join(CODECS)}")
+    return CODECS[name]()
+
+
+_DECODERS = {}
+
+
+def decode_items(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.encode()
+    tag = value[0] if value else None
+    if tag == MSGPACK_TAG or tag == STRUCT_TAG:
+        codec = _DECODERS.get(tag)
+        if codec is None:
+            codec = _DECODERS[tag] = MsgpackCodec() if tag == MSGPACK_TAG else StructCodec()
+        return codec.decode(value)
+    return json.loads(value)
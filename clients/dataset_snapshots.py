@@ -0,0 +1,182 @@
+# Снимки наборов данных для быстрого восстановления между прогонами бенчмарков и тестов:
+# повторная генерация миллионов строк занимает минуты, восстановление снимка — секунды.
+# - postgresql, postgresql_b: копия базы в базу-шаблон <db>_snapshot_<name> (CREATE DATABASE ... TEMPLATE),
+#   восстановление — пересоздание базы из шаблона. Обе операции копируют файлы базы и требуют, чтобы
+#   к базам не было подключений, поэтому активные соединения к ним разрываются;
+# - mongodb: архив mongodump (--archive --gzip) в DB_SNAPSHOT_DIR, восстановление — mongorestore --drop
+#   (нужны MongoDB Database Tools в PATH);
+# - redis: DUMP всех ключей базы REDIS_DB (с оставшимся TTL) в файл, восстановление — FLUSHDB и RESTORE;
+# - neo4j, cassandra: снимки средствами сервера (neo4j-admin dump, nodetool snapshot) требуют остановки
+#   базы или доступа к узлам, поэтому здесь не поддерживаются; для них есть truncate_all() клиента.
+# Запуск: python -m clients.dataset_snapshots snapshot --backend postgresql --name base
+#         python -m clients.dataset_snapshots restore --backend postgresql --name base
+import argparse
+import logging
+import os
+import pickle
+import shutil
+import subprocess
+from contextlib import closing
+
+from clients.lazy_import import lazy_import
+
+psycopg2 = lazy_import("psycopg2")
+sql = lazy_import("psycopg2.sql")
+extensions = lazy_import("psycopg2.extensions")
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+POSTGRESQL_URLS = {"postgresql": "DATABASE_URL", "postgresql_b": "DATABASE_JSONB_URL"}
+REDIS_BATCH_SIZE = 1000
+
+
+def snapshot_dir():
+    return os.getenv("DB_SNAPSHOT_DIR", "snapshots")
+
+
+def _snapshot_path(backend, name, suffix):
+    return os.path.join(snapshot_dir(), f"{backend}_{name}{suffix}")
+
+
+def _postgresql_databases(backend, name):
+    database_url = os.getenv(POSTGRESQL_URLS[backend])
+    if not database_url:
+        raise ValueError(f"{POSTGRESQL_URLS[backend]} is not set in the environment")
+    database = extensions.parse_dsn(database_url)["dbname"]
+    return database_url, database, f"{database}_snapshot_{name}"
+
+
+def _copy_database(database_url, source, target):
+    # Команды CREATE/DROP DATABASE выполняются из служебной базы postgres вне транзакции
+    connection = psycopg2.connect(extensions.make_dsn(database_url, dbname="postgres"))
+    connection.autocommit = True
+    with closing(connection), connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (source,))
+        if cursor.fetchone() is None:
+            raise ValueError(f"База {source} не найдена")
+        cursor.execute("""
+        SELECT pg_terminate_backend(pid) FROM pg_stat_activity
+        WHERE datname IN (%s, %s) AND pid <> pg_backend_pid()
+        """, (source, target))
+        cursor.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(target)))
+        cursor.execute(sql.SQL("CREATE DATABASE {} TEMPLATE {}").format(sql.Identifier(target), sql.Identifier(source)))
+
+
+def snapshot_postgresql(backend, name):
+    database_url, database, snapshot = _postgresql_databases(backend, name)
+    _copy_database(database_url, database, snapshot)
+    logging.info(f"Снимок базы {database} сохранён в базу-шаблон {snapshot}")
+
+
+def restore_postgresql(backend, name):
+    database_url, database, snapshot = _postgresql_databases(backend, name)
+    _copy_database(database_url, snapshot, database)
+    logging.info(f"База {database} восстановлена из шаблона {snapshot}")
+
+
+def _run_tool(tool, *args):
+    if shutil.which(tool) is None:
+        raise RuntimeError(f"{tool} не найден в PATH: для снимков MongoDB нужны MongoDB Database Tools")
+    subprocess.run([tool, *args], check=True)
+
+
+def _mongo_settings():
+    mongo_url = os.getenv("MONGO_URL")
+    if not mongo_url:
+        raise ValueError("MONGO_URL is not set in the environment")
+    return mongo_url, os.getenv("MONGO_DATABASE", "ecommerce")
+
+
+def snapshot_mongodb(name):
+    mongo_url, database = _mongo_settings()
+    path = _snapshot_path("mongodb", name, ".archive.gz")
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    _run_tool("mongodump", f"--uri={mongo_url}", f"--db={database}", f"--archive={path}", "--gzip")
+    logging.info(f"Снимок базы MongoDB {database} сохранён в {path}")
+
+
+def restore_mongodb(name):
+    mongo_url, database = _mongo_settings()
+    path = _snapshot_path("mongodb", name, ".archive.gz")
+    _run_tool("mongorestore", f"--uri={mongo_url}", f"--archive={path}", "--gzip", "--drop", f"--nsInclude={database}.*")
+    logging.info(f"База MongoDB {database} восстановлена из {path}")
+
+
+def snapshot_redis(name, redis_client=None):
+    from clients.redis_client import RedisClient
+
+    redis_client = redis_client or RedisClient()
+    keys = list(redis_client.client.scan_iter(count=REDIS_BATCH_SIZE))
+    entries = []
+    for start in range(0, len(keys), REDIS_BATCH_SIZE):
+        batch = keys[start:start + REDIS_BATCH_SIZE]
+        pipeline = redis_client.binary_client.pipeline(transaction=False)
+        for key in batch:
+            pipeline.dump(key)
+            pipeline.pttl(key)
+        results = pipeline.execute()
+        entries += [(key, ttl, payload) for key, payload, ttl in zip(batch, results[::2], results[1::2]) if payload is not None]
+    path = _snapshot_path("redis", name, ".pickle")
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    with open(path, "wb") as snapshot_file:
+        pickle.dump(entries, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    logging.info(f"Снимок Redis сохранён в {path}: {len(entries)} ключей")
+
+
+def restore_redis(name, redis_client=None):
+    from clients.redis_client import RedisClient
+
+    redis_client = redis_client or RedisClient()
+    path = _snapshot_path("redis", name, ".pickle")
+    with open(path, "rb") as snapshot_file:
+        entries = pickle.load(snapshot_file)
+    redis_client.truncate_all()
+    for start in range(0, len(entries), REDIS_BATCH_SIZE):
+        pipeline = redis_client.binary_client.pipeline(transaction=False)
+        for key, ttl, payload in entries[start:start + REDIS_BATCH_SIZE]:
+            # PTTL -1 означает ключ без срока жизни, для RESTORE это TTL 0
+            pipeline.restore(key, max(ttl, 0), payload, replace=True)
+        pipeline.execute()
+    logging.info(f"Redis восстановлен из {path}: {len(entries)} ключей")
+
+
+def _unsupported(backend):
+    def operation(name):
+        raise ValueError(f"Снимки не поддерживаются для {backend}: используйте truncate_all() клиента и загрузку данных")
+    return operation
+
+
+SNAPSHOTS = {
+    "postgresql": (lambda name: snapshot_postgresql("postgresql", name), lambda name: restore_postgresql("postgresql", name)),
+    "postgresql_b": (lambda name: snapshot_postgresql("postgresql_b", name), lambda name: restore_postgresql("postgresql_b", name)),
+    "mongodb": (snapshot_mongodb, restore_mongodb),
+    "redis": (snapshot_redis, restore_redis),
+    "neo4j": (_unsupported("neo4j"), _unsupported("neo4j")),
+    "cassandra": (_unsupported("cassandra"), _unsupported("cassandra")),
+}
+
+
+def snapshot(backend, name):
+    if backend not in SNAPSHOTS:
+        raise ValueError(f"Неизвестный backend {backend}, допустимые: {', '.join(SNAPSHOTS)}")
+    SNAPSHOTS[backend][0](name)
+
+
+def restore(backend, name):
+    if backend not in SNAPSHOTS:
+        raise ValueError(f"Неизвестный backend {backend}, допустимые: {', '.join(SNAPSHOTS)}")
+    SNAPSHOTS[backend][1](name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Снимки наборов данных для быстрого восстановления")
+    parser.add_argument("action", choices=("snapshot", "restore"))
+    parser.add_argument("--backend", choices=list(SNAPSHOTS), required=True)
+    parser.add_argument("--name", default="base", help="имя снимка")
+    args = parser.parse_args()
+    (snapshot if args.action == "snapshot" else restore)(args.backend, args.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# Разбор границ диапазонов дат для методов get_orders_by_user_in_range, get_orders_in_range и get_daily_revenue.
+# Границы принимаются строкой "YYYY-MM-DD" или datetime.date и включаются в диапазон с обеих сторон.
+# В MongoDB, Neo4j и Redis даты заказов хранятся строками ISO 8601, поэтому их лексикографический порядок
+# совпадает с хронологическим.
+import datetime
+
+
+def as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+def iso_date(value):
+    return as_date(value).isoformat()
+
+
+def date_bounds(start_date, end_date):
+    start_date, end_date = as_date(start_date), as_date(end_date)
+    if start_date > end_date:
+        raise ValueError(f"Начало диапазона {start_date} позже конца {end_date}")
+    return start_date, end_date
+
+
+def days_between(start_date, end_date):
+    start_date, end_date = date_bounds(start_date, end_date)
+    return [start_date + datetime.timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def month_start(value):
+    return as_date(value).replace(day=1)
+
+
+def day_number(value):
+    # Номер дня (ordinal) — score дат в упорядоченных множествах Redis
+    return as_date(value).toordinal()
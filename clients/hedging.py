@@ -0,0 +1,146 @@
+# Хеджированные чтения против хвостовых задержек: если идемпотентное чтение не ответило за delay секунд
+# (медленная реплика, пауза GC), тот же запрос отправляется второй раз и возвращается первый успешный ответ.
+# Проигравший запрос не отменяется — драйверы не умеют прерывать выполняющийся запрос, — его результат отбрасывается.
+#
+# HedgingPolicy задаёт задержку второго запроса:
+# - delay — фиксированная, с;
+# - без delay — перцентиль percentile (например, p95) задержек последних window запросов; пока накоплено меньше
+#   min_samples замеров, запросы не хеджируются.
+# budget ограничивает долю хеджированных запросов (0.1 — не больше 10% дополнительной нагрузки): каждый запрос
+# добавляет budget токенов, каждый второй запрос тратит один. Так деградация базы, при которой медленными
+# становятся все запросы, не удваивает на неё нагрузку.
+#
+# HedgedClient — обёртка клиента, хеджирующая методы чтения (по умолчанию все get_*; iter_* возвращают генераторы,
+# а запись не идемпотентна). Оба запроса выполняются в пуле потоков политики, поэтому клиент должен допускать
+# одновременные вызовы из разных потоков: так устроены клиенты MongoDB, Neo4j, Cassandra и Redis (пулы соединений
+# драйверов). Клиенты PostgreSQL используют один курсор и не хеджируются — для них есть чтение с реплик
+# (clients/pg_routing.py). hedge_client — отдельный экземпляр для второго запроса, например подключённый к другой
+# реплике. Для Cassandra то же самое на уровне драйвера делает speculative_execution профиля настройки
+# (clients/tuning.py). Выигрыш в хвосте и цену в дополнительных запросах измеряет benchmark/hedging_benchmark.py.
+#
+# Пример: client = HedgedClient(MongoDBClient(), HedgingPolicy(percentile=95, budget=0.05))
+import collections
+import concurrent.futures
+import functools
+import threading
+import time
+
+# Сколько новых замеров накапливается между пересчётами перцентиля
+RECOMPUTE_EVERY = 50
+# Наибольший запас токенов бюджета: серия медленных запросов после затишья хеджируется не вся
+MAX_BUDGET_TOKENS = 10.0
+
+
+class HedgingPolicy:
+    def __init__(self, delay=None, percentile=95, window=1000, min_samples=100, budget=0.1, max_workers=64):
+        if delay is not None and delay < 0:
+            raise ValueError("Задержка хеджирования не может быть отрицательной")
+        if not 0 < percentile < 100:
+            raise ValueError("Перцентиль задержки хеджирования должен быть в интервале (0, 100)")
+        if not 0 <= budget <= 1:
+            raise ValueError("Бюджет хеджирования — доля запросов от 0 до 1")
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget
+        self.latencies = collections.deque(maxlen=window)
+        self.adaptive_delay = None
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix="hedging")
+        self.tokens = 0.0
+        self.recorded = 0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self):
+        # None — второй запрос не отправляется
+        return self.delay if self.delay is not None else self.adaptive_delay
+
+    def record(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            self.recorded += 1
+            if self.delay is not None or len(self.latencies) < self.min_samples or self.recorded % RECOMPUTE_EVERY:
+                return
+            latencies = sorted(self.latencies)
+        self.adaptive_delay = latencies[min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))]
+
+    def _start_request(self):
+        with self.lock:
+            self.requests += 1
+            self.tokens = min(self.tokens + self.budget, MAX_BUDGET_TOKENS)
+
+    def _acquire_hedge(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            self.hedges += 1
+            return True
+
+    def _timed(self, function, args, kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.record(time.perf_counter() - start)
+        return result
+
+    def execute(self, primary, hedge, *args, **kwargs):
+        # primary и hedge — один и тот же метод чтения (возможно, разных экземпляров клиента)
+        self._start_request()
+        delay = self.hedge_delay()
+        first = self.executor.submit(self._timed, primary, args, kwargs)
+        try:
+            return first.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            # TimeoutError самого запроса (он совпадает с concurrent.futures.TimeoutError) не хеджируется
+            if first.done() or not self._acquire_hedge():
+                return first.result()
+        second = self.executor.submit(self._timed, hedge, args, kwargs)
+        pending = {first, second}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        with self.lock:
+                            self.hedge_wins += 1
+                    return future.result()
+        # Ошибка в обоих запросах: возвращается ошибка первого
+        return first.result()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "extra_load": self.hedges / self.requests if self.requests else 0.0,
+                "delay": self.hedge_delay(),
+            }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class HedgedClient:
+    def __init__(self, client, policy, methods=None, hedge_client=None):
+        self.client = client
+        self.hedge_client = hedge_client if hedge_client is not None else client
+        self.policy = policy
+        self.methods = frozenset(methods) if methods is not None else None
+
+    def hedged(self, name):
+        return name in self.methods if self.methods is not None else name.startswith("get_")
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute) or not self.hedged(name):
+            return attribute
+        return functools.partial(self.policy.execute, attribute, getattr(self.hedge_client, name))
+
+    def close(self):
+        for client in {id(self.client): self.client, id(self.hedge_client): self.hedge_client}.values():
+            close = getattr(client, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,262 @@
+# Инструментирование клиентов: метрики по каждому публичному методу.
+# Для каждой пары (backend, method) собираются: число вызовов, число ошибок, гистограмма задержек,
+# число возвращённых строк и, где драйвер это позволяет, байты запросов/ответов
+# (сейчас только MongoDB — через CommandListener pymongo).
+#
+# Включение: CLIENT_METRICS=1. Без него декоратор @instrumented возвращает класс без изменений,
+# поэтому в выключенном состоянии накладных расходов нет совсем.
+# Экспорт в текстовом формате Prometheus:
+# - CLIENT_METRICS_PORT=9100 — HTTP-эндпоинт http://localhost:9100/metrics;
+# - CLIENT_METRICS_DUMP=/tmp/metrics.prom — периодическая запись в файл (интервал CLIENT_METRICS_DUMP_INTERVAL, с).
+# Экспортёры запускаются один раз при первом создании инструментированного клиента.
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+# Границы корзин гистограммы задержек в секундах (как у клиентских библиотек Prometheus)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def metrics_enabled():
+    return os.getenv("CLIENT_METRICS", "").lower() in ("1", "true", "yes")
+
+
+class MethodMetrics:
+    __slots__ = ("calls", "errors", "rows", "bytes_in", "bytes_out", "latency_sum", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.current = threading.local()
+
+    def _get(self, backend, method):
+        key = (backend, method)
+        metrics = self.metrics.get(key)
+        if metrics is None:
+            metrics = self.metrics[key] = MethodMetrics()
+        return metrics
+
+    def observe(self, backend, method, latency, rows=0, error=False):
+        position = 0
+        while position < len(LATENCY_BUCKETS) and latency > LATENCY_BUCKETS[position]:
+            position += 1
+        with self.lock:
+            metrics = self._get(backend, method)
+            metrics.calls += 1
+            metrics.errors += error
+            metrics.rows += rows
+            metrics.latency_sum += latency
+            metrics.buckets[position] += 1
+
+    def add_bytes(self, bytes_in=0, bytes_out=0):
+        # Байты относятся к методу клиента, который сейчас выполняется в этом потоке
+        call = getattr(self.current, "call", None)
+        if call is None:
+            return
+        with self.lock:
+            metrics = self._get(*call)
+            metrics.bytes_in += bytes_in
+            metrics.bytes_out += bytes_out
+
+    def reset(self):
+        with self.lock:
+            self.metrics.clear()
+
+    def render(self):
+        with self.lock:
+            snapshot = sorted(self.metrics.items())
+            lines = []
+            for name, kind, help_text, value in (
+                ("db_client_calls_total", "counter", "Число вызовов метода клиента", lambda m: m.calls),
+                ("db_client_errors_total", "counter", "Число вызовов, завершившихся исключением", lambda m: m.errors),
+                ("db_client_rows_total", "counter", "Число строк (документов, записей), возвращённых методом", lambda m: m.rows),
+                ("db_client_bytes_sent_total", "counter", "Байты запросов к базе (если драйвер их сообщает)", lambda m: m.bytes_out),
+                ("db_client_bytes_received_total", "counter", "Байты ответов базы (если драйвер их сообщает)", lambda m: m.bytes_in),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += [f'{name}{{backend="{backend}",method="{method}"}} {value(metrics)}'
+                          for (backend, method), metrics in snapshot]
+            lines += ["# HELP db_client_latency_seconds Задержка метода клиента",
+                      "# TYPE db_client_latency_seconds histogram"]
+            for (backend, method), metrics in snapshot:
+                labels = f'backend="{backend}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), metrics.buckets):
+                    cumulative += count
+                    lines.append(f'db_client_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"db_client_latency_seconds_sum{{{labels}}} {metrics.latency_sum}")
+                lines.append(f"db_client_latency_seconds_count{{{labels}}} {metrics.calls}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def count_rows(result, name=""):
+    if result is None:
+        return 0
+    if name.endswith("_page") and isinstance(result, tuple):
+        # Методы *_page возвращают (строки страницы, paging_state)
+        return count_rows(result[0])
+    if isinstance(result, (list, tuple)) and not hasattr(result, "_fields"):
+        return len(result)
+    if isinstance(result, dict) and not result:
+        return 0
+    return 1
+
+
+def _wrap_method(backend, name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        previous = getattr(registry.current, "call", None)
+        registry.current.call = (backend, name)
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            registry.observe(backend, name, time.perf_counter() - start, error=True)
+            raise
+        finally:
+            registry.current.call = previous
+        if inspect.isgenerator(result):
+            return _wrap_generator(backend, name, result, start)
+        registry.observe(backend, name, time.perf_counter() - start, count_rows(result, name))
+        return result
+    return wrapper
+
+
+def _wrap_generator(backend, name, generator, start):
+    # Для потоковых методов (iter_*) время и строки учитываются после исчерпания генератора.
+    # На время каждого next() вызов снова становится текущим, чтобы учитывались байты догрузки страниц (getMore)
+    rows = 0
+    while True:
+        previous = getattr(registry.current, "call", None)
+        registry.current.call = (backend, name)
+        try:
+            row = next(generator)
+        except StopIteration:
+            break
+        except Exception:
+            registry.observe(backend, name, time.perf_counter() - start, rows, error=True)
+            raise
+        finally:
+            registry.current.call = previous
+        rows += 1
+        yield row
+    registry.observe(backend, name, time.perf_counter() - start, rows)
+
+
+def instrument_class(cls, backend):
+    for name, attribute in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(attribute):
+            continue
+        setattr(cls, name, _wrap_method(backend, name, attribute))
+    original_init = cls.__init__
+
+    @functools.wraps(original_init)
+    def init(self, *args, **kwargs):
+        start_exporters()
+        original_init(self, *args, **kwargs)
+    cls.__init__ = init
+    return cls
+
+
+def instrumented(backend):
+    def decorator(cls):
+        return instrument_class(cls, backend) if metrics_enabled() else cls
+    return decorator
+
+
+def start_http_server(port, host="127.0.0.1"):
+    # http.server (и ssl, который он тянет) импортируется, только если эндпоинт включён
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Метрики клиентов доступны на http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def start_periodic_dump(path, interval=15.0):
+    def dump():
+        while True:
+            time.sleep(interval)
+            write_metrics(path)
+    threading.Thread(target=dump, daemon=True).start()
+    logger.info(f"Метрики клиентов записываются в {path} каждые {interval} с")
+
+
+def write_metrics(path):
+    # Запись через временный файл, чтобы читатель (например, node_exporter textfile) не увидел половину файла
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as metrics_file:
+        metrics_file.write(registry.render())
+    os.replace(temporary, path)
+
+
+_exporters_lock = threading.Lock()
+_exporters_started = False
+
+
+def start_exporters():
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    port = os.getenv("CLIENT_METRICS_PORT")
+    if port:
+        start_http_server(int(port))
+    dump_path = os.getenv("CLIENT_METRICS_DUMP")
+    if dump_path:
+        start_periodic_dump(dump_path, float(os.getenv("CLIENT_METRICS_DUMP_INTERVAL", 15)))
+
+
+def mongo_command_listener():
+    # Размеры команд и ответов MongoDB считаются по их BSON-представлению
+    import bson
+    from pymongo import monitoring
+
+    class BytesListener(monitoring.CommandListener):
+        def started(self, event):
+            registry.add_bytes(bytes_out=len(bson.encode(event.command)))
+
+        def succeeded(self, event):
+            registry.add_bytes(bytes_in=len(bson.encode(event.reply)))
+
+        def failed(self, event):
+            pass
+
+    return BytesListener()
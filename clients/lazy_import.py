@@ -0,0 +1,26 @@
+# Отложенный импорт драйверов: модуль загружается при первом обращении к его атрибуту.
+# Клиенты импортируют драйверы так (psycopg2 = lazy_import("psycopg2")), чтобы импорт модуля клиента,
+# справка CLI и короткоживущие процессы, которым нужен один backend, не платили за загрузку драйвера
+# до первого подключения. Время холодного старта измеряет benchmark/startup_benchmark.py.
+import importlib
+
+
+class LazyModule:
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
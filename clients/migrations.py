@@ -0,0 +1,295 @@
+# Версионированные миграции схем: скрипты migrations/<компонент>/NNNN_имя.<sql|cql|cypher|json> применяются
+# по порядку версий, номер применённой версии записывается в саму базу:
+# - postgresql, postgresql_b, postgresql_cdc: таблица schema_migrations (компонент, версия); каждый скрипт
+#   выполняется в одной транзакции с записью версии под advisory-блокировкой, поэтому параллельные запуски
+#   не применяют скрипт дважды. postgresql_cdc — журнал изменений и триггеры CDC в базе DATABASE_URL;
+# - mongodb: коллекция schema_migrations; скрипт — JSON со списком индексов {"collection", "keys", "options"};
+# - neo4j: узлы :SchemaMigration; скрипт — команды Cypher через ";" (каждая в своей транзакции);
+# - cassandra: таблица <keyspace>.schema_migrations; скрипт — команды CQL через ";",
+#   {keyspace} заменяется на CASSANDRA_KEYSPACE.
+# Redis схемы не имеет. Миграции только добавляются (откат не поддерживается), уже применённые скрипты не
+# изменяются — исправления оформляются следующей версией.
+#
+# Конструкторы клиентов не выполняют DDL, а только сверяют версию схемы (check_schema, один запрос) и падают
+# с RuntimeError, если база отстаёт от скриптов.
+# Запуск: python -m clients.migrations migrate [--backend postgresql cassandra ...] [--to N]
+#         python -m clients.migrations status
+import argparse
+import datetime
+import functools
+import json
+import logging
+import os
+import re
+
+from clients.tuning import cassandra_options, mongo_options, tuning_for
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+MIGRATIONS_PATH = os.path.join(os.path.dirname(__file__), "..", "migrations")
+# Порядок применения: журнал CDC ставит триггеры на таблицы postgresql
+COMPONENTS = ("postgresql", "postgresql_cdc", "postgresql_b", "mongodb", "neo4j", "cassandra")
+SCRIPT_PATTERN = re.compile(r"^(\d{4})_(\w+)\.(sql|cql|cypher|json)$")
+VERSION_TABLE = "schema_migrations"
+
+
+@functools.lru_cache(maxsize=None)
+def scripts(component):
+    # [(версия, имя, путь)] по возрастанию версий; версии идут подряд с 1
+    directory = os.path.join(MIGRATIONS_PATH, component)
+    found = []
+    for file_name in sorted(os.listdir(directory)):
+        match = SCRIPT_PATTERN.match(file_name)
+        if match:
+            found.append((int(match.group(1)), match.group(2), os.path.join(directory, file_name)))
+    versions = [version for version, _, _ in found]
+    if versions != list(range(1, len(found) + 1)):
+        raise ValueError(f"Версии миграций {component} должны идти подряд с 0001: {versions}")
+    return tuple(found)
+
+
+def latest_version(component):
+    return len(scripts(component))
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as script_file:
+        return script_file.read()
+
+
+def _statements(script):
+    # Команды CQL и Cypher через ";"; строки-комментарии (-- и //) отбрасываются
+    lines = [line for line in script.splitlines() if not line.strip().startswith(("--", "//"))]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def create_mongo_indexes(db, spec):
+    for index in spec["indexes"]:
+        db[index["collection"]].create_index([tuple(key) for key in index["keys"]], **index.get("options", {}))
+
+
+def recreate_mongo_indexes(db):
+    # Индексы всех скриптов mongodb, например после удаления коллекций; create_index существующего индекса ничего не делает
+    for _, _, path in scripts("mongodb"):
+        create_mongo_indexes(db, json.loads(_read(path)))
+
+
+class PostgreSQLSchema:
+    def __init__(self, connection, component):
+        self.connection = connection
+        self.component = component
+
+    def current_version(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (VERSION_TABLE,))
+            version = 0
+            if cursor.fetchone()[0]:
+                cursor.execute(f"SELECT COALESCE(max(version), 0) FROM {VERSION_TABLE} WHERE component = %s", (self.component,))
+                version = cursor.fetchone()[0]
+        if not self.connection.autocommit:
+            self.connection.rollback()
+        return version
+
+    def apply(self, version, name, script):
+        autocommit = self.connection.autocommit
+        self.connection.autocommit = False
+        try:
+            with self.connection, self.connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (VERSION_TABLE,))
+                cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+                    component TEXT NOT NULL,
+                    version INT NOT NULL,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    PRIMARY KEY (component, version)
+                )""")
+                cursor.execute(f"SELECT 1 FROM {VERSION_TABLE} WHERE component = %s AND version = %s", (self.component, version))
+                if cursor.fetchone():
+                    # Скрипт применил параллельный запуск, пока этот ждал блокировку
+                    return False
+                cursor.execute(script)
+                cursor.execute(f"INSERT INTO {VERSION_TABLE} (component, version, name) VALUES (%s, %s, %s)",
+                               (self.component, version, name))
+            return True
+        finally:
+            self.connection.autocommit = autocommit
+
+
+class MongoSchema:
+    def __init__(self, db, component):
+        self.db = db
+        self.component = component
+
+    def current_version(self):
+        latest = self.db[VERSION_TABLE].find_one({"component": self.component}, sort=[("version", -1)])
+        return latest["version"] if latest else 0
+
+    def apply(self, version, name, script):
+        create_mongo_indexes(self.db, json.loads(script))
+        self.db[VERSION_TABLE].replace_one({"_id": f"{self.component}:{version}"}, {
+            "component": self.component, "version": version, "name": name,
+            "applied_at": datetime.datetime.now(datetime.timezone.utc),
+        }, upsert=True)
+        return True
+
+
+class Neo4jSchema:
+    def __init__(self, driver, component):
+        self.driver = driver
+        self.component = component
+
+    def current_version(self):
+        query = "MATCH (m:SchemaMigration {component: $component}) RETURN max(m.version) AS version"
+        with self.driver.session() as session:
+            return session.run(query, component=self.component).single()["version"] or 0
+
+    def apply(self, version, name, script):
+        # Команды изменения схемы нельзя смешивать с записью данных в одной транзакции
+        with self.driver.session() as session:
+            for statement in _statements(script):
+                session.run(statement).consume()
+            session.run("""
+            MERGE (m:SchemaMigration {component: $component, version: $version})
+            SET m.name = $name, m.applied_at = datetime()
+            """, component=self.component, version=version, name=name).consume()
+        return True
+
+
+class CassandraSchema:
+    def __init__(self, session, component, keyspace):
+        self.session = session
+        self.component = component
+        self.keyspace = keyspace
+
+    def current_version(self):
+        keyspace = self.session.cluster.metadata.keyspaces.get(self.keyspace)
+        if keyspace is None or VERSION_TABLE not in keyspace.tables:
+            return 0
+        row = self.session.execute(f"SELECT version FROM {self.keyspace}.{VERSION_TABLE} WHERE component = %s LIMIT 1",
+                                   (self.component,)).one()
+        return row.version if row else 0
+
+    def apply(self, version, name, script):
+        # Драйвер дожидается согласования схемы узлами после каждой команды DDL
+        for statement in _statements(script.replace("{keyspace}", self.keyspace)):
+            self.session.execute(statement)
+        self.session.execute(f"""
+        CREATE TABLE IF NOT EXISTS {self.keyspace}.{VERSION_TABLE} (
+            component TEXT,
+            version INT,
+            name TEXT,
+            applied_at TIMESTAMP,
+            PRIMARY KEY (component, version)
+        ) WITH CLUSTERING ORDER BY (version DESC)
+        """)
+        self.session.execute(f"INSERT INTO {self.keyspace}.{VERSION_TABLE} (component, version, name, applied_at) "
+                             f"VALUES (%s, %s, %s, toTimestamp(now()))", (self.component, version, name))
+        return True
+
+
+SCHEMAS = {
+    "postgresql": PostgreSQLSchema,
+    "postgresql_cdc": PostgreSQLSchema,
+    "postgresql_b": PostgreSQLSchema,
+    "mongodb": MongoSchema,
+    "neo4j": Neo4jSchema,
+    "cassandra": CassandraSchema,
+}
+
+
+def schema_for(component, handle, **options):
+    # handle: соединение psycopg2, база pymongo, драйвер neo4j или сессия cassandra (с keyspace=...)
+    if component not in SCHEMAS:
+        raise ValueError(f"Неизвестный компонент схемы {component}, допустимые: {', '.join(SCHEMAS)}")
+    return SCHEMAS[component](handle, component, **options)
+
+
+def check_schema(component, handle, **options):
+    current, latest = schema_for(component, handle, **options).current_version(), latest_version(component)
+    if current < latest:
+        raise RuntimeError(f"Схема {component} версии {current}, код ожидает версию {latest}: "
+                           f"выполните python -m clients.migrations migrate --backend {component}")
+    if current > latest:
+        logger.warning(f"Схема {component} версии {current} новее скриптов миграций ({latest})")
+    return current
+
+
+def migrate(component, handle=None, target=None, **options):
+    # Применяет недостающие скрипты до версии target (по умолчанию последней); возвращает применённые версии.
+    # Без handle подключение открывается по переменным окружения и закрывается в конце
+    if handle is None:
+        handle, options, close = connect(component, options.get("database"))
+    else:
+        close = None
+    try:
+        schema = schema_for(component, handle, **options)
+        target = latest_version(component) if target is None else target
+        applied = []
+        for version, name, path in scripts(component)[schema.current_version():target]:
+            if schema.apply(version, name, _read(path)):
+                logger.info(f"Миграция {component} {version:04d}_{name} применена")
+                applied.append(version)
+        return applied
+    finally:
+        if close is not None:
+            close()
+
+
+def connect(component, database=None):
+    # Возвращает (handle, параметры schema_for, функция закрытия); драйвер импортируется только нужный
+    if component in ("postgresql", "postgresql_cdc", "postgresql_b"):
+        import psycopg2
+
+        variable = "DATABASE_JSONB_URL" if component == "postgresql_b" else "DATABASE_URL"
+        database_url = os.getenv(variable)
+        if not database_url:
+            raise ValueError(f"{variable} is not set in the environment")
+        connection = psycopg2.connect(database_url, **tuning_for("postgresql"))
+        return connection, {}, connection.close
+    if component == "mongodb":
+        from pymongo import MongoClient
+
+        mongo_url = os.getenv("MONGO_URL")
+        if not mongo_url:
+            raise ValueError("MONGO_URL is not set in the environment")
+        client = MongoClient(mongo_url, **mongo_options(tuning_for("mongodb")))
+        return client.get_database(database or os.getenv("MONGO_DATABASE", "ecommerce")), {}, client.close
+    if component == "neo4j":
+        from neo4j import GraphDatabase
+
+        driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD")),
+                                      **tuning_for("neo4j"))
+        return driver, {}, driver.close
+    if component == "cassandra":
+        from cassandra.cluster import Cluster
+
+        cluster_options, _ = cassandra_options(tuning_for("cassandra"))
+        cluster = Cluster(os.getenv("CASSANDRA_CONTACT_POINTS", "localhost").split(","),
+                          port=int(os.getenv("CASSANDRA_PORT", 9042)), **cluster_options)
+        return cluster.connect(), {"keyspace": os.getenv("CASSANDRA_KEYSPACE", "test_keyspace")}, cluster.shutdown
+    raise ValueError(f"Неизвестный компонент схемы {component}, допустимые: {', '.join(SCHEMAS)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схем баз данных")
+    parser.add_argument("action", choices=("migrate", "status"))
+    parser.add_argument("--backend", nargs="+", choices=COMPONENTS, default=list(COMPONENTS))
+    parser.add_argument("--to", type=int, default=None, help="версия, до которой применять миграции")
+    args = parser.parse_args()
+
+    for component in args.backend:
+        if args.action == "migrate":
+            applied = migrate(component, target=args.to)
+            print(f"{component}: применены версии {applied or 'нет'}")
+            continue
+        handle, options, close = connect(component)
+        try:
+            print(f"{component}: версия {schema_for(component, handle, **options).current_version()} из {latest_version(component)}")
+        finally:
+            close()
+
+
+if __name__ == "__main__":
+    main()
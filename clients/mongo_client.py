@@ -15,6 +15,13 @@
 #     { "product_id": ObjectId("..."), "quantity": 2 }
 #   ]
 # }
+# В режиме встроенных снимков продуктов (embed_products=True или MONGO_EMBED_PRODUCTS=1) позиция заказа
+# дополнительно хранит снимок продукта на момент покупки:
+#     { "product_id": ObjectId("..."), "quantity": 2, "product_name": "Product A", "price": 50.00,
+#       "category_id": ObjectId("...") }
+# Купленные продукты и детали заказа тогда читаются одним запросом по orders без второго $in по products;
+# price остаётся ценой покупки, а переименование продукта и смену категории переносит в заказы
+# фоновая задача clients/mongo_snapshots.py (изменения ставятся в очередь product_snapshot_changes).
 # Коллекция products:
 # {
 #   "_id": ObjectId("..."),
@@ -29,23 +36,121 @@
 # }
 
 
+import datetime
+import functools
+import itertools
 import os
 import logging
-from pymongo import MongoClient
-from bson.objectid import ObjectId
+
+from clients.date_range import date_bounds
+from clients.instrumentation import instrumented, metrics_enabled, mongo_command_listener
+from clients.lazy_import import lazy_import
+from clients.migrations import VERSION_TABLE, check_schema, recreate_mongo_indexes
+from clients.records import User, Product, Category, Order, from_mapping, from_mappings, items_from_mappings, check_fields
+from clients.tuning import mongo_options, tuning_for
+
+bson = lazy_import("bson")
+pymongo = lazy_import("pymongo")
 
 logger = logging.getLogger()
 logging.basicConfig(level=logging.INFO)
 
-class MongoDBClient:
+USER_FIELDS = {"user_id": "_id"}
+PRODUCT_FIELDS = {"product_id": "_id"}
+CATEGORY_FIELDS = {"category_id": "_id"}
+ORDER_FIELDS = {"order_id": "_id"}
+DEFAULT_BULK_BATCH_SIZE = 1000
+
+
+class BulkResult:
+    # Итог пакетной записи: ids — _id в порядке входных документов (None для не записанных),
+    # errors — ошибки отдельных документов {"index", "code", "message"} с индексом во входной последовательности,
+    # write_concern_errors — ошибки подтверждения записи {"start", "end", "code", "message"} для пакета документов
+    # [start, end): документы записаны, но требуемый write concern не подтверждён
     def __init__(self):
-        mongo_url = os.getenv('MONGO_URL')
-        if not mongo_url:
+        self.ids = []
+        self.errors = []
+        self.write_concern_errors = []
+        self.matched = 0
+        self.modified = 0
+
+    def record_bulk_error(self, offset, details):
+        # details — BulkWriteError.details для пакета, начинающегося с индекса offset
+        for write_error in details.get("writeErrors", []):
+            index = offset + write_error["index"]
+            self.ids[index] = None
+            self.errors.append({"index": index, "code": write_error.get("code"), "message": write_error.get("errmsg")})
+        for concern_error in details.get("writeConcernErrors", []):
+            self.write_concern_errors.append({"start": offset, "end": len(self.ids), "code": concern_error.get("code"),
+                                              "message": concern_error.get("errmsg")})
+
+    def fail_chunk(self, offset, error):
+        # Пакет не записан целиком или записан неизвестно насколько (например, AutoReconnect):
+        # все его документы считаются не записанными
+        for index in range(offset, len(self.ids)):
+            self.ids[index] = None
+            self.errors.append({"index": index, "code": getattr(error, "code", None), "message": str(error)})
+
+    @property
+    def succeeded(self):
+        return sum(1 for document_id in self.ids if document_id is not None)
+
+    def __repr__(self):
+        return (f"BulkResult(succeeded={self.succeeded}, failed={len(self.errors)}, modified={self.modified}, "
+                f"write_concern_errors={len(self.write_concern_errors)})")
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@instrumented("mongodb")
+class MongoDBClient:
+    def __init__(self, raw=False, bulk_batch_size=None, embed_products=None, database=None, tuning=None):
+        self.raw = raw
+        self.tuning = tuning_for("mongodb", tuning)
+        self.bulk_batch_size = bulk_batch_size or int(os.getenv("MONGO_BULK_BATCH_SIZE", DEFAULT_BULK_BATCH_SIZE))
+        if embed_products is None:
+            embed_products = os.getenv("MONGO_EMBED_PRODUCTS", "").lower() in ("1", "true", "yes")
+        self.embed_products = embed_products
+        self.mongo_url = os.getenv('MONGO_URL')
+        if not self.mongo_url:
             raise ValueError("MONGO_URL is not set in the environment")
+        self.database = database or os.getenv("MONGO_DATABASE", "ecommerce")
+
+    # Клиент и проверка версии схемы создаются при первом обращении к базе
+    @functools.cached_property
+    def client(self):
+        event_listeners = [mongo_command_listener()] if metrics_enabled() else []
+        return pymongo.MongoClient(self.mongo_url, event_listeners=event_listeners, **mongo_options(self.tuning))
 
-        self.client = MongoClient(mongo_url)
-        self.db = self.client.get_database("ecommerce")
+    @functools.cached_property
+    def db(self):
+        db = self.client.get_database(self.database)
+        check_schema("mongodb", db)
         logging.info("Подключение к MongoDB установлено")
+        return db
+
+    def truncate_all(self):
+        # Удаление коллекций быстрее delete_many({}); версия схемы сохраняется, индексы миграций создаются заново
+        for name in self.db.list_collection_names():
+            if name != VERSION_TABLE:
+                self.db.drop_collection(name)
+        recreate_mongo_indexes(self.db)
+        logging.info(f"Все коллекции базы {self.db.name} удалены")
+
+    def _projection(self, cls, aliases, fields):
+        if not fields:
+            return None
+        check_fields(cls, fields)
+        projection = {aliases.get(field, field): 1 for field in fields}
+        projection.setdefault("_id", 0)
+        return projection
 
     def create_user(self, name, email, registration_date):
         result = self.db.users.insert_one({"name": name, "email": email, "registration_date": registration_date})
@@ -53,67 +158,95 @@ class MongoDBClient:
         logging.info(f"Пользователь {name} с email {email} успешно создан с ID: {user_id}")
         return user_id
 
-    def get_user(self, user_id):
-        user = self.db.users.find_one({"_id": ObjectId(user_id)})
+    def get_user(self, user_id, fields=None):
+        user = self.db.users.find_one({"_id": bson.ObjectId(user_id)}, self._projection(User, USER_FIELDS, fields))
         if user:
             logging.info(f"Пользователь с ID {user_id} найден: {user}")
         else:
             logging.info(f"Пользователь с ID {user_id} не найден")
-        return user
+        return user if self.raw else from_mapping(User, user, USER_FIELDS)
 
     def update_user(self, user_id, name=None, email=None, registration_date=None):
         update_fields = {key: value for key, value in {"name": name, "email": email, "registration_date": registration_date}.items() if value is not None}
-        result = self.db.users.update_one({"_id": ObjectId(user_id)}, {"$set": update_fields})
+        result = self.db.users.update_one({"_id": bson.ObjectId(user_id)}, {"$set": update_fields})
         logging.info(f"Данные пользователя с ID {user_id} обновлены, изменено записей: {result.modified_count}")
 
     def delete_user(self, user_id):
-        result = self.db.users.delete_one({"_id": ObjectId(user_id)})
+        result = self.db.users.delete_one({"_id": bson.ObjectId(user_id)})
         logging.info(f"Пользователь с ID {user_id} удалён, удалено записей: {result.deleted_count}")
 
+    def _attach_snapshots(self, orders):
+        # Снимки продуктов (название, цена, категория) для позиций пачки заказов читаются одним запросом
+        product_ids = {bson.ObjectId(item["product_id"]) for order in orders for item in order["items"]}
+        products = {product["_id"]: product for product in
+                    self.db.products.find({"_id": {"$in": list(product_ids)}}, {"name": 1, "price": 1, "category_id": 1})}
+        for order in orders:
+            items = []
+            for item in order["items"]:
+                product = products.get(bson.ObjectId(item["product_id"]), {})
+                items.append(dict(item, product_id=bson.ObjectId(item["product_id"]), product_name=product.get("name"),
+                                  price=product.get("price"), category_id=product.get("category_id")))
+            order["items"] = items
+        return orders
+
+    def _with_snapshots(self, orders):
+        return self._attach_snapshots(orders) if self.embed_products else orders
+
+    def _queue_snapshot_changes(self, product_ids):
+        # Очередь для clients/mongo_snapshots.py: переименованные или перенесённые в другую категорию продукты
+        changed_at = datetime.datetime.now(datetime.timezone.utc)
+        self.db.product_snapshot_changes.insert_many(
+            [{"product_id": bson.ObjectId(product_id), "changed_at": changed_at} for product_id in product_ids], ordered=False)
+
     def create_order(self, user_id, order_date, total, items):
-        result = self.db.orders.insert_one({"user_id": ObjectId(user_id), "order_date": order_date, "total": total, "items": items})
+        order = {"user_id": bson.ObjectId(user_id), "order_date": order_date, "total": total, "items": items}
+        result = self.db.orders.insert_one(self._with_snapshots([order])[0])
         order_id = result.inserted_id
         logging.info(f"Заказ для пользователя с ID {user_id} на сумму {total} успешно создан с ID: {order_id}")
         return order_id
 
-    def get_order(self, order_id):
-        order = self.db.orders.find_one({"_id": ObjectId(order_id)})
+    def get_order(self, order_id, fields=None):
+        order = self.db.orders.find_one({"_id": bson.ObjectId(order_id)}, self._projection(Order, ORDER_FIELDS, fields))
         if order:
             logging.info(f"Заказ с ID {order_id} найден: {order}")
         else:
             logging.info(f"Заказ с ID {order_id} не найден")
-        return order
+        return order if self.raw else self._decode_order(order)
 
     def update_order(self, order_id, user_id=None, order_date=None, total=None, items=None):
-        update_fields = {key: value for key, value in {"user_id": ObjectId(user_id) if user_id else None, "order_date": order_date, "total": total, "items": items}.items() if value is not None}
-        result = self.db.orders.update_one({"_id": ObjectId(order_id)}, {"$set": update_fields})
+        if items is not None:
+            items = self._with_snapshots([{"items": items}])[0]["items"]
+        update_fields = {key: value for key, value in {"user_id": bson.ObjectId(user_id) if user_id else None, "order_date": order_date, "total": total, "items": items}.items() if value is not None}
+        result = self.db.orders.update_one({"_id": bson.ObjectId(order_id)}, {"$set": update_fields})
         logging.info(f"Данные заказа с ID {order_id} обновлены, изменено записей: {result.modified_count}")
 
     def delete_order(self, order_id):
-        result = self.db.orders.delete_one({"_id": ObjectId(order_id)})
+        result = self.db.orders.delete_one({"_id": bson.ObjectId(order_id)})
         logging.info(f"Заказ с ID {order_id} удалён, удалено записей: {result.deleted_count}")
 
     def create_product(self, name, price, category_id):
-        result = self.db.products.insert_one({"name": name, "price": price, "category_id": ObjectId(category_id)})
+        result = self.db.products.insert_one({"name": name, "price": price, "category_id": bson.ObjectId(category_id)})
         product_id = result.inserted_id
         logging.info(f"Продукт {name} с ценой {price} успешно создан с ID: {product_id}")
         return product_id
 
-    def get_product(self, product_id):
-        product = self.db.products.find_one({"_id": ObjectId(product_id)})
+    def get_product(self, product_id, fields=None):
+        product = self.db.products.find_one({"_id": bson.ObjectId(product_id)}, self._projection(Product, PRODUCT_FIELDS, fields))
         if product:
             logging.info(f"Продукт с ID {product_id} найден: {product}")
         else:
             logging.info(f"Продукт с ID {product_id} не найден")
-        return product
+        return product if self.raw else from_mapping(Product, product, PRODUCT_FIELDS)
 
     def update_product(self, product_id, name=None, price=None, category_id=None):
-        update_fields = {key: value for key, value in {"name": name, "price": price, "category_id": ObjectId(category_id) if category_id else None}.items() if value is not None}
-        result = self.db.products.update_one({"_id": ObjectId(product_id)}, {"$set": update_fields})
+        update_fields = {key: value for key, value in {"name": name, "price": price, "category_id": bson.ObjectId(category_id) if category_id else None}.items() if value is not None}
+        result = self.db.products.update_one({"_id": bson.ObjectId(product_id)}, {"$set": update_fields})
+        if self.embed_products and result.modified_count and (name is not None or category_id is not None):
+            self._queue_snapshot_changes([product_id])
         logging.info(f"Данные продукта с ID {product_id} обновлены, изменено записей: {result.modified_count}")
 
     def delete_product(self, product_id):
-        result = self.db.products.delete_one({"_id": ObjectId(product_id)})
+        result = self.db.products.delete_one({"_id": bson.ObjectId(product_id)})
         logging.info(f"Продукт с ID {product_id} удалён, удалено записей: {result.deleted_count}")
 
     def create_category(self, category_name):
@@ -122,39 +255,193 @@ class MongoDBClient:
         logging.info(f"Категория {category_name} успешно создана с ID: {category_id}")
         return category_id
 
-    def get_category(self, category_id):
-        category = self.db.categories.find_one({"_id": ObjectId(category_id)})
+    def get_category(self, category_id, fields=None):
+        category = self.db.categories.find_one({"_id": bson.ObjectId(category_id)}, self._projection(Category, CATEGORY_FIELDS, fields))
         if category:
             logging.info(f"Категория с ID {category_id} найдена: {category}")
         else:
             logging.info(f"Категория с ID {category_id} не найдена")
-        return category
+        return category if self.raw else from_mapping(Category, category, CATEGORY_FIELDS)
 
     def update_category(self, category_id, category_name):
-        result = self.db.categories.update_one({"_id": ObjectId(category_id)}, {"$set": {"category_name": category_name}})
+        result = self.db.categories.update_one({"_id": bson.ObjectId(category_id)}, {"$set": {"category_name": category_name}})
         logging.info(f"Категория с ID {category_id} обновлена, изменено записей: {result.modified_count}")
 
     def delete_category(self, category_id):
-        result = self.db.categories.delete_one({"_id": ObjectId(category_id)})
+        result = self.db.categories.delete_one({"_id": bson.ObjectId(category_id)})
         logging.info(f"Категория с ID {category_id} удалена, удалено записей: {result.deleted_count}")
 
-    def get_orders_by_user_id(self, user_id):
-        orders = list(self.db.orders.find({"user_id": ObjectId(user_id)}))
+    # Пакетная запись: документы отправляются кусками по batch_size через insert_many(ordered=False) / bulk_write,
+    # сервер продолжает кусок после ошибки отдельного документа, а следующие куски отправляются всё равно.
+    # _id генерируются на клиенте, поэтому известны для всех документов до отправки.
+    # write_concern — словарь параметров WriteConcern (например {"w": 1, "j": False}).
+
+    def _collection(self, name, write_concern=None):
+        collection = self.db[name]
+        return collection.with_options(write_concern=pymongo.WriteConcern(**write_concern)) if write_concern else collection
+
+    def _insert_many(self, name, documents, batch_size=None, write_concern=None):
+        collection = self._collection(name, write_concern)
+        result = BulkResult()
+        for chunk in _chunks(documents, batch_size or self.bulk_batch_size):
+            offset = len(result.ids)
+            for document in chunk:
+                document["_id"] = bson.ObjectId()
+            result.ids.extend(document["_id"] for document in chunk)
+            try:
+                collection.insert_many(chunk, ordered=False)
+            except pymongo.errors.BulkWriteError as error:
+                result.record_bulk_error(offset, error.details)
+            except pymongo.errors.PyMongoError as error:
+                logging.warning(f"Пакет {offset}..{len(result.ids)} в {name} не записан: {error}")
+                result.fail_chunk(offset, error)
+        logging.info(f"Пакетная запись в {name}: {result}")
+        return result
+
+    def _bulk_update(self, name, updates, batch_size=None, write_concern=None):
+        # updates: пары (_id, {поле: значение}); значения None пропускаются, как в update_*
+        collection = self._collection(name, write_concern)
+        result = BulkResult()
+        for chunk in _chunks(updates, batch_size or self.bulk_batch_size):
+            offset = len(result.ids)
+            requests = []
+            for document_id, fields in chunk:
+                result.ids.append(bson.ObjectId(document_id))
+                requests.append(pymongo.UpdateOne({"_id": bson.ObjectId(document_id)},
+                                          {"$set": {key: value for key, value in fields.items() if value is not None}}))
+            try:
+                write_result = collection.bulk_write(requests, ordered=False)
+                result.matched += write_result.matched_count
+                result.modified += write_result.modified_count
+            except pymongo.errors.BulkWriteError as error:
+                result.matched += error.details.get("nMatched", 0)
+                result.modified += error.details.get("nModified", 0)
+                result.record_bulk_error(offset, error.details)
+            except pymongo.errors.PyMongoError as error:
+                logging.warning(f"Пакет {offset}..{len(result.ids)} в {name} не обновлён: {error}")
+                result.fail_chunk(offset, error)
+        logging.info(f"Пакетное обновление {name}: {result}")
+        return result
+
+    def create_users(self, users, batch_size=None, write_concern=None):
+        # users: словари с ключами name, email, registration_date
+        documents = ({"name": user["name"], "email": user["email"], "registration_date": user["registration_date"]}
+                     for user in users)
+        return self._insert_many("users", documents, batch_size, write_concern)
+
+    def create_products(self, products, batch_size=None, write_concern=None):
+        # products: словари с ключами name, price, category_id
+        documents = ({"name": product["name"], "price": product["price"], "category_id": bson.ObjectId(product["category_id"])}
+                     for product in products)
+        return self._insert_many("products", documents, batch_size, write_concern)
+
+    def create_orders(self, orders, batch_size=None, write_concern=None):
+        # orders: словари с ключами user_id, order_date, total, items
+        batch_size = batch_size or self.bulk_batch_size
+        documents = ({"user_id": bson.ObjectId(order["user_id"]), "order_date": order["order_date"], "total": order["total"],
+                      "items": order["items"]} for order in orders)
+        documents = (document for chunk in _chunks(documents, batch_size) for document in self._with_snapshots(chunk))
+        return self._insert_many("orders", documents, batch_size, write_concern)
+
+    def update_users(self, updates, batch_size=None, write_concern=None):
+        # updates: пары (user_id, {"name": ..., "email": ..., "registration_date": ...})
+        return self._bulk_update("users", updates, batch_size, write_concern)
+
+    def update_products(self, updates, batch_size=None, write_concern=None):
+        updates = [(product_id, dict(fields, category_id=bson.ObjectId(fields["category_id"])) if fields.get("category_id") else fields)
+                   for product_id, fields in updates]
+        result = self._bulk_update("products", updates, batch_size, write_concern)
+        if self.embed_products:
+            changed = [product_id for product_id, fields in updates
+                       if fields.get("name") is not None or fields.get("category_id") is not None]
+            if changed:
+                self._queue_snapshot_changes(changed)
+        return result
+
+    def update_orders(self, updates, batch_size=None, write_concern=None):
+        updates = ((order_id, dict(fields, user_id=bson.ObjectId(fields["user_id"])) if fields.get("user_id") else fields)
+                   for order_id, fields in updates)
+        return self._bulk_update("orders", updates, batch_size, write_concern)
+
+    def _decode_order(self, order):
+        if order is None:
+            return None
+        items = order.get("items")
+        return from_mapping(Order, order, ORDER_FIELDS, items=None if items is None else items_from_mappings(items, order.get("_id")))
+
+    def get_order_details(self, order_id):
+        # Заказ с названиями и ценами продуктов в позициях
+        order = self.db.orders.find_one({"_id": bson.ObjectId(order_id)})
+        if order and not self.embed_products:
+            # В ссылочной раскладке снимки дочитываются вторым запросом по products
+            self._attach_snapshots([order])
+        logging.info(f"Детали заказа с ID {order_id}: {order}")
+        return order if self.raw else self._decode_order(order)
+
+    def get_orders_by_user_id(self, user_id, fields=None):
+        orders = list(self.db.orders.find({"user_id": bson.ObjectId(user_id)}, self._projection(Order, ORDER_FIELDS, fields)))
         logging.info(f"Заказы пользователя с ID {user_id}: {orders}")
-        return orders
+        return orders if self.raw else [self._decode_order(order) for order in orders]
+
+    def _date_filter(self, start_date, end_date):
+        # Даты заказов хранятся строками ISO 8601, поэтому границы сравниваются как строки
+        start_date, end_date = date_bounds(start_date, end_date)
+        return {"$gte": start_date.isoformat(), "$lte": end_date.isoformat()}
 
-    def get_purchased_products_by_user_id(self, user_id):
-        orders = self.get_orders_by_user_id(user_id)
+    def get_orders_by_user_in_range(self, user_id, start_date, end_date, fields=None):
+        query = {"user_id": bson.ObjectId(user_id), "order_date": self._date_filter(start_date, end_date)}
+        orders = list(self.db.orders.find(query, self._projection(Order, ORDER_FIELDS, fields)).sort([("order_date", 1), ("_id", 1)]))
+        logging.info(f"Заказы пользователя с ID {user_id} с {start_date} по {end_date}: {orders}")
+        return orders if self.raw else [self._decode_order(order) for order in orders]
+
+    def get_orders_in_range(self, start_date, end_date, fields=None):
+        query = {"order_date": self._date_filter(start_date, end_date)}
+        orders = list(self.db.orders.find(query, self._projection(Order, ORDER_FIELDS, fields)).sort([("order_date", 1), ("_id", 1)]))
+        logging.info(f"Заказы с {start_date} по {end_date}: {len(orders)}")
+        return orders if self.raw else [self._decode_order(order) for order in orders]
+
+    def get_daily_revenue(self, start_date, end_date):
+        pipeline = [
+            {"$match": {"order_date": self._date_filter(start_date, end_date)}},
+            {"$group": {"_id": "$order_date", "revenue": {"$sum": "$total"}}},
+            {"$sort": {"_id": 1}},
+        ]
+        result = list(self.db.orders.aggregate(pipeline))
+        logging.info(f"Выручка по дням с {start_date} по {end_date}: {result}")
+        return result if self.raw else [(row["_id"], float(row["revenue"])) for row in result]
+
+    def _find_purchased_products(self, user_id, projection=None):
+        orders = self.db.orders.find({"user_id": bson.ObjectId(user_id)}, {"items.product_id": 1})
         product_ids = [item["product_id"] for order in orders for item in order["items"]]
-        products = list(self.db.products.find({"_id": {"$in": product_ids}}))
+        return list(self.db.products.find({"_id": {"$in": product_ids}}, projection))
+
+    def _aggregate_purchased_products(self, user_id, projection=None):
+        # Снимки из позиций заказов пользователя; при нескольких покупках берётся самая поздняя
+        pipeline = [
+            {"$match": {"user_id": bson.ObjectId(user_id)}},
+            {"$sort": {"_id": -1}},
+            {"$unwind": "$items"},
+            {"$group": {"_id": "$items.product_id", "name": {"$first": "$items.product_name"},
+                        "price": {"$first": "$items.price"}, "category_id": {"$first": "$items.category_id"}}},
+        ]
+        if projection:
+            pipeline.append({"$project": projection})
+        return list(self.db.orders.aggregate(pipeline))
+
+    def get_purchased_products_by_user_id(self, user_id, fields=None):
+        projection = self._projection(Product, PRODUCT_FIELDS, fields)
+        if self.embed_products:
+            products = self._aggregate_purchased_products(user_id, projection)
+        else:
+            products = self._find_purchased_products(user_id, projection)
         logging.info(f"Продукты, купленные пользователем с ID {user_id}: {products}")
-        return products
+        return products if self.raw else from_mappings(Product, products, PRODUCT_FIELDS)
 
-    def get_users_with_similar_purchases(self, user_id):
-        user_products = self.get_purchased_products_by_user_id(user_id)
+    def get_users_with_similar_purchases(self, user_id, fields=None):
+        user_products = self._find_purchased_products(user_id, {"_id": 1})
         user_product_ids = {product["_id"] for product in user_products}
 
-        orders = list(self.db.orders.find())
+        orders = list(self.db.orders.find({}, {"user_id": 1, "items.product_id": 1}))
         similar_user_ids = set()
 
         for order in orders:
@@ -162,13 +449,33 @@ class MongoDBClient:
             if user_product_ids & order_product_ids:
                 similar_user_ids.add(order["user_id"])
 
-        similar_users = list(self.db.users.find({"_id": {"$in": list(similar_user_ids)}}))
+        similar_users = list(self.db.users.find({"_id": {"$in": list(similar_user_ids)}}, self._projection(User, USER_FIELDS, fields)))
         logging.info(f"Пользователи с похожими покупками: {similar_users}")
-        return similar_users
+        return similar_users if self.raw else from_mappings(User, similar_users, USER_FIELDS)
 
-    def get_products_by_category_id(self, category_id):
-        products = list(self.db.products.find({"category_id": ObjectId(category_id)}))
+    def get_products_by_category_id(self, category_id, fields=None):
+        products = list(self.db.products.find({"category_id": bson.ObjectId(category_id)}, self._projection(Product, PRODUCT_FIELDS, fields)))
         logging.info(f"Продукты в категории с ID {category_id}: {products}")
-        return products
+        return products if self.raw else from_mappings(Product, products, PRODUCT_FIELDS)
 
+    def iter_purchase_pairs(self, batch_size=10000):
+        orders = self.db.orders.find({}, {"user_id": 1, "items.product_id": 1}, batch_size=batch_size)
+        for order in orders:
+            for item in order.get("items", []):
+                yield order["user_id"], item["product_id"]
+
+    def iter_orders(self, batch_size=10000):
+        orders = self.db.orders.find({}, {"user_id": 1, "order_date": 1, "total": 1}, batch_size=batch_size)
+        for order in orders:
+            yield order["_id"], order.get("user_id"), order.get("order_date"), order.get("total")
+
+    def iter_order_items(self, batch_size=10000):
+        orders = self.db.orders.find({}, {"items": 1}, batch_size=batch_size)
+        for order in orders:
+            for item in order.get("items", []):
+                yield order["_id"], item["product_id"], item.get("quantity")
 
+    def iter_products(self, batch_size=10000):
+        products = self.db.products.find({}, batch_size=batch_size)
+        for product in products:
+            yield product["_id"], product.get("name"), product.get("price"), product.get("category_id")
@@ -0,0 +1,89 @@
+# Перенос изменений продуктов в снимки, встроенные в заказы MongoDB (режим MongoDBClient(embed_products=True)).
+# MongoDBClient.update_product / update_products ставят в коллекцию product_snapshot_changes запись
+# {product_id, changed_at}, если у продукта изменились название или категория. ProductSnapshotSync забирает
+# очередь пачками, схлопывает её до множества продуктов и для каждого обновляет позиции всех заказов с ним
+# (update_many с arrayFilters по индексу items.product_id). Записи очереди удаляются только после обновления
+# заказов, поэтому при сбое пачка будет применена повторно (at-least-once); применение идемпотентно, так как
+# в заказы пишется текущее состояние продукта.
+# Цена не переносится: в снимке хранится цена на момент покупки.
+# Запуск: python -m clients.mongo_snapshots [--batch-size 500] [--poll-interval 5]
+import argparse
+import logging
+import time
+
+from clients.mongo_client import MongoDBClient
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+
+class ProductSnapshotSync:
+    def __init__(self, mongo_client=None, batch_size=500):
+        self.mongo = mongo_client or MongoDBClient(embed_products=True)
+        self.db = self.mongo.db
+        self.batch_size = batch_size
+        self.applied = 0
+        logging.info("Перенос снимков продуктов: подключение к MongoDB установлено")
+
+    def apply(self, product_ids):
+        # Записывает текущие название и категорию продуктов во все позиции заказов с ними
+        products = self.db.products.find({"_id": {"$in": list(product_ids)}}, {"name": 1, "category_id": 1})
+        updated = 0
+        for product in products:
+            result = self.db.orders.update_many(
+                {"items.product_id": product["_id"]},
+                {"$set": {"items.$[item].product_name": product.get("name"),
+                          "items.$[item].category_id": product.get("category_id")}},
+                array_filters=[{"item.product_id": product["_id"]}],
+            )
+            updated += result.modified_count
+        return updated
+
+    def drain_batch(self):
+        changes = list(self.db.product_snapshot_changes.find({}, {"product_id": 1}).sort("_id", 1).limit(self.batch_size))
+        if not changes:
+            return 0
+        updated = self.apply({change["product_id"] for change in changes})
+        self.db.product_snapshot_changes.delete_many({"_id": {"$in": [change["_id"] for change in changes]}})
+        logging.info(f"Перенос снимков продуктов: изменений {len(changes)}, обновлено заказов {updated}")
+        return len(changes)
+
+    def drain(self):
+        total = 0
+        while True:
+            count = self.drain_batch()
+            total += count
+            if count < self.batch_size:
+                self.applied += total
+                return total
+
+    def backlog(self):
+        return self.db.product_snapshot_changes.count_documents({})
+
+    def run(self, poll_interval=5.0):
+        logging.info("Перенос снимков продуктов: ожидание изменений")
+        while True:
+            if not self.drain():
+                time.sleep(poll_interval)
+
+    def close(self):
+        self.mongo.client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос изменений продуктов в снимки заказов MongoDB")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    sync = ProductSnapshotSync(batch_size=args.batch_size)
+    try:
+        sync.run(args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sync.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,29 +8,110 @@
 # CREATE (p)-[:BELONGS_TO]->(c);
 
 
+import functools
 import os
 import logging
-from neo4j import GraphDatabase
+
+from clients.date_range import date_bounds
+from clients.instrumentation import instrumented
+from clients.lazy_import import lazy_import
+from clients.migrations import check_schema
+from clients.records import User, Product, Category, Order, from_mapping
+from clients.tuning import tuning_for
+
+neo4j = lazy_import("neo4j")
+
+DEFAULT_FETCH_SIZE = 1000
+
+# Свойства узлов, доступные для проекции (параметр fields)
+NODE_FIELDS = {
+    User: ("user_id", "name", "email", "registration_date"),
+    Order: ("order_id", "order_date", "total"),
+    Product: ("product_id", "name", "price"),
+    Category: ("category_id", "category_name"),
+}
 
 # Настройка логирования
 logger = logging.getLogger()
 logging.basicConfig(level=logging.INFO)  # Настройка базового уровня логирования
 
+@instrumented("neo4j")
 class Neo4jClient:
-    def __init__(self):
-        NEO4J_URI = os.getenv("NEO4J_URI")
-        NEO4J_USER = os.getenv("NEO4J_USER")
-        NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+    def __init__(self, raw=False, tuning=None, fetch_size=None):
+        self.raw = raw
+        self.tuning = tuning_for("neo4j", tuning)
+        # Сколько записей сервер отдаёт за один запрос PULL при потоковом чтении
+        self.fetch_size = fetch_size or int(os.getenv("NEO4J_FETCH_SIZE", self.tuning.get("fetch_size", DEFAULT_FETCH_SIZE)))
+        self.uri = os.getenv("NEO4J_URI")
+        self.auth = (os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
 
-        if not NEO4J_URI or not NEO4J_USER or not NEO4J_PASSWORD:
+        if not self.uri or not all(self.auth):
             raise ValueError("NEO4J_URI, NEO4J_USER, and NEO4J_PASSWORD must be set in the environment")
 
-        self.driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    # Драйвер создаётся и версия схемы проверяется при первом запросе
+    @functools.cached_property
+    def driver(self):
+        driver = neo4j.GraphDatabase.driver(self.uri, auth=self.auth, **self.tuning)
+        check_schema("neo4j", driver)
         logging.info("Подключение к базе данных Neo4j установлено")
+        return driver
 
     def close(self):
-        self.driver.close()
-        logging.info("Подключение к базе данных Neo4j закрыто")
+        if "driver" in self.__dict__:
+            self.driver.close()
+            logging.info("Подключение к базе данных Neo4j закрыто")
+
+    def truncate_all(self, batch_size=10000):
+        # Удаление пачками по batch_size узлов в отдельных транзакциях, чтобы не упереться в память транзакции;
+        # узлы версии схемы (clients/migrations.py) сохраняются
+        query = """
+        MATCH (n) WHERE NOT n:SchemaMigration
+        WITH n LIMIT $batch_size
+        DETACH DELETE n
+        RETURN count(*) AS deleted
+        """
+        total = 0
+        with self.driver.session() as session:
+            while True:
+                deleted = session.write_transaction(lambda tx: tx.run(query, batch_size=batch_size).single()["deleted"])
+                total += deleted
+                if deleted < batch_size:
+                    break
+        logging.info(f"Удалены все узлы Neo4j: {total}")
+        return total
+
+    def _decode(self, cls, node):
+        return node if self.raw or node is None else from_mapping(cls, node)
+
+    def _returning(self, variable, cls, fields=None, distinct=False):
+        # Узел возвращается проекцией свойств (словарём), без меток и внутреннего идентификатора
+        clause = "RETURN DISTINCT" if distinct else "RETURN"
+        if not fields:
+            return f"{clause} {variable} {{.*}} AS {variable}"
+        unknown = [field for field in fields if field not in NODE_FIELDS[cls]]
+        if unknown:
+            raise ValueError(f"Неизвестные свойства {cls.__name__}: {', '.join(unknown)}")
+        return f"{clause} {variable} {{{', '.join('.' + field for field in fields)}}} AS {variable}"
+
+    def _decode_record(self, cls, record, variable):
+        return None if record is None else self._decode(cls, record[variable])
+
+    def _read_session(self):
+        return self.driver.session(default_access_mode=neo4j.READ_ACCESS, fetch_size=self.fetch_size)
+
+    def _read(self, query, single=False, **parameters):
+        # Чтение в управляемой транзакции: в кластере оно уходит на follower, а при сбое узла драйвер его повторяет
+        def work(tx):
+            result = tx.run(query, parameters)
+            return result.single() if single else list(result)
+        with self._read_session() as session:
+            return session.read_transaction(work)
+
+    def _stream(self, query, **parameters):
+        # Записи подтягиваются пачками по fetch_size по мере итерации; сессия открыта, пока генератор не исчерпан или не закрыт
+        with self._read_session() as session:
+            with session.begin_transaction() as tx:
+                yield from tx.run(query, parameters)
 
     def create_user(self, user_id, name, email, registration_date):
         query = """
@@ -40,21 +121,18 @@ class Neo4jClient:
         with self.driver.session() as session:
             result = session.run(query, user_id=user_id, name=name, email=email, registration_date=registration_date)
             logging.info(f"Создан пользователь с ID {user_id}, имя: {name}, email: {email}")
-            return result.single()["u"]
+            return self._decode(User, result.single()["u"])
 
-    def get_user(self, user_id):
+    def get_user(self, user_id, fields=None):
         query = """
         MATCH (u:User {user_id: $user_id})
-        RETURN u
-        """
-        with self.driver.session() as session:
-            result = session.run(query, user_id=user_id)
-            user = result.single()
-            if user:
-                logging.info(f"Найден пользователь с ID {user_id}")
-            else:
-                logging.warning(f"Пользователь с ID {user_id} не найден")
-            return user["u"] if user else None
+        """ + self._returning("u", User, fields)
+        user = self._read(query, single=True, user_id=user_id)
+        if user:
+            logging.info(f"Найден пользователь с ID {user_id}")
+        else:
+            logging.warning(f"Пользователь с ID {user_id} не найден")
+        return self._decode_record(User, user, "u")
 
     def update_user(self, user_id, name=None, email=None, registration_date=None):
         query = """
@@ -66,7 +144,7 @@ class Neo4jClient:
         with self.driver.session() as session:
             result = session.run(query, user_id=user_id, updates=updates)
             logging.info(f"Обновлены данные пользователя с ID {user_id}: {updates}")
-            return result.single()["u"]
+            return self._decode(User, result.single()["u"])
 
     def delete_user(self, user_id):
         query = """
@@ -87,21 +165,18 @@ class Neo4jClient:
         with self.driver.session() as session:
             result = session.run(query, order_id=order_id, order_date=order_date, total=total, user_id=user_id)
             logging.info(f"Создан заказ с ID {order_id} на сумму {total} для пользователя с ID {user_id}")
-            return result.single()["o"]
+            return self._decode(Order, result.single()["o"])
 
-    def get_order(self, order_id):
+    def get_order(self, order_id, fields=None):
         query = """
         MATCH (o:Order {order_id: $order_id})
-        RETURN o
-        """
-        with self.driver.session() as session:
-            result = session.run(query, order_id=order_id)
-            order = result.single()
-            if order:
-                logging.info(f"Найден заказ с ID {order_id}")
-            else:
-                logging.warning(f"Заказ с ID {order_id} не найден")
-            return order["o"] if order else None
+        """ + self._returning("o", Order, fields)
+        order = self._read(query, single=True, order_id=order_id)
+        if order:
+            logging.info(f"Найден заказ с ID {order_id}")
+        else:
+            logging.warning(f"Заказ с ID {order_id} не найден")
+        return self._decode_record(Order, order, "o")
 
     def update_order(self, order_id, order_date=None, total=None):
         query = """
@@ -113,7 +188,7 @@ class Neo4jClient:
         with self.driver.session() as session:
             result = session.run(query, order_id=order_id, updates=updates)
             logging.info(f"Обновлены данные заказа с ID {order_id}: {updates}")
-            return result.single()["o"]
+            return self._decode(Order, result.single()["o"])
 
     def delete_order(self, order_id):
         query = """
@@ -134,21 +209,18 @@ class Neo4jClient:
         with self.driver.session() as session:
             result = session.run(query, product_id=product_id, name=name, price=price, category_id=category_id)
             logging.info(f"Создан продукт с ID {product_id}, имя: {name}, цена: {price}, категория ID {category_id}")
-            return result.single()["p"]
+            return self._decode(Product, result.single()["p"])
 
-    def get_product(self, product_id):
+    def get_product(self, product_id, fields=None):
         query = """
         MATCH (p:Product {product_id: $product_id})
-        RETURN p
-        """
-        with self.driver.session() as session:
-            result = session.run(query, product_id=product_id)
-            product = result.single()
-            if product:
-                logging.info(f"Найден продукт с ID {product_id}")
-            else:
-                logging.warning(f"Продукт с ID {product_id} не найден")
-            return product["p"] if product else None
+        """ + self._returning("p", Product, fields)
+        product = self._read(query, single=True, product_id=product_id)
+        if product:
+            logging.info(f"Найден продукт с ID {product_id}")
+        else:
+            logging.warning(f"Продукт с ID {product_id} не найден")
+        return self._decode_record(Product, product, "p")
 
     def update_product(self, product_id, name=None, price=None):
         query = """
@@ -160,7 +232,7 @@ class Neo4jClient:
         with self.driver.session() as session:
             result = session.run(query, product_id=product_id, updates=updates)
             logging.info(f"Обновлены данные продукта с ID {product_id}: {updates}")
-            return result.single()["p"]
+            return self._decode(Product, result.single()["p"])
 
     def delete_product(self, product_id):
         query = """
@@ -179,21 +251,18 @@ class Neo4jClient:
         with self.driver.session() as session:
             result = session.run(query, category_id=category_id, category_name=category_name)
             logging.info(f"Создана категория с ID {category_id}, имя: {category_name}")
-            return result.single()["c"]
+            return self._decode(Category, result.single()["c"])
 
-    def get_category(self, category_id):
+    def get_category(self, category_id, fields=None):
         query = """
         MATCH (c:Category {category_id: $category_id})
-        RETURN c
-        """
-        with self.driver.session() as session:
-            result = session.run(query, category_id=category_id)
-            category = result.single()
-            if category:
-                logging.info(f"Найдена категория с ID {category_id}")
-            else:
-                logging.warning(f"Категория с ID {category_id} не найдена")
-            return category["c"] if category else None
+        """ + self._returning("c", Category, fields)
+        category = self._read(query, single=True, category_id=category_id)
+        if category:
+            logging.info(f"Найдена категория с ID {category_id}")
+        else:
+            logging.warning(f"Категория с ID {category_id} не найдена")
+        return self._decode_record(Category, category, "c")
 
     def update_category(self, category_id, category_name):
         query = """
@@ -204,7 +273,7 @@ class Neo4jClient:
         with self.driver.session() as session:
             result = session.run(query, category_id=category_id, category_name=category_name)
             logging.info(f"Обновлена категория с ID {category_id}, новое имя: {category_name}")
-            return result.single()["c"]
+            return self._decode(Category, result.single()["c"])
 
     def delete_category(self, category_id):
         query = """
@@ -224,47 +293,156 @@ class Neo4jClient:
             session.run(query, order_id=order_id, product_id=product_id)
             logging.info(f"Добавлен продукт с ID {product_id} в заказ с ID {order_id}")
 
-    def get_products_by_order_id(self, order_id):
-        query = """
+    # Списочные чтения: get_* читают всё в транзакции чтения (с повтором при сбое), iter_* — тот же запрос
+    # потоково, по fetch_size записей за раз, без накопления результата в памяти
+
+    def _products_by_order_query(self, fields=None):
+        return """
         MATCH (o:Order {order_id: $order_id})-[:CONTAINS]->(p:Product)
-        RETURN p
-        """
-        with self.driver.session() as session:
-            result = session.run(query, order_id=order_id)
-            products = [record["p"] for record in result]
-            logging.info(f"Найдены продукты для заказа с ID {order_id}: {len(products)} продуктов")
-            return products
+        """ + self._returning("p", Product, fields)
 
-    def get_orders_by_user_id(self, user_id):
-        query = """
+    def get_products_by_order_id(self, order_id, fields=None):
+        records = self._read(self._products_by_order_query(fields), order_id=order_id)
+        products = [self._decode_record(Product, record, "p") for record in records]
+        logging.info(f"Найдены продукты для заказа с ID {order_id}: {len(products)} продуктов")
+        return products
+
+    def iter_products_by_order_id(self, order_id, fields=None):
+        for record in self._stream(self._products_by_order_query(fields), order_id=order_id):
+            yield self._decode_record(Product, record, "p")
+
+    def _orders_by_user_query(self, fields=None):
+        return """
         MATCH (u:User {user_id: $user_id})-[:PLACED]->(o:Order)
-        RETURN o
-        """
-        with self.driver.session() as session:
-            result = session.run(query, user_id=user_id)
-            orders = [record["o"] for record in result]
-            logging.info(f"Найдены заказы для пользователя с ID {user_id}: {len(orders)} заказов")
-            return orders
+        """ + self._returning("o", Order, fields)
+
+    def get_orders_by_user_id(self, user_id, fields=None):
+        records = self._read(self._orders_by_user_query(fields), user_id=user_id)
+        orders = [self._decode_record(Order, record, "o") for record in records]
+        logging.info(f"Найдены заказы для пользователя с ID {user_id}: {len(orders)} заказов")
+        return orders
+
+    def iter_orders_by_user_id(self, user_id, fields=None):
+        for record in self._stream(self._orders_by_user_query(fields), user_id=user_id):
+            yield self._decode_record(Order, record, "o")
+
+    def _orders_by_user_in_range_query(self, fields=None):
+        # order_date хранится строкой ISO 8601; индекс по Order.order_date — в migrations/neo4j
+        return """
+        MATCH (u:User {user_id: $user_id})-[:PLACED]->(o:Order)
+        WHERE o.order_date >= $start_date AND o.order_date <= $end_date
+        WITH o ORDER BY o.order_date, o.order_id
+        """ + self._returning("o", Order, fields)
+
+    def get_orders_by_user_in_range(self, user_id, start_date, end_date, fields=None):
+        start_date, end_date = date_bounds(start_date, end_date)
+        records = self._read(self._orders_by_user_in_range_query(fields), user_id=user_id,
+                             start_date=start_date.isoformat(), end_date=end_date.isoformat())
+        orders = [self._decode_record(Order, record, "o") for record in records]
+        logging.info(f"Найдены заказы пользователя с ID {user_id} с {start_date} по {end_date}: {len(orders)} заказов")
+        return orders
 
-    def get_users_with_similar_purchases(self, user_id):
+    def iter_orders_by_user_in_range(self, user_id, start_date, end_date, fields=None):
+        start_date, end_date = date_bounds(start_date, end_date)
+        records = self._stream(self._orders_by_user_in_range_query(fields), user_id=user_id,
+                               start_date=start_date.isoformat(), end_date=end_date.isoformat())
+        for record in records:
+            yield self._decode_record(Order, record, "o")
+
+    def _orders_in_range_query(self, fields=None):
+        return """
+        MATCH (o:Order)
+        WHERE o.order_date >= $start_date AND o.order_date <= $end_date
+        WITH o ORDER BY o.order_date, o.order_id
+        """ + self._returning("o", Order, fields)
+
+    def get_orders_in_range(self, start_date, end_date, fields=None):
+        start_date, end_date = date_bounds(start_date, end_date)
+        records = self._read(self._orders_in_range_query(fields), start_date=start_date.isoformat(), end_date=end_date.isoformat())
+        orders = [self._decode_record(Order, record, "o") for record in records]
+        logging.info(f"Найдены заказы с {start_date} по {end_date}: {len(orders)} заказов")
+        return orders
+
+    def iter_orders_in_range(self, start_date, end_date, fields=None):
+        start_date, end_date = date_bounds(start_date, end_date)
+        records = self._stream(self._orders_in_range_query(fields), start_date=start_date.isoformat(), end_date=end_date.isoformat())
+        for record in records:
+            yield self._decode_record(Order, record, "o")
+
+    def get_daily_revenue(self, start_date, end_date):
+        start_date, end_date = date_bounds(start_date, end_date)
         query = """
+        MATCH (o:Order)
+        WHERE o.order_date >= $start_date AND o.order_date <= $end_date
+        RETURN o.order_date AS order_date, sum(o.total) AS revenue
+        ORDER BY order_date
+        """
+        records = self._read(query, start_date=start_date.isoformat(), end_date=end_date.isoformat())
+        revenue = [record if self.raw else (record["order_date"], float(record["revenue"])) for record in records]
+        logging.info(f"Выручка по дням с {start_date} по {end_date}: {revenue}")
+        return revenue
+
+    def _similar_purchases_query(self, fields=None):
+        return """
         MATCH (u1:User {user_id: $user_id})-[:PLACED]->(:Order)-[:CONTAINS]->(p:Product)<-[:CONTAINS]-(:Order)<-[:PLACED]-(u2:User)
         WHERE u1 <> u2
-        RETURN DISTINCT u2
+        """ + self._returning("u2", User, fields, distinct=True)
+
+    def get_users_with_similar_purchases(self, user_id, fields=None):
+        records = self._read(self._similar_purchases_query(fields), user_id=user_id)
+        users = [self._decode_record(User, record, "u2") for record in records]
+        logging.info(f"Найдены пользователи с похожими покупками для пользователя с ID {user_id}: {len(users)} пользователей")
+        return users
+
+    def iter_users_with_similar_purchases(self, user_id, fields=None):
+        for record in self._stream(self._similar_purchases_query(fields), user_id=user_id):
+            yield self._decode_record(User, record, "u2")
+
+    def _products_by_category_query(self, fields=None):
+        return """
+        MATCH (p:Product)-[:BELONGS_TO]->(c:Category {category_id: $category_id})
+        """ + self._returning("p", Product, fields)
+
+    def get_products_by_category_id(self, category_id, fields=None):
+        records = self._read(self._products_by_category_query(fields), category_id=category_id)
+        products = [self._decode_record(Product, record, "p") for record in records]
+        logging.info(f"Найдены продукты для категории с ID {category_id}: {len(products)} продуктов")
+        return products
+
+    def iter_products_by_category_id(self, category_id, fields=None):
+        for record in self._stream(self._products_by_category_query(fields), category_id=category_id):
+            yield self._decode_record(Product, record, "p")
+
+    def iter_purchase_pairs(self):
+        query = """
+        MATCH (u:User)-[:PLACED]->(:Order)-[:CONTAINS]->(p:Product)
+        RETURN DISTINCT u.user_id AS user_id, p.product_id AS product_id
         """
-        with self.driver.session() as session:
-            result = session.run(query, user_id=user_id)
-            users = [record["u2"] for record in result]
-            logging.info(f"Найдены пользователи с похожими покупками для пользователя с ID {user_id}: {len(users)} пользователей")
-            return users
+        for record in self._stream(query):
+            yield record["user_id"], record["product_id"]
 
-    def get_products_by_category_id(self, category_id):
+    def iter_orders(self):
         query = """
-        MATCH (p:Product)-[:BELONGS_TO]->(c:Category {category_id: $category_id})
-        RETURN p
+        MATCH (u:User)-[:PLACED]->(o:Order)
+        RETURN o.order_id AS order_id, u.user_id AS user_id, o.order_date AS order_date, o.total AS total
         """
-        with self.driver.session() as session:
-            result = session.run(query, category_id=category_id)
-            products = [record["p"] for record in result]
-            logging.info(f"Найдены продукты для категории с ID {category_id}: {len(products)} продуктов")
-            return products
\ No newline at end of file
+        for record in self._stream(query):
+            yield record["order_id"], record["user_id"], record["order_date"], record["total"]
+
+    def iter_order_items(self):
+        # Связь CONTAINS не хранит количество, поэтому оно равно числу связей заказа с продуктом
+        query = """
+        MATCH (o:Order)-[:CONTAINS]->(p:Product)
+        RETURN o.order_id AS order_id, p.product_id AS product_id, count(*) AS quantity
+        """
+        for record in self._stream(query):
+            yield record["order_id"], record["product_id"], record["quantity"]
+
+    def iter_products(self):
+        query = """
+        MATCH (p:Product)
+        OPTIONAL MATCH (p)-[:BELONGS_TO]->(c:Category)
+        RETURN p.product_id AS product_id, p.name AS name, p.price AS price, c.category_id AS category_id
+        """
+        for record in self._stream(query):
+            yield record["product_id"], record["name"], record["price"], record["category_id"]
@@ -0,0 +1,50 @@
+# Отключение старых секций Orders для PostgreSQLClient и PostgreSQLBClient (обе схемы секционируют Orders
+# по месяцам, см. ensure_orders_partition в migrations/postgresql и migrations/postgresql_b).
+# Секции месяцев раньше before отключаются от Orders и переименовываются в archived_orders_YYYY_MM: данные
+# остаются в архивных таблицах, но не участвуют в запросах; это быстрее DELETE и не оставляет мёртвых строк.
+# Если в отключённый месяц снова пишут заказы, для него создаётся новая пустая секция; при повторном
+# отключении она архивируется под именем с суффиксом: archived_orders_YYYY_MM_2, _3, ...
+import logging
+
+from clients.date_range import month_start
+from clients.lazy_import import lazy_import
+
+sql = lazy_import("psycopg2.sql")
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+
+def archive_name(cursor, name):
+    # Первое свободное имя архивной таблицы: name, name_2, name_3, ...
+    candidate, suffix = name, 1
+    while True:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (candidate,))
+        if not cursor.fetchone()[0]:
+            return candidate
+        suffix += 1
+        candidate = f"{name}_{suffix}"
+
+
+def detach_orders_partitions(client, before):
+    # client — PostgreSQLClient или PostgreSQLBClient; все переименования фиксируются одной транзакцией,
+    # при ошибке она откатывается. Возвращает имена архивных таблиц
+    cutoff = f"orders_{month_start(before):%Y_%m}"
+    archived = []
+    try:
+        client.cursor.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'orders'::regclass ORDER BY c.relname
+        """)
+        partitions = [name for (name,) in client.cursor.fetchall() if name < cutoff]
+        for name in partitions:
+            client.cursor.execute(sql.SQL("ALTER TABLE Orders DETACH PARTITION {}").format(sql.Identifier(name)))
+            archived.append(archive_name(client.cursor, f"archived_{name}"))
+            client.cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(name), sql.Identifier(archived[-1])))
+        client._commit()
+    except Exception:
+        client.connection.rollback()
+        raise
+    client.partitions.clear()
+    logging.info(f"Секции заказов отключены: {archived}")
+    return archived
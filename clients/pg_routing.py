@@ -0,0 +1,154 @@
+# Маршрутизация чтения на реплики PostgreSQL для PostgreSQLClient и PostgreSQLBClient.
+# Реплики задаются списком DSN через запятую (DATABASE_REPLICA_URLS / DATABASE_JSONB_REPLICA_URLS
+# или параметр replica_urls конструктора клиента). Без реплик клиенты работают только с основным сервером.
+#
+# Правила выбора сервера для методов, помеченных @replica_read:
+# - read-your-writes: после записи клиент запоминает LSN основного сервера (pg_current_wal_lsn()) и читает
+#   с реплики только если она уже воспроизвела журнал до этого LSN (pg_last_wal_replay_lsn()),
+#   иначе читает с основного сервера; как только реплика догоняет, чтения снова уходят на неё;
+# - отставание: реплика с задержкой больше max_lag секунд пропускается (DATABASE_REPLICA_MAX_LAG, по умолчанию 5);
+# - недоступная реплика исключается на retry_interval секунд, запрос повторяется на основном сервере.
+# Состояние реплик проверяется не чаще раза в lag_check_interval секунд, кроме проверки LSN после записи.
+import functools
+import logging
+import os
+import time
+
+from clients.lazy_import import lazy_import
+
+psycopg2 = lazy_import("psycopg2")
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+
+def parse_lsn(lsn):
+    # LSN в текстовом виде "16/B374D848" — старшие и младшие 32 бита в шестнадцатеричной записи
+    if lsn is None:
+        return None
+    high, _, low = lsn.partition("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def replica_urls_from_env(variable):
+    return [url.strip() for url in os.getenv(variable, "").split(",") if url.strip()]
+
+
+class Replica:
+    def __init__(self, url, connect_kwargs=None):
+        self.url = url
+        self.connect_kwargs = connect_kwargs or {}
+        self.connection = None
+        self.cursor = None
+        self.replay_lsn = None
+        self.lag = None
+        self.checked_at = 0.0
+        self.down_until = 0.0
+
+    def connect(self):
+        if self.connection is None or self.connection.closed:
+            self.connection = psycopg2.connect(self.url, **self.connect_kwargs)
+            # Чтение без долгих транзакций: открытый снимок на реплике мешает воспроизведению журнала
+            self.connection.set_session(readonly=True, autocommit=True)
+            self.cursor = self.connection.cursor()
+
+    def refresh(self):
+        self.connect()
+        # Если всё полученное уже воспроизведено, реплика не отстаёт, даже если основной сервер давно не писал
+        self.cursor.execute("""
+        SELECT pg_last_wal_replay_lsn()::text,
+               CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+        """)
+        replay_lsn, lag = self.cursor.fetchone()
+        self.replay_lsn, self.lag = parse_lsn(replay_lsn), float(lag)
+        self.checked_at = time.monotonic()
+
+    def close(self):
+        if self.connection is not None and not self.connection.closed:
+            self.connection.close()
+
+
+class ReplicaRouter:
+    def __init__(self, connection, replica_urls, max_lag=None, lag_check_interval=1.0, retry_interval=30.0,
+                 connect_kwargs=None):
+        self.connection = connection
+        self.replicas = [Replica(url, connect_kwargs) for url in replica_urls]
+        self.max_lag = max_lag if max_lag is not None else float(os.getenv("DATABASE_REPLICA_MAX_LAG", 5))
+        self.lag_check_interval = lag_check_interval
+        self.retry_interval = retry_interval
+        self.write_lsn = None
+        self.next_replica = 0
+        logging.info(f"Чтение маршрутизируется на реплики PostgreSQL: {len(self.replicas)}")
+
+    def note_write(self):
+        # Вызывается после фиксации записи на основном сервере
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT pg_current_wal_lsn()::text")
+            self.write_lsn = parse_lsn(cursor.fetchone()[0])
+        self.connection.commit()
+
+    def mark_down(self, replica, error):
+        logging.warning(f"Реплика PostgreSQL недоступна, чтение переключено на основной сервер: {error}")
+        replica.close()
+        replica.connection = None
+        replica.down_until = time.monotonic() + self.retry_interval
+
+    def _usable(self, replica):
+        now = time.monotonic()
+        if replica.down_until > now:
+            return False
+        if now - replica.checked_at > self.lag_check_interval:
+            replica.refresh()
+        if replica.lag > self.max_lag:
+            return False
+        if self.write_lsn is not None and (replica.replay_lsn is None or replica.replay_lsn < self.write_lsn):
+            # Кешированный LSN мог устареть: перед отказом перепроверяем реплику
+            replica.refresh()
+            if replica.replay_lsn is None or replica.replay_lsn < self.write_lsn:
+                return False
+        return True
+
+    def choose(self):
+        # Реплики перебираются по кругу, чтобы нагрузка распределялась между ними
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(self.next_replica + offset) % len(self.replicas)]
+            try:
+                usable = self._usable(replica)
+            except psycopg2.OperationalError as error:
+                self.mark_down(replica, error)
+                continue
+            if usable:
+                self.next_replica = (self.next_replica + offset + 1) % len(self.replicas)
+                return replica
+        return None
+
+    def close(self):
+        for replica in self.replicas:
+            replica.close()
+
+
+def make_router(connection, replica_urls, env_variable, connect_kwargs=None):
+    # connect_kwargs — параметры libpq из профиля настройки (clients/tuning.py), общие с основным сервером
+    replica_urls = replica_urls if replica_urls is not None else replica_urls_from_env(env_variable)
+    return ReplicaRouter(connection, replica_urls, connect_kwargs=connect_kwargs) if replica_urls else None
+
+
+def replica_read(method):
+    # Выполняет метод чтения на реплике, подменяя self.cursor на время вызова
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        router = self.router
+        replica = router.choose() if router is not None else None
+        if replica is None:
+            return method(self, *args, **kwargs)
+        primary_cursor = self.cursor
+        self.cursor = replica.cursor
+        try:
+            return method(self, *args, **kwargs)
+        except psycopg2.OperationalError as error:
+            router.mark_down(replica, error)
+        finally:
+            self.cursor = primary_cursor
+        return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,323 @@
+# Захват планов выполнения запросов на стороне сервера для методов клиентов.
+# capture_plans(client, backend, recorder) подменяет у экземпляра клиента объект драйвера прокси-объектом,
+# который запоминает запросы, выполненные внутри публичного метода. После завершения метода для каждого
+# запроса снимается план, так что время самого метода не искажается:
+# - postgresql, postgresql_b: EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) для чтения и EXPLAIN (FORMAT JSON)
+#   для изменяющих запросов (чтобы не выполнять запись повторно);
+# - mongodb: explain с verbosity executionStats для команд find/aggregate/count/distinct
+#   (команды перехватываются через CommandListener, поэтому клиент пересоздаётся с ним);
+# - neo4j: PROFILE для чтения и EXPLAIN для запросов с CREATE/MERGE/SET/DELETE/REMOVE;
+# - cassandra: трассировка запроса (trace=True), план — последовательность событий трассировки.
+#
+# Для каждого плана сохраняется «форма» — нормализованное дерево операторов без чисел. Формы двух прогонов
+# сравниваются diff_plans(), чтобы отличать регрессию из-за смены плана от регрессии при том же плане.
+import json
+import re
+import logging
+import threading
+
+READ_STATEMENT = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+CYPHER_WRITE = re.compile(r"\b(CREATE|MERGE|SET|DELETE|REMOVE)\b", re.IGNORECASE)
+MONGO_READ_COMMANDS = ("find", "aggregate", "count", "distinct")
+MONGO_SESSION_FIELDS = ("lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "signature")
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+
+class PlanRecorder:
+    def __init__(self):
+        self.plans = {}
+        self.local = threading.local()
+
+    def add(self, backend, method, entry):
+        self.plans.setdefault(backend, {}).setdefault(method, []).append(entry)
+
+    def pending(self):
+        return getattr(self.local, "pending", None)
+
+    def save(self, path):
+        with open(path, "w") as plans_file:
+            json.dump(self.plans, plans_file, indent=2, default=str)
+
+
+def _query_text(query, connection):
+    # Запросы, собранные через psycopg2.sql, приводятся к строке
+    return query.as_string(connection) if hasattr(query, "as_string") else query
+
+
+# Формы планов: дерево операторов в одну строку, например "Hash Join(Seq Scan[orders], Hash(Seq Scan[users]))"
+
+def _postgresql_shape(node):
+    target = node.get("Index Name") or node.get("Relation Name")
+    label = node["Node Type"] + (f"[{target}]" if target else "")
+    children = node.get("Plans") or []
+    return label + (f"({', '.join(_postgresql_shape(child) for child in children)})" if children else "")
+
+
+def _mongo_shape(stage):
+    label = stage.get("stage", "?") + (f"[{stage['indexName']}]" if stage.get("indexName") else "")
+    children = stage.get("inputStages") or ([stage["inputStage"]] if "inputStage" in stage else [])
+    return label + (f"({', '.join(_mongo_shape(child) for child in children)})" if children else "")
+
+
+def _neo4j_shape(operator):
+    label = operator["operatorType"].split("@")[0]
+    children = operator.get("children") or []
+    return label + (f"({', '.join(_neo4j_shape(child) for child in children)})" if children else "")
+
+
+def _explain_postgresql(client, query, params):
+    text = _query_text(query, client.connection)
+    analyze = bool(READ_STATEMENT.match(text))
+    prefix = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " if analyze else "EXPLAIN (FORMAT JSON) "
+    with client.connection.cursor() as cursor:
+        cursor.execute(prefix + text, params)
+        plan = cursor.fetchone()[0][0]
+    client.connection.rollback()
+    root = plan["Plan"]
+    stats = {"analyzed": analyze, "estimated_rows": root.get("Plan Rows"), "total_cost": root.get("Total Cost")}
+    if analyze:
+        stats.update({
+            "execution_ms": plan.get("Execution Time"),
+            "planning_ms": plan.get("Planning Time"),
+            "actual_rows": root.get("Actual Rows"),
+            "shared_hit_blocks": root.get("Shared Hit Blocks"),
+            "shared_read_blocks": root.get("Shared Read Blocks"),
+        })
+    return {"query": text, "shape": _postgresql_shape(root), "stats": stats, "plan": plan}
+
+
+def _explain_mongodb(client, database, command):
+    explained = client.client[database].command({"explain": command, "verbosity": "executionStats"})
+    planner, execution = explained.get("queryPlanner"), explained.get("executionStats")
+    shape = None
+    if planner is None and "stages" in explained:
+        # Для агрегаций план курсора находится в первой стадии $cursor
+        cursor = explained["stages"][0].get("$cursor", {})
+        planner, execution = cursor.get("queryPlanner"), cursor.get("executionStats")
+        shape = " | ".join(next(iter(stage)) for stage in explained["stages"])
+    if planner is not None:
+        winning = _mongo_shape(planner["winningPlan"])
+        shape = winning if shape is None else f"{winning} | {shape}"
+    execution = execution or {}
+    stats = {key: execution.get(key) for key in ("nReturned", "executionTimeMillis", "totalKeysExamined", "totalDocsExamined")}
+    return {"query": json.dumps(command, default=str), "shape": shape, "stats": stats, "plan": explained}
+
+
+def _explain_neo4j(client, query, params):
+    profile = not CYPHER_WRITE.search(query)
+    with client.driver.session() as session:
+        summary = session.run(("PROFILE " if profile else "EXPLAIN ") + query, params).consume()
+    plan = summary.profile if profile else summary.plan
+    stats = {"profiled": profile}
+    if profile:
+        db_hits, stack = 0, [plan]
+        while stack:
+            operator = stack.pop()
+            db_hits += operator.get("dbHits", 0)
+            stack.extend(operator.get("children") or [])
+        stats.update({"db_hits": db_hits, "rows": plan.get("rows")})
+    return {"query": query, "shape": _neo4j_shape(plan), "stats": stats, "plan": plan}
+
+
+def _explain_cassandra(client, query, result):
+    trace = result.get_query_trace()
+    events = [{"activity": event.description, "source": str(event.source),
+               "elapsed_us": event.source_elapsed.total_seconds() * 1e6 if event.source_elapsed else None}
+              for event in trace.events]
+    activities = []
+    for event in events:
+        activity = re.sub(r"\d+", "#", event["activity"])
+        if activity not in activities:
+            activities.append(activity)
+    stats = {"duration_us": trace.duration.total_seconds() * 1e6 if trace.duration else None, "events": len(events)}
+    return {"query": str(getattr(query, "query_string", query)), "shape": " -> ".join(activities), "stats": stats,
+            "plan": events}
+
+
+EXPLAINERS = {
+    "postgresql": _explain_postgresql,
+    "postgresql_b": _explain_postgresql,
+    "mongodb": _explain_mongodb,
+    "neo4j": _explain_neo4j,
+    "cassandra": _explain_cassandra,
+}
+
+
+class _CursorProxy:
+    def __init__(self, cursor, recorder):
+        self._cursor = cursor
+        self._recorder = recorder
+
+    def execute(self, query, params=None):
+        pending = self._recorder.pending()
+        if pending is not None:
+            pending.append((query, params))
+        return self._cursor.execute(query, params)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _Neo4jRunProxy:
+    # Запоминает запросы run() сессии или транзакции
+    def __init__(self, target, recorder):
+        self._target = target
+        self._recorder = recorder
+
+    def run(self, query, parameters=None, **kwargs):
+        pending = self._recorder.pending()
+        if pending is not None:
+            pending.append((query, dict(parameters or {}, **kwargs)))
+        return self._target.run(query, parameters, **kwargs)
+
+    def __enter__(self):
+        self._target.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._target.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class _Neo4jSessionProxy(_Neo4jRunProxy):
+    def begin_transaction(self, *args, **kwargs):
+        return _Neo4jRunProxy(self._target.begin_transaction(*args, **kwargs), self._recorder)
+
+    def read_transaction(self, work, *args, **kwargs):
+        return self._target.read_transaction(lambda tx, *a, **k: work(_Neo4jRunProxy(tx, self._recorder), *a, **k), *args, **kwargs)
+
+    def write_transaction(self, work, *args, **kwargs):
+        return self._target.write_transaction(lambda tx, *a, **k: work(_Neo4jRunProxy(tx, self._recorder), *a, **k), *args, **kwargs)
+
+
+class _Neo4jDriverProxy:
+    def __init__(self, driver, recorder):
+        self._driver = driver
+        self._recorder = recorder
+
+    def session(self, *args, **kwargs):
+        return _Neo4jSessionProxy(self._driver.session(*args, **kwargs), self._recorder)
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+
+class _CassandraSessionProxy:
+    def __init__(self, session, recorder):
+        self._session = session
+        self._recorder = recorder
+
+    def execute(self, query, parameters=None, *args, **kwargs):
+        pending = self._recorder.pending()
+        if pending is None:
+            return self._session.execute(query, parameters, *args, **kwargs)
+        kwargs["trace"] = True
+        result = self._session.execute(query, parameters, *args, **kwargs)
+        pending.append((query, result))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+def _mongo_listener(recorder):
+    from pymongo import monitoring
+
+    class PlanListener(monitoring.CommandListener):
+        def started(self, event):
+            pending = recorder.pending()
+            if pending is None or event.command_name not in MONGO_READ_COMMANDS:
+                return
+            command = {key: value for key, value in event.command.items() if key not in MONGO_SESSION_FIELDS}
+            pending.append((event.database_name, command))
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    return PlanListener()
+
+
+def _install_proxies(client, backend, recorder):
+    if backend in ("postgresql", "postgresql_b"):
+        # Планы снимаются на основном сервере, поэтому чтение с реплик (clients/pg_routing.py) отключается
+        client.router = None
+        client.cursor = _CursorProxy(client.cursor, recorder)
+    elif backend == "neo4j":
+        client.driver = _Neo4jDriverProxy(client.driver, recorder)
+    elif backend == "cassandra":
+        client.session = _CassandraSessionProxy(client.session, recorder)
+    elif backend == "mongodb":
+        import os
+        from pymongo import MongoClient
+        from clients.tuning import mongo_options
+
+        database = client.db.name
+        client.client.close()
+        client.client = MongoClient(os.getenv("MONGO_URL"), event_listeners=[_mongo_listener(recorder)],
+                                    **mongo_options(client.tuning))
+        client.db = client.client.get_database(database)
+    else:
+        raise ValueError(f"Захват планов не поддерживается для {backend}, допустимые: {', '.join(EXPLAINERS)}")
+
+
+def _wrap_method(client, backend, recorder, name, method):
+    explain = EXPLAINERS[backend]
+
+    def wrapper(*args, **kwargs):
+        # Вложенные вызовы публичных методов относятся к внешнему методу
+        if recorder.pending() is not None:
+            return method(*args, **kwargs)
+        recorder.local.pending = []
+        try:
+            return method(*args, **kwargs)
+        finally:
+            pending, recorder.local.pending = recorder.pending(), None
+            for query in pending:
+                try:
+                    entry = explain(client, *query)
+                except Exception as error:
+                    logger.warning(f"Не удалось получить план запроса метода {name}: {error}")
+                    if backend in ("postgresql", "postgresql_b"):
+                        client.connection.rollback()
+                    entry = {"query": str(query[0]), "shape": None, "stats": {}, "error": str(error)}
+                recorder.add(backend, name, entry)
+    wrapper.__name__ = name
+    return wrapper
+
+
+def capture_plans(client, backend, recorder=None):
+    recorder = recorder or PlanRecorder()
+    _install_proxies(client, backend, recorder)
+    for name in dir(type(client)):
+        # Соединения клиентов — ленивые свойства (functools.cached_property), а не методы
+        if name.startswith("_") or name.startswith("iter_") or name == "close" or not callable(getattr(type(client), name)):
+            continue
+        method = getattr(client, name)
+        if callable(method):
+            setattr(client, name, _wrap_method(client, backend, recorder, name, method))
+    return recorder
+
+
+def plan_shapes(plans):
+    return {(backend, method): sorted({entry["shape"] for entry in entries if entry["shape"] is not None})
+            for backend, methods in plans.items() for method, entries in methods.items()}
+
+
+def diff_plans(old, new):
+    old_shapes, new_shapes = plan_shapes(old), plan_shapes(new)
+    changes = []
+    for key in sorted(set(old_shapes) | set(new_shapes)):
+        before, after = old_shapes.get(key, []), new_shapes.get(key, [])
+        if before != after:
+            changes.append({"backend": key[0], "method": key[1], "old": before, "new": after})
+    return changes
@@ -1,90 +1,235 @@
+import functools
 import os
-import psycopg2
-from psycopg2.extras import Json
 import logging
+import uuid
+
+from clients.date_range import date_bounds, month_start
+from clients.instrumentation import instrumented
+from clients.lazy_import import lazy_import
+from clients.migrations import check_schema
+from clients.pg_partitions import detach_orders_partitions
+from clients.pg_routing import make_router, replica_read
+from clients.records import User, Product, Order, from_mapping, from_rows, items_from_mappings, check_fields
+from clients.tuning import tuning_for
+
+psycopg2 = lazy_import("psycopg2")
+sql = lazy_import("psycopg2.sql")
+extras = lazy_import("psycopg2.extras")
+errors = lazy_import("psycopg2.errors")
 
 logger = logging.getLogger()
 logging.basicConfig(level=logging.INFO)
 
+# Поля, которые хранятся в JSONB-колонке data; остальные поля записей — обычные колонки
+DATA_FIELDS = {
+    "Users": ("name", "email", "registration_date"),
+    "Products": ("name", "price", "category_name"),
+    "Orders": ("order_date", "total"),
+}
+RECORDS = {"Users": User, "Products": Product, "Orders": Order}
+
+
+@instrumented("postgresql_b")
 class PostgreSQLBClient:
-    def __init__(self):
+    def __init__(self, raw=False, replica_urls=None, tuning=None):
+        self.raw = raw
+        self.tuning = tuning_for("postgresql_b", tuning)
         database_url = os.getenv('DATABASE_JSONB_URL')
         if not database_url:
             raise ValueError("DATABASE_URL is not set in the environment")
-        self.connection = psycopg2.connect(database_url)
-        self.cursor = self.connection.cursor()
+        self.database_url = database_url
+        self.replica_urls = replica_urls
+        # Месяцы, секции Orders для которых уже созданы (см. ensure_orders_partition в migrations/postgresql_b)
+        self.partitions = set()
+        # Число незавершённых выгрузок _stream: транзакция фиксируется, когда завершается последняя
+        self.streams = 0
+
+    # Соединение открывается при первом обращении: создание клиента не ждёт сети и проверки версии схемы
+    @functools.cached_property
+    def connection(self):
+        connection = psycopg2.connect(self.database_url, **self.tuning)
+        check_schema("postgresql_b", connection)
         logging.info("Подключение к базе данных PostgreSQL установлено")
+        return connection
+
+    @functools.cached_property
+    def cursor(self):
+        return self.connection.cursor()
+
+    @functools.cached_property
+    def router(self):
+        return make_router(self.connection, self.replica_urls, "DATABASE_JSONB_REPLICA_URLS", self.tuning)
+
+    def _commit(self):
+        self.connection.commit()
+        if self.router is not None:
+            self.router.note_write()
+
+    def _ensure_partition(self, order_date):
+        # Секция создаётся в транзакции записи; в кеш месяц попадает только после фиксации
+        month = month_start(order_date)
+        if month not in self.partitions:
+            self.cursor.execute("SELECT ensure_orders_partition(%s)", (month,))
+        return month
+
+    def _execute_in_partition(self, order_date, query, params):
+        # Кеш секций локален для экземпляра: секцию месяца мог отключить другой клиент или процесс
+        # (detach_orders_partitions) или откатить восстановление снимка. Тогда строке не находится секции
+        # (SQLSTATE 23514): месяц удаляется из кеша, и запись повторяется один раз с созданием секции
+        month = self._ensure_partition(order_date)
+        try:
+            self.cursor.execute(query, params)
+        except errors.CheckViolation:
+            self.connection.rollback()
+            self.partitions.discard(month)
+            self._ensure_partition(order_date)
+            self.cursor.execute(query, params)
+        return month
+
+    def _data(self, table, fields=None, alias=None):
+        # Вместо целого документа data возвращаем только запрошенные ключи
+        column = sql.Identifier(*((alias, "data") if alias else ("data",)))
+        if not fields:
+            return column
+        check_fields(RECORDS[table], fields)
+        keys = [field for field in fields if field in DATA_FIELDS[table]]
+        pairs = sql.SQL(", ").join(sql.SQL("{}, {}->{}").format(sql.Literal(key), column, sql.Literal(key)) for key in keys)
+        return sql.SQL("jsonb_build_object({})").format(pairs)
 
     def create_user(self, name, email, registration_date):
         data = {"name": name, "email": email, "registration_date": registration_date}
         query = """INSERT INTO Users (data) VALUES (%s) RETURNING user_id"""
-        self.cursor.execute(query, (Json(data),))
+        self.cursor.execute(query, (extras.Json(data),))
         user_id = self.cursor.fetchone()[0]
-        self.connection.commit()
+        self._commit()
         logging.info(f"Пользователь {name} с email {email} успешно создан с ID: {user_id}")
         return user_id
 
-    def get_user(self, user_id):
-        query = """SELECT data FROM Users WHERE user_id = %s"""
+    @replica_read
+    def get_user(self, user_id, fields=None):
+        query = sql.SQL("""SELECT {} FROM Users WHERE user_id = %s""").format(self._data("Users", fields))
         self.cursor.execute(query, (user_id,))
         result = self.cursor.fetchone()
         logging.info(f"Пользователь с ID {user_id} найден: {result}")
-        return result[0] if result else None
+        if self.raw or not result:
+            return result[0] if result else None
+        return from_mapping(User, result[0], user_id=user_id)
 
     def create_product(self, name, price, category_name):
         data = {"name": name, "price": price, "category_name": category_name}
         query = """INSERT INTO Products (data) VALUES (%s) RETURNING product_id"""
-        self.cursor.execute(query, (Json(data),))
+        self.cursor.execute(query, (extras.Json(data),))
         product_id = self.cursor.fetchone()[0]
-        self.connection.commit()
+        self._commit()
         logging.info(f"Продукт {name} с ценой {price} успешно создан с ID: {product_id}")
         return product_id
 
-    def get_product(self, product_id):
-        query = """SELECT data FROM Products WHERE product_id = %s"""
+    @replica_read
+    def get_product(self, product_id, fields=None):
+        query = sql.SQL("""SELECT {} FROM Products WHERE product_id = %s""").format(self._data("Products", fields))
         self.cursor.execute(query, (product_id,))
         result = self.cursor.fetchone()
         logging.info(f"Продукт с ID {product_id} найден: {result}")
-        return result[0] if result else None
+        if self.raw or not result:
+            return result[0] if result else None
+        return from_mapping(Product, result[0], product_id=product_id)
 
     def create_order(self, user_id, items, order_date, total):
         items_data = [{"product_id": item["product_id"], "quantity": item["quantity"]} for item in items]
         data = {"order_date": order_date, "total": total}
-        query = """INSERT INTO Orders (user_id, items, data) VALUES (%s, %s, %s) RETURNING order_id"""
-        self.cursor.execute(query, (user_id, Json(items_data), Json(data)))
+        query = """INSERT INTO Orders (user_id, order_date, items, data) VALUES (%s, %s, %s, %s) RETURNING order_id"""
+        month = self._execute_in_partition(order_date, query, (user_id, order_date, extras.Json(items_data), extras.Json(data)))
         order_id = self.cursor.fetchone()[0]
-        self.connection.commit()
+        self._commit()
+        self.partitions.add(month)
         logging.info(f"Заказ с ID {order_id} для пользователя с ID {user_id} создан")
         return order_id
 
-    def get_order(self, order_id):
-        query = """SELECT user_id, items, data FROM Orders WHERE order_id = %s"""
+    @replica_read
+    def get_order(self, order_id, fields=None):
+        items = sql.SQL("items" if not fields or "items" in fields else "NULL::jsonb")
+        query = sql.SQL("""SELECT user_id, {}, {} FROM Orders WHERE order_id = %s""").format(items, self._data("Orders", fields))
         self.cursor.execute(query, (order_id,))
         result = self.cursor.fetchone()
         logging.info(f"Заказ с ID {order_id} найден: {result}")
-        return result if result else None
+        if self.raw or not result:
+            return result if result else None
+        user_id, items, data = result
+        return self._decode_order(order_id, data, user_id=user_id, items=items)
 
-    def get_orders_by_user_id(self, user_id):
-        query = """SELECT order_id, data FROM Orders WHERE user_id = %s"""
+    def _decode_order(self, order_id, data, **fields):
+        if fields.get("items") is not None:
+            fields["items"] = items_from_mappings(fields["items"], order_id)
+        return from_mapping(Order, data, order_id=order_id, **fields)
+
+    @replica_read
+    def get_orders_by_user_id(self, user_id, fields=None):
+        query = sql.SQL("""SELECT order_id, {} FROM Orders WHERE user_id = %s""").format(self._data("Orders", fields))
         self.cursor.execute(query, (user_id,))
         result = self.cursor.fetchall()
         logging.info(f"Заказы пользователя с ID {user_id}: {result}")
-        return result
+        return result if self.raw else [self._decode_order(order_id, data, user_id=user_id) for order_id, data in result]
+
+    @replica_read
+    def get_orders_by_user_in_range(self, user_id, start_date, end_date, fields=None):
+        # Фильтр по колонке order_date (ключу секционирования), а не по data->>'order_date'
+        start_date, end_date = date_bounds(start_date, end_date)
+        query = sql.SQL("""
+        SELECT order_id, {} FROM Orders
+        WHERE user_id = %s AND order_date BETWEEN %s AND %s
+        ORDER BY order_date, order_id
+        """).format(self._data("Orders", fields))
+        self.cursor.execute(query, (user_id, start_date, end_date))
+        result = self.cursor.fetchall()
+        logging.info(f"Заказы пользователя с ID {user_id} с {start_date} по {end_date}: {result}")
+        return result if self.raw else [self._decode_order(order_id, data, user_id=user_id) for order_id, data in result]
 
-    def get_products_by_user_id(self, user_id):
+    @replica_read
+    def get_orders_in_range(self, start_date, end_date, fields=None):
+        start_date, end_date = date_bounds(start_date, end_date)
+        query = sql.SQL("""
+        SELECT order_id, user_id, {} FROM Orders
+        WHERE order_date BETWEEN %s AND %s
+        ORDER BY order_date, order_id
+        """).format(self._data("Orders", fields))
+        self.cursor.execute(query, (start_date, end_date))
+        result = self.cursor.fetchall()
+        logging.info(f"Заказы с {start_date} по {end_date}: {len(result)}")
+        if self.raw:
+            return result
+        return [self._decode_order(order_id, data, user_id=user_id) for order_id, user_id, data in result]
+
+    @replica_read
+    def get_daily_revenue(self, start_date, end_date):
+        # Список (order_date, выручка) по дням с заказами, по возрастанию даты; без raw — (ISO-строка, float)
+        start_date, end_date = date_bounds(start_date, end_date)
         query = """
-        SELECT DISTINCT p.product_id, p.data
+        SELECT order_date, SUM((data->>'total')::NUMERIC) FROM Orders
+        WHERE order_date BETWEEN %s AND %s
+        GROUP BY order_date
+        ORDER BY order_date
+        """
+        self.cursor.execute(query, (start_date, end_date))
+        result = self.cursor.fetchall()
+        logging.info(f"Выручка по дням с {start_date} по {end_date}: {result}")
+        return result if self.raw else [(day.isoformat(), float(revenue)) for day, revenue in result]
+
+    @replica_read
+    def get_products_by_user_id(self, user_id, fields=None):
+        query = sql.SQL("""
+        SELECT DISTINCT p.product_id, {}
         FROM Products p
         JOIN Orders o ON o.user_id = %s
         JOIN jsonb_array_elements(o.items) as item
             ON (item->>'product_id')::INT = p.product_id
-        """
+        """).format(self._data("Products", fields, alias="p"))
         self.cursor.execute(query, (user_id,))
         result = self.cursor.fetchall()
         logging.info(f"Продукты, купленные пользователем с ID {user_id}: {result}")
-        return result
+        return result if self.raw else [from_mapping(Product, data, product_id=product_id) for product_id, data in result]
 
-    def get_users_with_similar_purchases(self, user_id):
+    @replica_read
+    def get_users_with_similar_purchases(self, user_id, fields=None):
         query = """
         SELECT DISTINCT (item->>'product_id')::INT as product_id
         FROM Orders
@@ -98,22 +243,79 @@ class PostgreSQLBClient:
             logging.info("Пользователь не сделал покупок")
             return []
 
-        query = """
-        SELECT DISTINCT u.user_id, u.data->>'name'
+        projection = self._data("Users", fields, alias="u") if fields else sql.SQL("u.data->>'name'")
+        query = sql.SQL("""
+        SELECT DISTINCT u.user_id, {}
         FROM Users u
         JOIN Orders o ON u.user_id = o.user_id
         JOIN jsonb_array_elements(o.items) as item
             ON (item->>'product_id')::INT = ANY(%s)
         WHERE u.user_id != %s
-        """
+        """).format(projection)
         self.cursor.execute(query, (purchased_products, user_id))
         result = self.cursor.fetchall()
         logging.info(f"Пользователи с похожими покупками: {result}")
-        return result
+        if self.raw:
+            return result
+        if fields:
+            return [from_mapping(User, data, user_id=similar_user_id) for similar_user_id, data in result]
+        return from_rows(User, result)
 
-    def get_products_by_category_id(self, category_name):
-        query = """SELECT product_id, data FROM Products WHERE data->>'category_name' = %s"""
+    @replica_read
+    def get_products_by_category_id(self, category_name, fields=None):
+        query = sql.SQL("""SELECT product_id, {} FROM Products WHERE data->>'category_name' = %s""").format(self._data("Products", fields))
         self.cursor.execute(query, (category_name,))
         result = self.cursor.fetchall()
         logging.info(f"Продукты в категории {category_name}: {result}")
-        return result
\ No newline at end of file
+        return result if self.raw else [from_mapping(Product, data, product_id=product_id) for product_id, data in result]
+
+    def detach_orders_partitions(self, before):
+        # Секции месяцев раньше before переименовываются в archived_orders_YYYY_MM (см. clients/pg_partitions.py).
+        # Позиции хранятся в самих заказах и архивируются вместе с ними
+        return detach_orders_partitions(self, before)
+
+    def truncate_all(self):
+        # Очистка всех таблиц одной командой (секции Orders очищаются вместе с ней) и сброс последовательностей ID
+        self.cursor.execute(sql.SQL("TRUNCATE {} RESTART IDENTITY CASCADE").format(
+            sql.SQL(", ").join(sql.Identifier(table.lower()) for table in RECORDS)))
+        self._commit()
+        logging.info("Все таблицы PostgreSQL (JSONB) очищены")
+
+    def _stream(self, query, batch_size):
+        # Именованный (серверный) курсор отдаёт строки пачками, не загружая всю выборку в память.
+        # Имя уникально для каждой выгрузки, чтобы несколько iter_* могли читаться одновременно; фиксация
+        # транзакции закрывает все серверные курсоры, поэтому она откладывается до завершения последней выгрузки
+        self.streams += 1
+        try:
+            with self.connection.cursor(name=f"export_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query)
+                yield from cursor
+        finally:
+            self.streams -= 1
+        if not self.streams:
+            self.connection.commit()
+
+    def iter_purchase_pairs(self, batch_size=10000):
+        query = """
+        SELECT DISTINCT o.user_id, (item->>'product_id')::INT
+        FROM Orders o
+        JOIN jsonb_array_elements(o.items) as item ON true
+        """
+        return self._stream(query, batch_size)
+
+    def iter_orders(self, batch_size=10000):
+        query = """SELECT order_id, user_id, data->>'order_date', (data->>'total')::NUMERIC FROM Orders"""
+        return self._stream(query, batch_size)
+
+    def iter_order_items(self, batch_size=10000):
+        query = """
+        SELECT o.order_id, (item->>'product_id')::INT, (item->>'quantity')::INT
+        FROM Orders o
+        JOIN jsonb_array_elements(o.items) as item ON true
+        """
+        return self._stream(query, batch_size)
+
+    def iter_products(self, batch_size=10000):
+        query = """SELECT product_id, data->>'name', (data->>'price')::NUMERIC, data->>'category_name' FROM Products"""
+        return self._stream(query, batch_size)
@@ -1,181 +1,347 @@
+import functools
 import os
-import psycopg2
 import logging
+import uuid
+
+from clients.date_range import date_bounds, month_start
+from clients.instrumentation import instrumented
+from clients.lazy_import import lazy_import
+from clients.migrations import check_schema
+from clients.pg_partitions import detach_orders_partitions
+from clients.pg_routing import make_router, replica_read
+from clients.records import User, Product, Category, Order, OrderItem, from_fields, from_fields_rows
+from clients.tuning import tuning_for
+
+psycopg2 = lazy_import("psycopg2")
+sql = lazy_import("psycopg2.sql")
+errors = lazy_import("psycopg2.errors")
 
 logger = logging.getLogger()
 logging.basicConfig(level=logging.INFO)
 
 
+# Колонки таблиц в порядке их объявления; используются для проекции (параметр fields) вместо SELECT *
+COLUMNS = {
+    "Users": ("user_id", "name", "email", "registration_date"),
+    "Orders": ("order_id", "user_id", "order_date", "total"),
+    "Products": ("product_id", "name", "price", "category_id"),
+    "Categories": ("category_id", "category_name"),
+    "Order_Items": ("order_id", "product_id", "quantity"),
+}
+RECORDS = {"Users": User, "Orders": Order, "Products": Product, "Categories": Category, "Order_Items": OrderItem}
+
+
+@instrumented("postgresql")
 class PostgreSQLClient:
-    def __init__(self):
+    def __init__(self, raw=False, replica_urls=None, tuning=None):
+        self.raw = raw
+        self.tuning = tuning_for("postgresql", tuning)
         database_url = os.getenv('DATABASE_URL')
         if not database_url:
             raise ValueError("DATABASE_URL is not set in the environment")
 
-        self.connection = psycopg2.connect(database_url)
-        self.cursor = self.connection.cursor()
+        self.database_url = database_url
+        self.replica_urls = replica_urls
+        # Месяцы, секции Orders для которых уже созданы (см. ensure_orders_partition в migrations/postgresql)
+        self.partitions = set()
+        # Число незавершённых выгрузок _stream: транзакция фиксируется, когда завершается последняя
+        self.streams = 0
+
+    # Соединение открывается при первом обращении: создание клиента не ждёт сети и проверки версии схемы
+    @functools.cached_property
+    def connection(self):
+        connection = psycopg2.connect(self.database_url, **self.tuning)
+        check_schema("postgresql", connection)
         logging.info("Подключение к базе данных PostgreSQL установлено")
+        return connection
+
+    @functools.cached_property
+    def cursor(self):
+        return self.connection.cursor()
+
+    @functools.cached_property
+    def router(self):
+        return make_router(self.connection, self.replica_urls, "DATABASE_REPLICA_URLS", self.tuning)
+
+    def _commit(self):
+        self.connection.commit()
+        if self.router is not None:
+            self.router.note_write()
+
+    def _ensure_partition(self, order_date):
+        # Секция создаётся в транзакции записи; в кеш месяц попадает только после фиксации
+        month = month_start(order_date)
+        if month not in self.partitions:
+            self.cursor.execute("SELECT ensure_orders_partition(%s)", (month,))
+        return month
+
+    def _execute_in_partition(self, order_date, query, params):
+        # Кеш секций локален для экземпляра: секцию месяца мог отключить другой клиент или процесс
+        # (detach_orders_partitions) или откатить восстановление снимка. Тогда строке не находится секции
+        # (SQLSTATE 23514): месяц удаляется из кеша, и запись повторяется один раз с созданием секции
+        month = self._ensure_partition(order_date)
+        try:
+            self.cursor.execute(query, params)
+        except errors.CheckViolation:
+            self.connection.rollback()
+            self.partitions.discard(month)
+            self._ensure_partition(order_date)
+            self.cursor.execute(query, params)
+        return month
+
+    def _columns(self, table, fields=None, alias=None, default=None):
+        fields = tuple(fields) if fields else default or COLUMNS[table]
+        unknown = [field for field in fields if field not in COLUMNS[table]]
+        if unknown:
+            raise ValueError(f"Таблица {table} не содержит колонок: {', '.join(unknown)}")
+        columns = sql.SQL(", ").join(sql.Identifier(*((alias, field) if alias else (field,))) for field in fields)
+        return fields, columns
+
+    def _select(self, table, key, fields=None):
+        fields, columns = self._columns(table, fields)
+        query = sql.SQL("SELECT {} FROM {} WHERE {} = %s").format(columns, sql.SQL(table), sql.Identifier(key))
+        return fields, query
+
+    def _decode_one(self, table, fields, row):
+        return row if self.raw else from_fields(RECORDS[table], fields, row)
+
+    def _decode_all(self, table, fields, rows):
+        return rows if self.raw else from_fields_rows(RECORDS[table], fields, rows)
 
     def create_user(self, name, email, registration_date):
         query = """INSERT INTO Users (name, email, registration_date) VALUES (%s, %s, %s) RETURNING user_id"""
         self.cursor.execute(query, (name, email, registration_date))
         user_id = self.cursor.fetchone()[0]
-        self.connection.commit()
+        self._commit()
         logging.info(f"Пользователь {name} с email {email} успешно создан с ID: {user_id}")
         return user_id
 
-    def get_user(self, user_id):
-        query = """SELECT * FROM Users WHERE user_id = %s"""
+    @replica_read
+    def get_user(self, user_id, fields=None):
+        fields, query = self._select("Users", "user_id", fields)
         self.cursor.execute(query, (user_id,))
         result = self.cursor.fetchone()
         if result:
             logging.info(f"Пользователь с ID {user_id} найден: {result}")
         else:
             logging.info(f"Пользователь с ID {user_id} не найден")
-        return result
+        return self._decode_one("Users", fields, result)
 
     def update_user(self, user_id, name=None, email=None, registration_date=None):
         query = """UPDATE Users SET name = COALESCE(%s, name), email = COALESCE(%s, email), registration_date = COALESCE(%s, registration_date) WHERE user_id = %s"""
         self.cursor.execute(query, (name, email, registration_date, user_id))
-        self.connection.commit()
+        self._commit()
         logging.info(f"Данные пользователя с ID {user_id} обновлены")
 
     def delete_user(self, user_id):
         query = """DELETE FROM Users WHERE user_id = %s"""
         self.cursor.execute(query, (user_id,))
-        self.connection.commit()
+        self._commit()
         logging.info(f"Пользователь с ID {user_id} удалён")
 
     def create_order(self, user_id, order_date, total):
         query = """INSERT INTO Orders (user_id, order_date, total) VALUES (%s, %s, %s) RETURNING order_id"""
-        self.cursor.execute(query, (user_id, order_date, total))
+        month = self._execute_in_partition(order_date, query, (user_id, order_date, total))
         order_id = self.cursor.fetchone()[0]
-        self.connection.commit()
+        self._commit()
+        self.partitions.add(month)
         logging.info(f"Заказ для пользователя с ID {user_id} на сумму {total} успешно создан с ID: {order_id}")
         return order_id
 
-    def get_order(self, order_id):
-        query = """SELECT * FROM Orders WHERE order_id = %s"""
+    @replica_read
+    def get_order(self, order_id, fields=None):
+        fields, query = self._select("Orders", "order_id", fields)
         self.cursor.execute(query, (order_id,))
         result = self.cursor.fetchone()
         if result:
             logging.info(f"Заказ с ID {order_id} найден: {result}")
         else:
             logging.info(f"Заказ с ID {order_id} не найден")
-        return result
+        return self._decode_one("Orders", fields, result)
 
     def update_order(self, order_id, user_id=None, order_date=None, total=None):
+        # Новая дата может относиться к другому месяцу: строка переносится в его секцию
         query = """UPDATE Orders SET user_id = COALESCE(%s, user_id), order_date = COALESCE(%s, order_date), total = COALESCE(%s, total) WHERE order_id = %s"""
-        self.cursor.execute(query, (user_id, order_date, total, order_id))
-        self.connection.commit()
+        params = (user_id, order_date, total, order_id)
+        if order_date is not None:
+            month = self._execute_in_partition(order_date, query, params)
+        else:
+            month = None
+            self.cursor.execute(query, params)
+        self._commit()
+        if month is not None:
+            self.partitions.add(month)
         logging.info(f"Данные заказа с ID {order_id} обновлены")
 
     def delete_order(self, order_id):
         query = """DELETE FROM Orders WHERE order_id = %s"""
         self.cursor.execute(query, (order_id,))
-        self.connection.commit()
+        self._commit()
         logging.info(f"Заказ с ID {order_id} удалён")
 
     def create_product(self, name, price, category_id):
         query = """INSERT INTO Products (name, price, category_id) VALUES (%s, %s, %s) RETURNING product_id"""
         self.cursor.execute(query, (name, price, category_id))
         product_id = self.cursor.fetchone()[0]
-        self.connection.commit()
+        self._commit()
         logging.info(f"Продукт {name} с ценой {price} успешно создан с ID: {product_id}")
         return product_id
 
-    def get_product(self, product_id):
-        query = """SELECT * FROM Products WHERE product_id = %s"""
+    @replica_read
+    def get_product(self, product_id, fields=None):
+        fields, query = self._select("Products", "product_id", fields)
         self.cursor.execute(query, (product_id,))
         result = self.cursor.fetchone()
         if result:
             logging.info(f"Продукт с ID {product_id} найден: {result}")
         else:
             logging.info(f"Продукт с ID {product_id} не найден")
-        return result
+        return self._decode_one("Products", fields, result)
 
     def update_product(self, product_id, name=None, price=None, category_id=None):
         query = """UPDATE Products SET name = COALESCE(%s, name), price = COALESCE(%s, price), category_id = COALESCE(%s, category_id) WHERE product_id = %s"""
         self.cursor.execute(query, (name, price, category_id, product_id))
-        self.connection.commit()
+        self._commit()
         logging.info(f"Данные продукта с ID {product_id} обновлены")
 
     def delete_product(self, product_id):
         query = """DELETE FROM Products WHERE product_id = %s"""
         self.cursor.execute(query, (product_id,))
-        self.connection.commit()
+        self._commit()
         logging.info(f"Продукт с ID {product_id} удалён")
 
     def create_category(self, category_name):
         query = """INSERT INTO Categories (category_name) VALUES (%s) RETURNING category_id"""
         self.cursor.execute(query, (category_name,))
         category_id = self.cursor.fetchone()[0]
-        self.connection.commit()
+        self._commit()
         logging.info(f"Категория {category_name} успешно создана с ID: {category_id}")
         return category_id
 
-    def get_category(self, category_id):
-        query = """SELECT * FROM Categories WHERE category_id = %s"""
+    @replica_read
+    def get_category(self, category_id, fields=None):
+        fields, query = self._select("Categories", "category_id", fields)
         self.cursor.execute(query, (category_id,))
         result = self.cursor.fetchone()
         if result:
             logging.info(f"Категория с ID {category_id} найдена: {result}")
         else:
             logging.info(f"Категория с ID {category_id} не найдена")
-        return result
+        return self._decode_one("Categories", fields, result)
 
     def update_category(self, category_id, category_name):
         query = """UPDATE Categories SET category_name = %s WHERE category_id = %s"""
         self.cursor.execute(query, (category_name, category_id))
-        self.connection.commit()
+        self._commit()
         logging.info(f"Категория с ID {category_id} обновлена")
 
     def delete_category(self, category_id):
         query = """DELETE FROM Categories WHERE category_id = %s"""
         self.cursor.execute(query, (category_id,))
-        self.connection.commit()
+        self._commit()
         logging.info(f"Категория с ID {category_id} удалена")
 
     def create_order_item(self, order_id, product_id, quantity):
         query = """INSERT INTO Order_Items (order_id, product_id, quantity) VALUES (%s, %s, %s)"""
         self.cursor.execute(query, (order_id, product_id, quantity))
-        self.connection.commit()
+        self._commit()
         logging.info(f"Товар с ID {product_id} добавлен в заказ с ID {order_id} в количестве {quantity}")
 
-    def get_order_items(self, order_id):
-        query = """SELECT * FROM Order_Items WHERE order_id = %s"""
+    @replica_read
+    def get_order_items(self, order_id, fields=None):
+        fields, query = self._select("Order_Items", "order_id", fields)
         self.cursor.execute(query, (order_id,))
         result = self.cursor.fetchall()
         logging.info(f"Товары для заказа с ID {order_id}: {result}")
-        return result
+        return self._decode_all("Order_Items", fields, result)
 
     def delete_order_item(self, order_id, product_id):
         query = """DELETE FROM Order_Items WHERE order_id = %s AND product_id = %s"""
         self.cursor.execute(query, (order_id, product_id))
-        self.connection.commit()
+        self._commit()
         logging.info(f"Товар с ID {product_id} удалён из заказа с ID {order_id}")
 
-    def get_orders_by_user_id(self, user_id):
-        query = """SELECT * FROM Orders WHERE user_id = %s"""
+    @replica_read
+    def get_orders_by_user_id(self, user_id, fields=None):
+        fields, query = self._select("Orders", "user_id", fields)
         self.cursor.execute(query, (user_id,))
         result = self.cursor.fetchall()
         logging.info(f"Заказы пользователя с ID {user_id}: {result}")
-        return result
+        return self._decode_all("Orders", fields, result)
+
+    @replica_read
+    def get_orders_by_user_in_range(self, user_id, start_date, end_date, fields=None):
+        # Границы включаются; условие на order_date отсекает секции вне диапазона (partition pruning)
+        start_date, end_date = date_bounds(start_date, end_date)
+        fields, columns = self._columns("Orders", fields)
+        query = sql.SQL("""
+        SELECT {} FROM Orders
+        WHERE user_id = %s AND order_date BETWEEN %s AND %s
+        ORDER BY order_date, order_id
+        """).format(columns)
+        self.cursor.execute(query, (user_id, start_date, end_date))
+        result = self.cursor.fetchall()
+        logging.info(f"Заказы пользователя с ID {user_id} с {start_date} по {end_date}: {result}")
+        return self._decode_all("Orders", fields, result)
+
+    @replica_read
+    def get_orders_in_range(self, start_date, end_date, fields=None):
+        start_date, end_date = date_bounds(start_date, end_date)
+        fields, columns = self._columns("Orders", fields)
+        query = sql.SQL("""
+        SELECT {} FROM Orders
+        WHERE order_date BETWEEN %s AND %s
+        ORDER BY order_date, order_id
+        """).format(columns)
+        self.cursor.execute(query, (start_date, end_date))
+        result = self.cursor.fetchall()
+        logging.info(f"Заказы с {start_date} по {end_date}: {len(result)}")
+        return self._decode_all("Orders", fields, result)
 
-    def get_products_by_user_id(self, user_id):
+    @replica_read
+    def get_daily_revenue(self, start_date, end_date):
+        # Список (order_date, выручка) по дням с заказами, по возрастанию даты; без raw — (ISO-строка, float)
+        start_date, end_date = date_bounds(start_date, end_date)
         query = """
-        SELECT DISTINCT p.product_id, p.name, p.price
+        SELECT order_date, SUM(total) FROM Orders
+        WHERE order_date BETWEEN %s AND %s
+        GROUP BY order_date
+        ORDER BY order_date
+        """
+        self.cursor.execute(query, (start_date, end_date))
+        result = self.cursor.fetchall()
+        logging.info(f"Выручка по дням с {start_date} по {end_date}: {result}")
+        return result if self.raw else [(day.isoformat(), float(revenue)) for day, revenue in result]
+
+    def detach_orders_partitions(self, before):
+        # Секции месяцев раньше before переименовываются в archived_orders_YYYY_MM (см. clients/pg_partitions.py).
+        # Позиции отключённых заказов остаются в Order_Items
+        return detach_orders_partitions(self, before)
+
+    def truncate_all(self):
+        # Очистка всех таблиц одной командой (секции Orders очищаются вместе с ней) и сброс последовательностей ID
+        self.cursor.execute(sql.SQL("TRUNCATE {} RESTART IDENTITY CASCADE").format(
+            sql.SQL(", ").join(sql.Identifier(table.lower()) for table in COLUMNS)))
+        self._commit()
+        logging.info("Все таблицы PostgreSQL очищены")
+
+    @replica_read
+    def get_products_by_user_id(self, user_id, fields=None):
+        fields, columns = self._columns("Products", fields, alias="p", default=("product_id", "name", "price"))
+        query = sql.SQL("""
+        SELECT DISTINCT {}
         FROM Products p
         JOIN Order_Items oi ON p.product_id = oi.product_id
         JOIN Orders o ON oi.order_id = o.order_id
         WHERE o.user_id = %s
-        """
+        """).format(columns)
         self.cursor.execute(query, (user_id,))
         result = self.cursor.fetchall()
         logging.info(f"Продукты, купленные пользователем с ID {user_id}: {result}")
-        return result
+        return self._decode_all("Products", fields, result)
 
-    def get_users_with_similar_purchases(self, user_id):
+    @replica_read
+    def get_users_with_similar_purchases(self, user_id, fields=None):
         query = """
         SELECT DISTINCT p.product_id
         FROM Products p
@@ -190,21 +356,58 @@ class PostgreSQLClient:
             logging.info("Пользователь не сделал покупок")
             return []
 
-        query = """
-        SELECT DISTINCT u.user_id, u.name
+        fields, columns = self._columns("Users", fields, alias="u", default=("user_id", "name"))
+        query = sql.SQL("""
+        SELECT DISTINCT {}
         FROM Users u
         JOIN Orders o ON u.user_id = o.user_id
         JOIN Order_Items oi ON o.order_id = oi.order_id
         WHERE oi.product_id IN %s AND u.user_id != %s
-        """
+        """).format(columns)
         self.cursor.execute(query, (tuple(purchased_products), user_id))
         result = self.cursor.fetchall()
         logging.info(f"Пользователи с похожими покупками: {result}")
-        return result
+        return self._decode_all("Users", fields, result)
 
-    def get_products_by_category_id(self, category_id):
-        query = """SELECT * FROM Products WHERE category_id = %s"""
+    @replica_read
+    def get_products_by_category_id(self, category_id, fields=None):
+        fields, query = self._select("Products", "category_id", fields)
         self.cursor.execute(query, (category_id,))
         result = self.cursor.fetchall()
         logging.info(f"Продукты в категории с ID {category_id}: {result}")
-        return result
+        return self._decode_all("Products", fields, result)
+
+    def _stream(self, query, batch_size):
+        # Именованный (серверный) курсор отдаёт строки пачками, не загружая всю выборку в память.
+        # Имя уникально для каждой выгрузки, чтобы несколько iter_* могли читаться одновременно; фиксация
+        # транзакции закрывает все серверные курсоры, поэтому она откладывается до завершения последней выгрузки
+        self.streams += 1
+        try:
+            with self.connection.cursor(name=f"export_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query)
+                yield from cursor
+        finally:
+            self.streams -= 1
+        if not self.streams:
+            self.connection.commit()
+
+    def iter_purchase_pairs(self, batch_size=10000):
+        query = """
+        SELECT DISTINCT o.user_id, oi.product_id
+        FROM Orders o
+        JOIN Order_Items oi ON oi.order_id = o.order_id
+        """
+        return self._stream(query, batch_size)
+
+    def iter_orders(self, batch_size=10000):
+        query = """SELECT order_id, user_id, order_date, total FROM Orders"""
+        return self._stream(query, batch_size)
+
+    def iter_order_items(self, batch_size=10000):
+        query = """SELECT order_id, product_id, quantity FROM Order_Items"""
+        return self._stream(query, batch_size)
+
+    def iter_products(self, batch_size=10000):
+        query = """SELECT product_id, name, price, category_id FROM Products"""
+        return self._stream(query, batch_size)
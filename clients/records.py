@@ -0,0 +1,142 @@
+# Общие типизированные записи, в которые клиенты декодируют ответы драйверов.
+# Порядок полей совпадает с порядком колонок таблиц PostgreSQL, поэтому запись
+# поддерживает как обращение по имени (record.name, record["name"]), так и по позиции (record[0]).
+# Клиент, созданный с raw=True, пропускает декодирование и возвращает объекты драйвера как есть.
+import datetime
+
+
+class Record:
+    __slots__ = ()
+    _floats = ()
+    _ints = ()
+    _dates = ()
+
+    def __init__(self, *args, **kwargs):
+        slots = self.__slots__
+        if len(args) > len(slots):
+            raise TypeError(f"{type(self).__name__} принимает не более {len(slots)} полей")
+        for slot, value in zip(slots, args):
+            object.__setattr__(self, slot, value)
+        for slot in slots[len(args):]:
+            object.__setattr__(self, slot, kwargs.pop(slot, None))
+        if kwargs:
+            raise TypeError(f"Неизвестные поля {type(self).__name__}: {', '.join(kwargs)}")
+        self._convert()
+
+    def _convert(self):
+        # Драйверы возвращают цены как Decimal или строки (Redis), а даты — как date или строки.
+        # Приводим их к float/int и ISO-строке, чтобы результаты разных баз были сравнимы.
+        for slot in self._floats:
+            value = getattr(self, slot)
+            if value is not None and type(value) is not float:
+                object.__setattr__(self, slot, float(value))
+        for slot in self._ints:
+            value = getattr(self, slot)
+            if value is not None and type(value) is not int:
+                object.__setattr__(self, slot, int(value))
+        for slot in self._dates:
+            value = getattr(self, slot)
+            if value is not None and not isinstance(value, str):
+                object.__setattr__(self, slot, value.isoformat() if isinstance(value, datetime.date) else str(value))
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return getattr(self, self.__slots__[key])
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __iter__(self):
+        return (getattr(self, slot) for slot in self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        fields = ", ".join(f"{slot}={getattr(self, slot)!r}" for slot in self.__slots__ if getattr(self, slot) is not None)
+        return f"{type(self).__name__}({fields})"
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class User(Record):
+    __slots__ = ("user_id", "name", "email", "registration_date")
+    _dates = ("registration_date",)
+
+
+class Category(Record):
+    __slots__ = ("category_id", "category_name")
+
+
+class Product(Record):
+    __slots__ = ("product_id", "name", "price", "category_id", "category_name")
+    _floats = ("price",)
+
+
+class OrderItem(Record):
+    __slots__ = ("order_id", "product_id", "quantity", "product_name", "price")
+    _floats = ("price",)
+    _ints = ("quantity",)
+
+
+class Order(Record):
+    __slots__ = ("order_id", "user_id", "order_date", "total", "items")
+    _floats = ("total",)
+    _dates = ("order_date",)
+
+
+def from_row(cls, row):
+    return None if row is None else cls(*row)
+
+
+def from_rows(cls, rows):
+    return [cls(*row) for row in rows]
+
+
+def from_fields(cls, fields, row):
+    return None if row is None else cls(**dict(zip(fields, row)))
+
+
+def from_fields_rows(cls, fields, rows):
+    return [cls(**dict(zip(fields, row))) for row in rows]
+
+
+def check_fields(cls, fields):
+    unknown = [field for field in fields if field not in cls.__slots__]
+    if unknown:
+        raise ValueError(f"Неизвестные поля {cls.__name__}: {', '.join(unknown)}")
+    return tuple(fields)
+
+
+def from_mapping(cls, mapping, aliases=None, **fields):
+    if mapping is None:
+        return None
+    aliases = aliases or {}
+    for slot in cls.__slots__:
+        if slot not in fields:
+            fields[slot] = mapping.get(aliases.get(slot, slot))
+    return cls(**fields)
+
+
+def from_mappings(cls, mappings, aliases=None):
+    return [from_mapping(cls, mapping, aliases) for mapping in mappings]
+
+
+def items_from_mappings(items, order_id=None):
+    return [from_mapping(OrderItem, item, order_id=order_id) for item in items]
@@ -8,50 +8,134 @@
 #
 # 2. Заказы
 # Ключи:
-# order:{order_id}: Хранит информацию о заказе в формате Hash. Поле items сериализуется в JSON для хранения состава заказа.
+# order:{order_id}: Хранит информацию о заказе в формате Hash. Поле items хранит состав заказа,
+# сериализованный кодеком клиента (JSON по умолчанию, msgpack или struct, см. clients/codecs.py).
 # user:{user_id}:orders: Множество (Set), содержащее все order_id пользователя.
+# Если при записи указана дата заказа, в хеше хранятся order_date и total, а order_id попадает в индексы по дате:
+# user:{user_id}:orders:by_date и orders:by_date — упорядоченные множества со score = номер дня (date.toordinal()),
+# по ним выбираются заказы за диапазон дат (ZRANGEBYSCORE).
 # Пример:
-# order:1 -> { "user_id": "1", "items": '[{"product_id": "1", "quantity": 1}]' }
+# order:1 -> { "user_id": "1", "items": '[{"product_id": "1", "quantity": 1}]', "order_date": "2024-12-20", "total": "250.0" }
 # user:1:orders -> {"1"}
+# user:1:orders:by_date -> {"1": 739240}
+# orders:by_date -> {"1": 739240}
 #
 # 3. Продукты
 # Ключи:
 # product:{product_id}: Хранит информацию о продукте в формате Hash.
 # category:{category_id}:products: Множество (Set), содержащее все product_id в указанной категории.
+# category:{category_id}:products:by_price: Упорядоченное множество (Sorted Set) product_id категории
+# со score = цена; позволяет выбирать диапазон цен и страницы через ZRANGEBYSCORE ... LIMIT.
+# category:{category_id}:products:by_popularity: Sorted Set product_id со score = число проданных единиц,
+# обновляется в create_order/delete_order.
 # Пример:
 # product:1 -> { "name": "Laptop", "price": "1200.00", "category_id": "1" }
 # category:1:products -> {"1"}
+# category:1:products:by_price -> {"1": 1200.0}
+# category:1:products:by_popularity -> {"1": 3}
+#
+# Шардированный режим (nodes=[...] или REDIS_NODES=host1:port1,host2:port2): ключи распределяются
+# по узлам консистентным хешированием с тегами, см. clients/redis_sharding.py.
 import logging
 import os
-import redis
-import json
+
+from clients.codecs import get_codec, decode_items
+from clients.date_range import date_bounds, day_number, iso_date
+from clients.redis_sharding import ShardedRedis
+from clients.instrumentation import instrumented
+from clients.lazy_import import lazy_import
+from clients.records import User, Product, Category, Order, from_mapping, items_from_mappings, check_fields
+from clients.tuning import tuning_for
+
+# ID сущности берётся из имени ключа, а не из полей хеша
+KEY_FIELDS = {User: "user_id", Product: "product_id", Category: "category_id", Order: "order_id"}
+CATEGORY_FIELDS = {"category_name": "name"}
+
+redis = lazy_import("redis")
 
 logger = logging.getLogger()
 logging.basicConfig(level=logging.INFO)
 
+@instrumented("redis")
 class RedisClient:
-    def __init__(self):
-        redis_host = os.getenv("REDIS_HOST", "localhost")  # значение по умолчанию
-        redis_port = int(os.getenv("REDIS_PORT", 6379))  # значение по умолчанию
+    def __init__(self, raw=False, codec=None, nodes=None, tuning=None):
+        self.raw = raw
+        self.tuning = tuning_for("redis", tuning)
+        self.codec = get_codec(codec or os.getenv("REDIS_ITEMS_CODEC", "json"))
         redis_db = int(os.getenv("REDIS_DB", 0))  # значение по умолчанию
+        nodes = nodes or os.getenv("REDIS_NODES")
+
+        if nodes:
+            self.client = ShardedRedis(nodes, db=redis_db, decode_responses=True, **self.tuning)
+            self.binary_client = ShardedRedis(nodes, db=redis_db, decode_responses=False, **self.tuning)
+            logger.info(f"Подключение к Redis установлено в шардированном режиме: {', '.join(self.client.clients)}.")
+            return
 
-        self.client = redis.StrictRedis(host=redis_host, port=redis_port, db=redis_db, decode_responses=True)
+        redis_host = os.getenv("REDIS_HOST", "localhost")  # значение по умолчанию
+        redis_port = int(os.getenv("REDIS_PORT", 6379))  # значение по умолчанию
+        self.client = redis.StrictRedis(host=redis_host, port=redis_port, db=redis_db, decode_responses=True, **self.tuning)
+        # Поле items может быть бинарным, поэтому заказы читаются соединением без декодирования ответов
+        self.binary_client = redis.StrictRedis(host=redis_host, port=redis_port, db=redis_db, decode_responses=False, **self.tuning)
         logger.info(f"Подключение к Redis установлено на {redis_host}:{redis_port}.")
 
+    def truncate_all(self):
+        # FLUSHDB очищает только базу REDIS_DB; в шардированном режиме — на всех узлах
+        self.client.flushdb()
+        logger.info("База Redis очищена")
+
+    def _read_hashes(self, keys, cls, fields=None, aliases=None):
+        # Без fields читается весь хеш (HGETALL), иначе только запрошенные поля (HMGET).
+        # Все ключи читаются одним конвейером; в шардированном режиме — параллельно по узлам.
+        if fields:
+            check_fields(cls, fields)
+            aliases = aliases or {}
+            hash_fields = [aliases.get(field, field) for field in fields if field != KEY_FIELDS[cls]]
+        pipeline = self.client.pipeline(transaction=False)
+        for key in keys:
+            if not fields:
+                pipeline.hgetall(key)
+            elif hash_fields:
+                pipeline.hmget(key, hash_fields)
+            else:
+                pipeline.exists(key)
+        results = []
+        for key, value in zip(keys, pipeline.execute()):
+            if not fields:
+                results.append(value)
+            elif hash_fields:
+                results.append({field: item for field, item in zip(hash_fields, value) if item is not None})
+            else:
+                results.append({KEY_FIELDS[cls]: key.split(":", 1)[1]} if value else {})
+        return results
+
+    def _read_hash(self, key, cls, fields=None, aliases=None):
+        return self._read_hashes([key], cls, fields, aliases)[0]
+
+    def _write_hash(self, key, mapping):
+        # Поля со значением None (NULL в источнике, например при CDC) удаляются из хеша: redis-py не записывает None
+        values = {field: value for field, value in mapping.items() if value is not None}
+        missing = [field for field, value in mapping.items() if value is None]
+        if values:
+            self.client.hset(key, mapping=values)
+        if missing:
+            self.client.hdel(key, *missing)
+
     def create_user(self, user_id, name, email):
         user_key = f"user:{user_id}"
-        self.client.hset(user_key, mapping={"name": name, "email": email})
+        self._write_hash(user_key, {"name": name, "email": email})
         self.client.sadd("users", user_id)
         logger.info(f"Пользователь с ID {user_id} ({name}, {email}) успешно создан в Redis.")
 
-    def get_user(self, user_id):
+    def get_user(self, user_id, fields=None):
         user_key = f"user:{user_id}"
-        user_data = self.client.hgetall(user_key)
+        user_data = self._read_hash(user_key, User, fields)
         if user_data:
             logger.info(f"Пользователь с ID {user_id} найден в Redis: {user_data}")
         else:
             logger.info(f"Пользователь с ID {user_id} не найден в Redis.")
-        return user_data
+        if self.raw or not user_data:
+            return user_data
+        return from_mapping(User, user_data, user_id=user_id)
 
     def delete_user(self, user_id):
         user_key = f"user:{user_id}"
@@ -59,105 +143,300 @@ class RedisClient:
         self.client.srem("users", user_id)
         logger.info(f"Пользователь с ID {user_id} удалён из Redis.")
 
-    def create_order(self, order_id, user_id, items):
+    def create_order(self, order_id, user_id, items, order_date=None, total=None):
         order_key = f"order:{order_id}"
-        self.client.hset(order_key, mapping={"user_id": user_id, "items": json.dumps(items)})
+        # Повторная запись того же заказа не должна повторно увеличивать популярность товаров,
+        # поэтому счётчики меняются на разницу между новым и прежним составом заказа
+        previous_items = self._read_order_items(order_id)
+        order_data = {"user_id": user_id, "items": self.codec.encode(items)}
+        if order_date is not None:
+            order_data["order_date"] = iso_date(order_date)
+        if total is not None:
+            order_data["total"] = total
+        self.client.hset(order_key, mapping=order_data)
         self.client.sadd(f"user:{user_id}:orders", order_id)
+        if order_date is not None:
+            score = day_number(order_date)
+            self.client.zadd(f"user:{user_id}:orders:by_date", {order_id: score})
+            self.client.zadd("orders:by_date", {order_id: score})
+        self._update_popularity(items, previous_items)
         logger.info(f"Заказ с ID {order_id} для пользователя {user_id} добавлен в Redis.")
 
-    def get_orders_by_user_id(self, user_id):
-        order_ids = self.client.smembers(f"user:{user_id}:orders")
-        orders = []
+    def _read_order_items(self, order_id):
+        return decode_items(self.binary_client.hget(f"order:{order_id}", "items")) or []
+
+    def _update_popularity(self, items, previous_items=()):
+        deltas = {}
+        for item in items:
+            deltas[item["product_id"]] = deltas.get(item["product_id"], 0) + int(item.get("quantity") or 0)
+        for item in previous_items:
+            deltas[item["product_id"]] = deltas.get(item["product_id"], 0) - int(item.get("quantity") or 0)
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        product_ids = list(deltas)
+        pipeline = self.client.pipeline(transaction=False)
+        for product_id in product_ids:
+            pipeline.hget(f"product:{product_id}", "category_id")
+        updates = self.client.pipeline(transaction=False)
+        for product_id, category_id in zip(product_ids, pipeline.execute()):
+            if category_id is not None:
+                updates.zincrby(f"category:{category_id}:products:by_popularity", deltas[product_id], product_id)
+        updates.execute()
+
+    def _decode_order(self, order_id, order_data):
+        items = order_data.get("items")
+        return from_mapping(Order, order_data, order_id=order_id, items=None if items is None else items_from_mappings(items, order_id))
+
+    def _read_orders(self, order_ids, fields=None):
+        if fields:
+            check_fields(Order, fields)
+            hash_fields = [field for field in fields if field != "order_id"] or ["user_id"]
+        pipeline = self.binary_client.pipeline(transaction=False)
         for order_id in order_ids:
-            order_key = f"order:{order_id}"
-            order_data = self.client.hgetall(order_key)
+            if fields:
+                pipeline.hmget(f"order:{order_id}", hash_fields)
+            else:
+                pipeline.hgetall(f"order:{order_id}")
+        orders = []
+        for order_id, values in zip(order_ids, pipeline.execute()):
+            order_data = dict(zip(hash_fields, values)) if fields else {field.decode(): value for field, value in values.items()}
+            order_data = {field: decode_items(value) if field == "items" else value.decode()
+                          for field, value in order_data.items() if value is not None}
             if order_data:
-                order_data["items"] = json.loads(order_data["items"])
-                orders.append(order_data)
+                orders.append((order_id, order_data))
+        return orders
+
+    def get_orders_by_user_id(self, user_id, fields=None):
+        order_ids = list(self.client.smembers(f"user:{user_id}:orders"))
+        orders = []
+        for order_id, order_data in self._read_orders(order_ids, fields):
+            orders.append(order_data if self.raw else self._decode_order(order_id, order_data))
         logger.info(f"Получены заказы для пользователя с ID {user_id} из Redis: {orders}")
         return orders
 
     def delete_order(self, order_id):
         order_key = f"order:{order_id}"
-        order_data = self.client.hgetall(order_key)
-        if order_data:
-            user_id = order_data["user_id"]
+        user_id = self.client.hget(order_key, "user_id")
+        if user_id is not None:
             self.client.srem(f"user:{user_id}:orders", order_id)
+            self.client.zrem(f"user:{user_id}:orders:by_date", order_id)
+            self._update_popularity((), self._read_order_items(order_id))
+        self.client.zrem("orders:by_date", order_id)
         self.client.delete(order_key)
         logger.info(f"Заказ с ID {order_id} удалён из Redis.")
 
+    def upsert_order(self, order_id, user_id, items, order_date=None, total=None):
+        # Идемпотентная запись заказа (используется CDC): повторное применение того же состояния ничего не меняет,
+        # а при смене владельца заказ переносится из множества заказов прежнего пользователя
+        previous_user_id = self.client.hget(f"order:{order_id}", "user_id")
+        if previous_user_id is not None and previous_user_id != str(user_id):
+            self.client.srem(f"user:{previous_user_id}:orders", order_id)
+            self.client.zrem(f"user:{previous_user_id}:orders:by_date", order_id)
+        self.create_order(order_id, user_id, items, order_date, total)
+
+    def _orders_by_date(self, index_key, start_date, end_date, fields=None):
+        start_date, end_date = date_bounds(start_date, end_date)
+        order_ids = self.client.zrangebyscore(index_key, day_number(start_date), day_number(end_date))
+        return [order_data if self.raw else self._decode_order(order_id, order_data)
+                for order_id, order_data in self._read_orders(order_ids, fields)]
+
+    def get_orders_by_user_in_range(self, user_id, start_date, end_date, fields=None):
+        # Заказы по возрастанию даты; заказы, записанные без order_date, в индекс не попадают
+        orders = self._orders_by_date(f"user:{user_id}:orders:by_date", start_date, end_date, fields)
+        logger.info(f"Получены заказы пользователя с ID {user_id} с {start_date} по {end_date} из Redis: {orders}")
+        return orders
+
+    def get_orders_in_range(self, start_date, end_date, fields=None):
+        orders = self._orders_by_date("orders:by_date", start_date, end_date, fields)
+        logger.info(f"Получены заказы с {start_date} по {end_date} из Redis: {len(orders)}")
+        return orders
+
+    def get_daily_revenue(self, start_date, end_date):
+        # Суммы считаются на клиенте по хешам заказов из индекса orders:by_date (один конвейер HMGET)
+        start_date, end_date = date_bounds(start_date, end_date)
+        order_ids = self.client.zrangebyscore("orders:by_date", day_number(start_date), day_number(end_date))
+        revenue = {}
+        for _, order_data in self._read_orders(order_ids, fields=["order_date", "total"]):
+            day = order_data["order_date"]
+            revenue[day] = revenue.get(day, 0.0) + float(order_data.get("total") or 0)
+        result = sorted(revenue.items())
+        logger.info(f"Выручка по дням с {start_date} по {end_date} из Redis: {result}")
+        return result
+
     def create_product(self, product_id, name, price, category_id):
         product_key = f"product:{product_id}"
-        self.client.hset(product_key, mapping={"name": name, "price": price, "category_id": category_id})
-        self.client.sadd(f"category:{category_id}:products", product_id)
+        previous_category_id = self.client.hget(product_key, "category_id")
+        popularity = 0
+        if previous_category_id is not None and previous_category_id != str(category_id):
+            # Продукт переносится в другую категорию: убираем его из индексов прежней категории
+            popularity = self.client.zscore(f"category:{previous_category_id}:products:by_popularity", product_id) or 0
+            self._remove_from_category(product_id, previous_category_id)
+        self._write_hash(product_key, {"name": name, "price": price, "category_id": category_id})
+        # Продукт без категории не попадает в её индексы, продукт без цены — в индекс по цене
+        if category_id is not None:
+            self.client.sadd(f"category:{category_id}:products", product_id)
+            if price is None:
+                self.client.zrem(f"category:{category_id}:products:by_price", product_id)
+            else:
+                self.client.zadd(f"category:{category_id}:products:by_price", {product_id: float(price)})
+            if popularity:
+                self.client.zadd(f"category:{category_id}:products:by_popularity", {product_id: popularity})
         logger.info(f"Продукт с ID {product_id} ({name}, {price}) добавлен в Redis в категорию {category_id}.")
 
-    def get_products_by_category_id(self, category_id):
-        product_ids = self.client.smembers(f"category:{category_id}:products")
+    def _remove_from_category(self, product_id, category_id):
+        self.client.srem(f"category:{category_id}:products", product_id)
+        self.client.zrem(f"category:{category_id}:products:by_price", product_id)
+        self.client.zrem(f"category:{category_id}:products:by_popularity", product_id)
+
+    def _read_products(self, product_ids, fields=None):
         products = []
-        for product_id in product_ids:
-            product_key = f"product:{product_id}"
-            product_data = self.client.hgetall(product_key)
+        product_keys = [f"product:{product_id}" for product_id in product_ids]
+        for product_id, product_data in zip(product_ids, self._read_hashes(product_keys, Product, fields)):
             if product_data:
-                products.append(product_data)
+                products.append(product_data if self.raw else from_mapping(Product, product_data, product_id=product_id))
+        return products
+
+    def get_products_by_category_id(self, category_id, fields=None):
+        product_ids = list(self.client.smembers(f"category:{category_id}:products"))
+        products = self._read_products(product_ids, fields)
         logger.info(f"Получены продукты из категории {category_id} в Redis: {products}")
         return products
 
+    def get_products_by_price_range(self, category_id, min_price=None, max_price=None, offset=0, limit=None,
+                                    descending=False, fields=None):
+        # ZRANGEBYSCORE с LIMIT стоит O(log n + k): выбирается только запрошенная страница,
+        # а хеши найденных продуктов читаются одним конвейером
+        low = "-inf" if min_price is None else float(min_price)
+        high = "+inf" if max_price is None else float(max_price)
+        index_key = f"category:{category_id}:products:by_price"
+        # LIMIT offset -1 — все элементы после offset
+        if limit is not None:
+            start, num = offset, limit
+        else:
+            start, num = (offset, -1) if offset else (None, None)
+        if descending:
+            product_ids = self.client.zrevrangebyscore(index_key, high, low, start=start, num=num)
+        else:
+            product_ids = self.client.zrangebyscore(index_key, low, high, start=start, num=num)
+        products = self._read_products(product_ids, fields)
+        logger.info(f"Получены продукты категории {category_id} в диапазоне цен [{low}, {high}] из Redis: {products}")
+        return products
+
+    def get_top_products_by_category(self, category_id, limit=10, fields=None):
+        if limit <= 0:
+            # ZREVRANGE 0 -1 вернул бы всю категорию
+            return []
+        product_ids = self.client.zrevrange(f"category:{category_id}:products:by_popularity", 0, limit - 1)
+        products = self._read_products(product_ids, fields)
+        logger.info(f"Получены самые продаваемые продукты категории {category_id} из Redis: {products}")
+        return products
+
+    def rebuild_category_indexes(self):
+        # Заполняет упорядоченные индексы для данных, записанных до их появления.
+        # Популярность пересчитывается целиком, поэтому повторный запуск не удваивает счётчики.
+        categories = {}
+        for product_id, _, price, category_id in self.iter_products():
+            if category_id is None:
+                continue
+            categories[product_id] = category_id
+            if price is not None:
+                self.client.zadd(f"category:{category_id}:products:by_price", {product_id: float(price)})
+        sold = {}
+        for _, product_id, quantity in self.iter_order_items():
+            sold[product_id] = sold.get(product_id, 0) + int(quantity or 0)
+        for category_id in set(categories.values()):
+            self.client.delete(f"category:{category_id}:products:by_popularity")
+        for product_id, quantity in sold.items():
+            if product_id in categories and quantity:
+                self.client.zadd(f"category:{categories[product_id]}:products:by_popularity", {product_id: quantity})
+        logger.info("Упорядоченные индексы категорий в Redis перестроены.")
+
     def delete_product(self, product_id):
         product_key = f"product:{product_id}"
         product_data = self.client.hgetall(product_key)
-        if product_data:
-            category_id = product_data["category_id"]
-            self.client.srem(f"category:{category_id}:products", product_id)
+        if product_data.get("category_id") is not None:
+            self._remove_from_category(product_id, product_data["category_id"])
         self.client.delete(product_key)
         logger.info(f"Продукт с ID {product_id} удалён из Redis.")
 
     def create_category(self, category_id, name):
         category_key = f"category:{category_id}"
-        self.client.hset(category_key, mapping={"name": name})
+        self._write_hash(category_key, {"name": name})
         logger.info(f"Категория с ID {category_id} ({name}) добавлена в Redis.")
 
-    def get_category(self, category_id):
+    def get_category(self, category_id, fields=None):
         category_key = f"category:{category_id}"
-        category_data = self.client.hgetall(category_key)
+        category_data = self._read_hash(category_key, Category, fields, CATEGORY_FIELDS)
         if category_data:
             logger.info(f"Категория с ID {category_id} найдена в Redis: {category_data}")
         else:
             logger.info(f"Категория с ID {category_id} не найдена в Redis.")
-        return category_data
+        if self.raw or not category_data:
+            return category_data
+        return from_mapping(Category, category_data, CATEGORY_FIELDS, category_id=category_id)
 
     def delete_category(self, category_id):
         category_key = f"category:{category_id}"
         self.client.delete(category_key)
         logger.info(f"Категория с ID {category_id} удалена из Redis.")
 
-    def get_purchased_products_by_user_id(self, user_id):
-        orders = self.get_orders_by_user_id(user_id)
+    def get_purchased_products_by_user_id(self, user_id, fields=None):
+        orders = self.get_orders_by_user_id(user_id, fields=["items"])
         product_ids = set()
         for order in orders:
             for item in order["items"]:
                 product_ids.add(item["product_id"])
         products = []
-        for product_id in product_ids:
-            product_key = f"product:{product_id}"
-            product_data = self.client.hgetall(product_key)
+        product_ids = list(product_ids)
+        product_keys = [f"product:{product_id}" for product_id in product_ids]
+        for product_id, product_data in zip(product_ids, self._read_hashes(product_keys, Product, fields)):
             if product_data:
                 product_data["product_id"] = product_id  # Добавляем product_id в данные
-                products.append(product_data)
+                products.append(product_data if self.raw else from_mapping(Product, product_data))
         logger.info(f"Получены продукты, купленные пользователем с ID {user_id}: {products}")
         return products
 
-    def get_users_with_similar_purchases(self, user_id):
-        user_products = {item["product_id"] for item in self.get_purchased_products_by_user_id(user_id)}
+    def get_users_with_similar_purchases(self, user_id, fields=None):
+        user_products = {item["product_id"] for item in self.get_purchased_products_by_user_id(user_id, fields=["product_id"])}
         all_users = self.client.smembers("users")
         similar_users = []
         for other_user_id in all_users:
             if other_user_id == user_id:
                 continue
 
-            other_user_products = {item["product_id"] for item in self.get_purchased_products_by_user_id(other_user_id)}
+            other_user_products = {item["product_id"] for item in self.get_purchased_products_by_user_id(other_user_id, fields=["product_id"])}
             if user_products & other_user_products:
-                similar_users.append(self.get_user(other_user_id))
+                similar_users.append(self.get_user(other_user_id, fields))
 
         logger.info(f"Найдено пользователей с похожими покупками для пользователя с ID {user_id}: {similar_users}")
         return similar_users
+
+    def iter_purchase_pairs(self):
+        for user_id in self.client.smembers("users"):
+            for order in self.get_orders_by_user_id(user_id):
+                for item in order["items"]:
+                    yield user_id, item["product_id"]
+
+    def iter_orders(self):
+        for user_id in self.client.smembers("users"):
+            order_ids = list(self.client.smembers(f"user:{user_id}:orders"))
+            for order_id, order_data in self._read_orders(order_ids, fields=["user_id", "order_date", "total"]):
+                total = order_data.get("total")
+                yield order_id, user_id, order_data.get("order_date"), None if total is None else float(total)
+
+    def iter_order_items(self):
+        for user_id in self.client.smembers("users"):
+            order_ids = list(self.client.smembers(f"user:{user_id}:orders"))
+            for order_id, order_data in self._read_orders(order_ids, fields=["items"]):
+                for item in order_data.get("items") or []:
+                    yield order_id, item["product_id"], item.get("quantity")
+
+    def iter_products(self):
+        # Отдельного множества всех продуктов нет, поэтому ключи product:{product_id} перебираются через SCAN
+        for product_key in self.client.scan_iter(match="product:*"):
+            if product_key.count(":") != 1:
+                continue
+            product_data = self.client.hgetall(product_key)
+            if product_data:
+                yield product_key.split(":", 1)[1], product_data.get("name"), product_data.get("price"), product_data.get("category_id")
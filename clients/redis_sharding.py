@@ -0,0 +1,166 @@
+# Шардирование ключей RedisClient по нескольким независимым инстансам Redis.
+# Узел для ключа выбирается консистентным хешированием (кольцо с виртуальными узлами),
+# поэтому при добавлении узла переезжает только ~1/N ключей.
+#
+# Хеш считается не от всего ключа, а от его тега:
+# - если в ключе есть {тег} (соглашение Redis Cluster), используется содержимое скобок;
+# - иначе для ключей сущностей берутся первые два сегмента: user:1:orders -> user:1,
+#   category:5:products -> category:5. Так множество заказов пользователя лежит на том же узле,
+#   что и сам пользователь, без изменения схемы ключей.
+import bisect
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from clients.lazy_import import lazy_import
+
+redis = lazy_import("redis")
+
+ENTITY_PREFIXES = ("user", "order", "product", "category")
+SINGLE_KEY_COMMANDS = (
+    "get", "set", "exists", "expire", "type",
+    "hset", "hget", "hgetall", "hmget", "hdel", "hincrby",
+    "sadd", "srem", "smembers", "scard", "sismember",
+    "zadd", "zrem", "zincrby", "zscore", "zcard", "zrange", "zrevrange", "zrangebyscore", "zrevrangebyscore",
+    "memory_usage", "dump", "pttl", "restore",
+)
+
+
+def routing_key(key):
+    start = key.find("{")
+    if start != -1:
+        end = key.find("}", start + 1)
+        if end > start + 1:
+            return key[start + 1:end]
+    parts = key.split(":", 2)
+    if len(parts) >= 2 and parts[0] in ENTITY_PREFIXES:
+        return f"{parts[0]}:{parts[1]}"
+    return key
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=160):
+        points = sorted((_hash(f"{node}#{replica}"), node) for node in nodes for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        position = bisect.bisect(self._hashes, _hash(routing_key(key))) % len(self._hashes)
+        return self._nodes[position]
+
+
+def parse_nodes(nodes):
+    if isinstance(nodes, str):
+        nodes = [node.strip() for node in nodes.split(",") if node.strip()]
+    parsed = []
+    for node in nodes:
+        if isinstance(node, str):
+            host, _, port = node.rpartition(":")
+        else:
+            host, port = node
+        parsed.append((host or "localhost", int(port)))
+    return parsed
+
+
+class ShardedRedis:
+    """Подмножество API redis.StrictRedis, распределяющее ключи по узлам."""
+
+    def __init__(self, nodes, db=0, decode_responses=True, max_workers=None, **connection_kwargs):
+        self.clients = {
+            f"{host}:{port}": redis.StrictRedis(host=host, port=port, db=db, decode_responses=decode_responses, **connection_kwargs)
+            for host, port in parse_nodes(nodes)
+        }
+        if not self.clients:
+            raise ValueError("Для шардированного режима нужен хотя бы один узел Redis")
+        self.ring = HashRing(list(self.clients))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or len(self.clients))
+
+    def node_for(self, key):
+        return self.ring.node_for(key)
+
+    def client_for(self, key):
+        return self.clients[self.node_for(key)]
+
+    def _on_all_nodes(self, call):
+        return list(self.executor.map(call, self.clients.values()))
+
+    def delete(self, *keys):
+        by_node = {}
+        for key in keys:
+            by_node.setdefault(self.node_for(key), []).append(key)
+        return sum(self.executor.map(lambda node: self.clients[node].delete(*by_node[node]), by_node))
+
+    def flushdb(self):
+        return all(self._on_all_nodes(lambda client: client.flushdb()))
+
+    def ping(self):
+        return all(self._on_all_nodes(lambda client: client.ping()))
+
+    def scan_iter(self, match=None, count=None):
+        for client in self.clients.values():
+            yield from client.scan_iter(match=match, count=count)
+
+    def pipeline(self, transaction=False):
+        if transaction:
+            raise ValueError("Транзакции между узлами не поддерживаются в шардированном режиме")
+        return ShardedPipeline(self)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        for client in self.clients.values():
+            client.close()
+
+
+def _forward(name):
+    def command(self, key, *args, **kwargs):
+        return getattr(self.client_for(key), name)(key, *args, **kwargs)
+    command.__name__ = name
+    return command
+
+
+for _name in SINGLE_KEY_COMMANDS:
+    setattr(ShardedRedis, _name, _forward(_name))
+
+
+class ShardedPipeline:
+    """Буферизует команды и выполняет их пачками на каждом узле параллельно (scatter-gather)."""
+
+    def __init__(self, sharded):
+        self.sharded = sharded
+        self.commands = []
+
+    def __getattr__(self, name):
+        if name not in SINGLE_KEY_COMMANDS:
+            raise AttributeError(name)
+
+        def command(key, *args, **kwargs):
+            self.commands.append((self.sharded.node_for(key), name, (key,) + args, kwargs))
+            return self
+        return command
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.commands = []
+
+    def execute(self):
+        by_node = {}
+        for position, (node, name, args, kwargs) in enumerate(self.commands):
+            by_node.setdefault(node, []).append((position, name, args, kwargs))
+
+        def run(node):
+            pipeline = self.sharded.clients[node].pipeline(transaction=False)
+            for _, name, args, kwargs in by_node[node]:
+                getattr(pipeline, name)(*args, **kwargs)
+            return node, pipeline.execute()
+
+        results = [None] * len(self.commands)
+        for node, values in self.sharded.executor.map(run, by_node):
+            for (position, *_), value in zip(by_node[node], values):
+                results[position] = value
+        self.commands = []
+        return results
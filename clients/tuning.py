@@ -0,0 +1,98 @@
+# Профили настройки драйверов: сжатие трафика, размеры пулов, fetch size, keepalive и таймауты.
+# Профили описаны в config/tuning.json (другой файл — DB_TUNING_FILE), профиль выбирается переменной
+# DB_TUNING_PROFILE (по умолчанию "default" — настройки драйверов по умолчанию) или параметром tuning
+# конструктора клиента: имя профиля либо словарь с готовыми настройками одного backend.
+# Профиль — словарь {backend: {параметр: значение}}; "extends" наследует другой профиль, настройки backend
+# объединяются по ключам. PostgreSQLBClient использует раздел postgresql.
+#
+# Значения передаются драйверам как есть, кроме специальных ключей:
+# - mongodb: compressors — список, пустой список отключает сжатие (нужны пакеты zstandard / python-snappy);
+# - cassandra: compression ("lz4", "snappy", true/false), fetch_size и request_timeout — настройки сессии,
+#   keepalive — SO_KEEPALIVE на сокетах; speculative_execution ({"delay": с, "max_attempts": N}) — если ответа
+#   на идемпотентный запрос нет через delay секунд, драйвер отправляет его ещё раз другой реплике (до N
+#   дополнительных раз) и берёт первый ответ; настройки запросов тогда задаются профилем выполнения
+#   по умолчанию, и request_timeout переходит в него. Остальное — параметры Cluster;
+# - neo4j: параметры GraphDatabase.driver, включая fetch_size по умолчанию для сессий;
+# - redis: параметры redis.StrictRedis (в шардированном режиме — каждого узла);
+# - postgresql: параметры libpq для psycopg2.connect (в том числе для реплик).
+# Neo4j и Redis не поддерживают сжатие на уровне протокола; для Redis размер заказов сокращают кодеки items.
+import copy
+import functools
+import json
+import logging
+import os
+import socket
+
+from clients.lazy_import import lazy_import
+
+cassandra_cluster = lazy_import("cassandra.cluster")
+cassandra_policies = lazy_import("cassandra.policies")
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+TUNING_PATH = os.path.join(os.path.dirname(__file__), "..", "config", "tuning.json")
+DEFAULT_PROFILE = "default"
+SECTIONS = {"postgresql_b": "postgresql"}
+CASSANDRA_SESSION_SETTINGS = {"fetch_size": "default_fetch_size", "request_timeout": "default_timeout"}
+CASSANDRA_REQUEST_TIMEOUT = 10.0
+
+
+@functools.lru_cache(maxsize=None)
+def _read_profiles(path):
+    with open(path, encoding="utf-8") as tuning_file:
+        return json.load(tuning_file)
+
+
+def load_profiles(path=None):
+    return copy.deepcopy(_read_profiles(path or os.getenv("DB_TUNING_FILE", TUNING_PATH)))
+
+
+def resolve_profile(profiles, name, seen=()):
+    if name not in profiles:
+        raise ValueError(f"Неизвестный профиль настройки {name}, допустимые: {', '.join(profiles)}")
+    if name in seen:
+        raise ValueError(f"Циклическое наследование профилей настройки: {' -> '.join(seen + (name,))}")
+    profile = dict(profiles[name])
+    parent = profile.pop("extends", None)
+    resolved = resolve_profile(profiles, parent, seen + (name,)) if parent else {}
+    for backend, settings in profile.items():
+        resolved[backend] = dict(resolved.get(backend, {}), **settings)
+    return resolved
+
+
+def tuning_for(backend, tuning=None):
+    # tuning: None — профиль из DB_TUNING_PROFILE, строка — имя профиля, словарь — настройки backend
+    if isinstance(tuning, dict):
+        return dict(tuning)
+    name = tuning or os.getenv("DB_TUNING_PROFILE", DEFAULT_PROFILE)
+    settings = resolve_profile(load_profiles(), name).get(SECTIONS.get(backend, backend), {})
+    if settings:
+        logger.info(f"Профиль настройки {name} для {backend}: {settings}")
+    return dict(settings)
+
+
+def mongo_options(settings):
+    options = dict(settings)
+    compressors = options.pop("compressors", None)
+    if compressors:
+        options["compressors"] = ",".join(compressors) if isinstance(compressors, (list, tuple)) else compressors
+    return options
+
+
+def cassandra_options(settings):
+    # Возвращает параметры Cluster и атрибуты сессии
+    options = dict(settings)
+    session_settings = {attribute: options.pop(key) for key, attribute in CASSANDRA_SESSION_SETTINGS.items() if key in options}
+    if options.pop("keepalive", False):
+        options["sockopts"] = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    speculative = options.pop("speculative_execution", None)
+    if speculative:
+        # С профилями выполнения атрибут сессии default_timeout недоступен, таймаут задаётся в профиле
+        policy = cassandra_policies.ConstantSpeculativeExecutionPolicy(float(speculative["delay"]),
+                                                                       int(speculative.get("max_attempts", 1)))
+        options["execution_profiles"] = {cassandra_cluster.EXEC_PROFILE_DEFAULT: cassandra_cluster.ExecutionProfile(
+            request_timeout=session_settings.pop("default_timeout", CASSANDRA_REQUEST_TIMEOUT),
+            speculative_execution_policy=policy,
+        )}
+    return options, session_settings
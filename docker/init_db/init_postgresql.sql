@@ -1,32 +0,0 @@
-CREATE TABLE IF NOT EXISTS Users (
-    user_id SERIAL PRIMARY KEY,
-    name VARCHAR(100),
-    email VARCHAR(100),
-    registration_date DATE
-);
-
-CREATE TABLE IF NOT EXISTS Orders (
-    order_id SERIAL PRIMARY KEY,
-    user_id INT REFERENCES Users(user_id) ON DELETE CASCADE,
-    order_date DATE,
-    total DECIMAL(10, 2)
-);
-
-CREATE TABLE IF NOT EXISTS Categories (
-    category_id SERIAL PRIMARY KEY,
-    category_name VARCHAR(100)
-);
-
-CREATE TABLE IF NOT EXISTS Products (
-    product_id SERIAL PRIMARY KEY,
-    name VARCHAR(100),
-    price DECIMAL(10, 2),
-    category_id INT REFERENCES Categories(category_id)
-);
-
-CREATE TABLE IF NOT EXISTS Order_Items (
-    order_id INT REFERENCES Orders(order_id) ON DELETE CASCADE,
-    product_id INT REFERENCES Products(product_id) ON DELETE CASCADE,
-    quantity INT,
-    PRIMARY KEY (order_id, product_id)
-);
@@ -0,0 +1,9 @@
+#!/bin/bash
+# Пользователь и правило pg_hba для потоковой репликации на postgres_replica (см. docker-compose.yml)
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+    CREATE ROLE replicator WITH REPLICATION LOGIN PASSWORD 'replicator';
+EOSQL
+
+echo "host replication replicator all md5" >> "$PGDATA/pg_hba.conf"
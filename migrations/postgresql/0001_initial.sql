@@ -0,0 +1,71 @@
+CREATE TABLE IF NOT EXISTS Users (
+    user_id SERIAL PRIMARY KEY,
+    name VARCHAR(100),
+    email VARCHAR(100),
+    registration_date DATE
+);
+
+-- Заказы секционированы по месяцам order_date: запросы по диапазону дат читают только нужные секции,
+-- а старые месяцы отключаются от таблицы (ALTER TABLE Orders DETACH PARTITION orders_YYYY_MM) без DELETE.
+-- Ключ секционирования обязан входить в первичный ключ, поэтому order_id уникален по последовательности,
+-- а ограничение — на паре (order_id, order_date). Секции создаёт ensure_orders_partition() перед записью.
+CREATE TABLE IF NOT EXISTS Orders (
+    order_id SERIAL,
+    user_id INT REFERENCES Users(user_id) ON DELETE CASCADE,
+    order_date DATE NOT NULL,
+    total DECIMAL(10, 2),
+    PRIMARY KEY (order_id, order_date)
+) PARTITION BY RANGE (order_date);
+
+CREATE INDEX IF NOT EXISTS orders_user_id_order_date_idx ON Orders (user_id, order_date);
+
+-- Создаёт секцию orders_YYYY_MM для месяца указанной даты, если её ещё нет; возвращает имя секции
+CREATE OR REPLACE FUNCTION ensure_orders_partition(day DATE) RETURNS TEXT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', day)::DATE;
+    partition_name TEXT := 'orders_' || to_char(day, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF Orders FOR VALUES FROM (%L) TO (%L)',
+                       partition_name, month_start, (month_start + INTERVAL '1 month')::DATE);
+    END IF;
+    RETURN partition_name;
+EXCEPTION WHEN duplicate_table THEN
+    -- Секцию одновременно создал другой сеанс
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE IF NOT EXISTS Categories (
+    category_id SERIAL PRIMARY KEY,
+    category_name VARCHAR(100)
+);
+
+CREATE TABLE IF NOT EXISTS Products (
+    product_id SERIAL PRIMARY KEY,
+    name VARCHAR(100),
+    price DECIMAL(10, 2),
+    category_id INT REFERENCES Categories(category_id)
+);
+
+-- Внешний ключ на секционированную таблицу должен включать ключ секционирования (order_date),
+-- поэтому позиции удаляются вместе с заказом триггером, а не ON DELETE CASCADE
+CREATE TABLE IF NOT EXISTS Order_Items (
+    order_id INT,
+    product_id INT REFERENCES Products(product_id) ON DELETE CASCADE,
+    quantity INT,
+    PRIMARY KEY (order_id, product_id)
+);
+
+CREATE OR REPLACE FUNCTION delete_order_items() RETURNS trigger AS $$
+BEGIN
+    -- При смене order_date строка переносится в другую секцию как DELETE + INSERT: позиции такого заказа остаются
+    DELETE FROM Order_Items WHERE order_id = OLD.order_id
+        AND NOT EXISTS (SELECT 1 FROM Orders WHERE order_id = OLD.order_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS orders_delete_items ON Orders;
+CREATE TRIGGER orders_delete_items AFTER DELETE ON Orders
+    FOR EACH ROW EXECUTE FUNCTION delete_order_items();
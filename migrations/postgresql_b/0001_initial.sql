@@ -0,0 +1,37 @@
+CREATE TABLE IF NOT EXISTS Users (
+    user_id SERIAL PRIMARY KEY,
+    data JSONB NOT NULL DEFAULT '{}' -- Пример: { "name": "John Doe", "email": "john.doe@example.com", "registration_date": "2025-01-01" }
+);
+
+-- order_date дублирует data->>'order_date' отдельной колонкой: это ключ секционирования по месяцам
+-- (см. migrations/postgresql/0001_initial.sql) и условие запросов по диапазону дат
+CREATE TABLE IF NOT EXISTS Orders (
+    order_id SERIAL,
+    user_id INT REFERENCES Users(user_id) ON DELETE CASCADE,
+    order_date DATE NOT NULL,
+    items JSONB NOT NULL DEFAULT '[]', -- Пример: [ { "product_id": 1, "quantity": 2 }, { "product_id": 3, "quantity": 1 } ]
+    data JSONB NOT NULL DEFAULT '{}', -- Пример: { "order_date": "2025-01-15", "total": 150.00 }
+    PRIMARY KEY (order_id, order_date)
+) PARTITION BY RANGE (order_date);
+
+CREATE INDEX IF NOT EXISTS orders_user_id_order_date_idx ON Orders (user_id, order_date);
+
+CREATE OR REPLACE FUNCTION ensure_orders_partition(day DATE) RETURNS TEXT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', day)::DATE;
+    partition_name TEXT := 'orders_' || to_char(day, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF Orders FOR VALUES FROM (%L) TO (%L)',
+                       partition_name, month_start, (month_start + INTERVAL '1 month')::DATE);
+    END IF;
+    RETURN partition_name;
+EXCEPTION WHEN duplicate_table THEN
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE IF NOT EXISTS Products (
+    product_id SERIAL PRIMARY KEY,
+    data JSONB NOT NULL DEFAULT '{}' -- Пример: { "name": "Smartphone", "price": 599.99, "category_name": "Electronics" }
+);
@@ -0,0 +1,45 @@
+-- Журнал изменений для CDC из PostgreSQL в Redis (clients/cdc.py).
+-- Триггеры пишут каждую изменённую строку в change_log в той же транзакции, что и само изменение,
+-- и отправляют NOTIFY change_log; потребитель забирает записи пачками через
+-- DELETE ... RETURNING с FOR UPDATE SKIP LOCKED. Скрипт можно выполнять повторно.
+CREATE TABLE IF NOT EXISTS change_log (
+    change_id BIGSERIAL PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    operation CHAR(1) NOT NULL, -- I, U или D
+    row_data JSONB NOT NULL, -- новая строка для I/U, удалённая для D
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+-- Имя таблицы передаётся аргументом триггера: для секционированной Orders TG_TABLE_NAME — имя секции
+CREATE OR REPLACE FUNCTION log_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO change_log (table_name, operation, row_data) VALUES (TG_ARGV[0], 'D', to_jsonb(OLD));
+    ELSE
+        INSERT INTO change_log (table_name, operation, row_data) VALUES (TG_ARGV[0], left(TG_OP, 1), to_jsonb(NEW));
+    END IF;
+    -- Одинаковые уведомления внутри транзакции схлопываются, поэтому на транзакцию уходит одно уведомление
+    PERFORM pg_notify('change_log', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_change_log ON Users;
+CREATE TRIGGER users_change_log AFTER INSERT OR UPDATE OR DELETE ON Users
+    FOR EACH ROW EXECUTE FUNCTION log_change('users');
+
+DROP TRIGGER IF EXISTS categories_change_log ON Categories;
+CREATE TRIGGER categories_change_log AFTER INSERT OR UPDATE OR DELETE ON Categories
+    FOR EACH ROW EXECUTE FUNCTION log_change('categories');
+
+DROP TRIGGER IF EXISTS products_change_log ON Products;
+CREATE TRIGGER products_change_log AFTER INSERT OR UPDATE OR DELETE ON Products
+    FOR EACH ROW EXECUTE FUNCTION log_change('products');
+
+DROP TRIGGER IF EXISTS orders_change_log ON Orders;
+CREATE TRIGGER orders_change_log AFTER INSERT OR UPDATE OR DELETE ON Orders
+    FOR EACH ROW EXECUTE FUNCTION log_change('orders');
+
+DROP TRIGGER IF EXISTS order_items_change_log ON Order_Items;
+CREATE TRIGGER order_items_change_log AFTER INSERT OR UPDATE OR DELETE ON Order_Items
+    FOR EACH ROW EXECUTE FUNCTION log_change('order_items');
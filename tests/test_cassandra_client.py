@@ -1,10 +1,11 @@
 import pytest
 import uuid
-from clients.cassandra_client import CassandraClient
+from clients.cassandra_client import CassandraClient, MAX_TOKEN, MIN_TOKEN, token_ranges
 
 @pytest.fixture(scope="module")
 def db_client():
     client = CassandraClient()
+    client.truncate_all()
     yield client
     client.close()
 
@@ -69,3 +70,81 @@ def test_get_products_by_category_id(db_client, setup_data):
     product_ids = [product.product_id for product in products]
     assert setup_data["product_id_1"] in product_ids
     assert setup_data["product_id_2"] in product_ids
+
+def test_orders_in_date_range(db_client):
+    user_id = db_client.create_user("Range User", "range@example.com", "2019-01-01")
+    db_client.create_order(user_id, "2019-03-05", 100.0)
+    db_client.create_order(user_id, "2019-03-05", 50.0)
+    db_client.create_order(user_id, "2019-04-20", 70.0)
+    db_client.create_order(user_id, "2019-06-01", 30.0)
+
+    orders = db_client.get_orders_by_user_in_range(user_id, "2019-03-01", "2019-04-30")
+    assert [order.order_date for order in orders] == ["2019-03-05", "2019-03-05", "2019-04-20"]
+
+    orders = db_client.get_orders_in_range("2019-04-20", "2019-06-01", fields=["order_id", "total"])
+    assert [order.total for order in orders] == [70.0, 30.0]
+
+    assert db_client.get_daily_revenue("2019-03-01", "2019-04-30") == [("2019-03-05", 150.0), ("2019-04-20", 70.0)]
+
+def test_paged_reads(db_client):
+    user_id = db_client.create_user("Paged User", "paged@example.com", "2024-12-20")
+    order_ids = {db_client.create_order(user_id, f"2024-12-{day:02d}", 10.0) for day in range(1, 8)}
+
+    pages, paging_state = [], None
+    while True:
+        page, paging_state = db_client.get_orders_by_user_id_page(user_id, page_size=3, paging_state=paging_state)
+        pages.append(page)
+        if paging_state is None:
+            break
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert {order.order_id for page in pages for order in page} == order_ids
+    assert {order.order_id for order in db_client.iter_orders_by_user_id(user_id)} == order_ids
+
+
+def test_bucketed_products_by_category():
+    client = CassandraClient(fetch_size=2, category_buckets=4)
+    category_id = uuid.uuid4()
+    product_ids = {uuid.uuid4() for _ in range(9)}
+    for product_id in product_ids:
+        client.add_product_to_category(category_id, product_id, "Bucketed Product", 10.0)
+
+    assert {product.product_id for product in client.get_products_by_category_id(category_id)} == product_ids
+    assert {product.product_id for product in client.iter_products_by_category_id(category_id)} == product_ids
+
+    # Pages continue across buckets until the last one is exhausted
+    seen, paging_state = [], None
+    while True:
+        page, paging_state = client.get_products_by_category_id_page(category_id, page_size=2, paging_state=paging_state)
+        assert len(page) <= 2
+        seen.extend(product.product_id for product in page)
+        if paging_state is None:
+            break
+    assert sorted(seen) == sorted(product_ids)
+    client.close()
+
+
+def test_token_ranges_cover_ring_without_overlap():
+    ranges = token_ranges(7)
+    assert ranges[0][0] == MIN_TOKEN and ranges[-1][1] == MAX_TOKEN
+    assert all(end + 1 == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+
+
+def test_counters_follow_order_writes(db_client):
+    user_id = db_client.create_user("Counter User", "counter@example.com", "2024-12-20")
+    category_id, product_id = uuid.uuid4(), uuid.uuid4()
+    db_client.add_product_to_category(category_id, product_id, "Counter Product", 12.5)
+
+    for _ in range(2):
+        order_id = db_client.create_order(user_id, "2024-12-20", 25.0)
+        db_client.create_order_item(order_id, product_id, "Counter Product", 12.5, 2, category_id=category_id)
+
+    assert db_client.get_user_spend(user_id) == {"user_id": user_id, "orders": 2, "spend": 50.0}
+    assert db_client.get_product_purchase_count(product_id) == {"product_id": product_id, "units": 4, "orders": 2}
+    assert db_client.get_category_sales(category_id) == {"category_id": category_id, "order_lines": 2, "units": 4,
+                                                         "revenue": 50.0}
+    assert db_client.get_user_spend(uuid.uuid4())["orders"] == 0
+
+    # A counter update applied twice (e.g. a retried write) is repaired by reconciliation
+    db_client.session.execute("UPDATE user_spend SET orders = orders + 1 WHERE user_id = %s", (user_id,))
+    assert db_client.reconcile_counters(splits=8, workers=4)["user_spend"] >= 1
+    assert db_client.get_user_spend(user_id)["orders"] == 2
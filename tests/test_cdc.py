@@ -0,0 +1,90 @@
+import pytest
+from clients.cdc import ChangeFeed
+from clients.postgresql_client import PostgreSQLClient
+from clients.redis_client import RedisClient
+
+
+@pytest.fixture
+def feed():
+    redis_client = RedisClient()
+    redis_client.truncate_all()
+    feed = ChangeFeed(redis_client, batch_size=3)
+    feed.install()
+    feed.drain()  # discard changes left by other tests
+    redis_client.truncate_all()
+    yield feed
+    feed.close()
+
+
+@pytest.fixture
+def db_client():
+    client = PostgreSQLClient()
+    yield client
+    client.connection.close()
+
+
+def test_changes_are_projected_into_redis(feed, db_client):
+    user_id = db_client.create_user("CDC User", "cdc@example.com", "2024-12-20")
+    category_id = db_client.create_category("CDC Category")
+    product_id = db_client.create_product("CDC Product", 100.0, category_id)
+    order_id = db_client.create_order(user_id, "2024-12-20", 200.0)
+    db_client.create_order_item(order_id, product_id, 2)
+
+    # Five changes with batch_size=3 need two batches
+    assert feed.drain() == 5
+    assert feed.backlog()[0] == 0
+
+    redis = feed.redis
+    assert redis.get_user(str(user_id)).email == "cdc@example.com"
+    assert redis.get_category(str(category_id)).category_name == "CDC Category"
+    assert redis.get_products_by_category_id(str(category_id))[0].price == 100.0
+    orders = redis.get_orders_by_user_id(str(user_id))
+    assert orders[0].items[0].product_id == str(product_id)
+    assert orders[0].items[0].quantity == 2
+    assert redis.client.zscore(f"category:{category_id}:products:by_popularity", str(product_id)) == 2
+    assert redis.get_daily_revenue("2024-12-20", "2024-12-20") == [("2024-12-20", 200.0)]
+    assert float(redis.client.hget("cdc:status", "lag_seconds")) >= 0
+
+    db_client.update_product(product_id, price=80.0)
+    db_client.delete_order(order_id)
+    feed.drain()
+
+    assert redis.get_products_by_category_id(str(category_id))[0].price == 80.0
+    assert redis.get_orders_by_user_id(str(user_id)) == []
+    assert redis.client.zscore(f"category:{category_id}:products:by_popularity", str(product_id)) == 0
+
+
+def test_apply_is_idempotent(feed, db_client):
+    user_id = db_client.create_user("CDC User", "cdc@example.com", "2024-12-20")
+    category_id = db_client.create_category("CDC Category")
+    product_id = db_client.create_product("CDC Product", 100.0, category_id)
+    order_id = db_client.create_order(user_id, "2024-12-20", 100.0)
+    db_client.create_order_item(order_id, product_id, 1)
+    feed.drain()
+
+    # Re-applying the same keys, as after a crash before commit, leaves Redis unchanged
+    with feed.connection.cursor() as cursor:
+        feed.apply(cursor, {"products": {product_id}, "orders": {order_id}})
+    feed.connection.commit()
+
+    assert len(feed.redis.get_orders_by_user_id(str(user_id))) == 1
+    assert feed.redis.client.zscore(f"category:{category_id}:products:by_popularity", str(product_id)) == 1
+
+
+def test_null_columns_do_not_block_the_feed(feed, db_client):
+    user_id = db_client.create_user(None, "nameless@example.com", "2024-12-20")
+    category_id = db_client.create_category("CDC Category")
+    product_id = db_client.create_product("Unpriced Product", None, category_id)
+    orphan_id = db_client.create_product("Orphan Product", 5.0, None)
+
+    assert feed.drain() == 4
+    assert feed.backlog()[0] == 0
+
+    redis = feed.redis
+    assert redis.get_user(str(user_id)).email == "nameless@example.com"
+    assert redis.client.hget(f"user:{user_id}", "name") is None
+    assert [product.product_id for product in redis.get_products_by_category_id(str(category_id))] == [str(product_id)]
+    # A product without a price stays out of the price index, one without a category out of all category indexes
+    assert redis.client.zscore(f"category:{category_id}:products:by_price", str(product_id)) is None
+    assert redis.client.hget(f"product:{orphan_id}", "name") == "Orphan Product"
+    assert not redis.client.exists("category:None:products")
@@ -0,0 +1,39 @@
+import json
+import pytest
+from clients.codecs import get_codec, decode_items
+
+ITEMS = [{"product_id": "1", "quantity": 2}, {"product_id": "42", "quantity": 1}]
+
+
+@pytest.mark.parametrize("name", ["json", "msgpack", "struct"])
+def test_codec_roundtrip(name):
+    codec = get_codec(name)
+    encoded = codec.encode(ITEMS)
+    assert codec.decode(encoded) == ITEMS
+    assert decode_items(encoded) == ITEMS
+
+
+def test_decode_items_reads_legacy_json():
+    assert decode_items(json.dumps(ITEMS)) == ITEMS
+    assert decode_items(json.dumps(ITEMS).encode()) == ITEMS
+
+
+def test_compact_codecs_are_smaller_than_json():
+    items = [{"product_id": str(product_id), "quantity": 1} for product_id in range(1000, 1020)]
+    json_size = len(get_codec("json").encode(items).encode())
+    assert len(get_codec("msgpack").encode(items)) < json_size
+    assert len(get_codec("struct").encode(items)) < json_size
+
+
+@pytest.mark.parametrize("item", [
+    {"product_id": "abc", "quantity": 1},
+    {"product_id": -1, "quantity": 1},
+    {"product_id": 2 ** 64, "quantity": 1},
+    {"product_id": 1, "quantity": 2 ** 32},
+    {"product_id": None, "quantity": 1},
+])
+def test_struct_codec_rejects_non_integer_ids(item):
+    with pytest.raises(ValueError, match="msgpack"):
+        get_codec("struct").encode([item])
+    with pytest.raises(ValueError):
+        get_codec("xml")
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from analytics.columnar import AnalyticsSnapshot
+
+
+class ExportStub:
+    # Minimal client exposing the export methods used by AnalyticsSnapshot.from_client
+    def iter_orders(self):
+        return iter([
+            (1, 10, "2024-12-20", 250.0),
+            (2, 11, "2024-12-20", 800.0),
+            (3, 10, "2024-12-21", 100.0),
+        ])
+
+    def iter_order_items(self):
+        return iter([(1, 100, 2), (1, 101, 1), (2, 102, 1), (3, 100, 1)])
+
+    def iter_products(self):
+        return iter([
+            (100, "Test Product 1", 50.0, "Books"),
+            (101, "Test Product 2", 150.0, "Electronics"),
+            (102, "Test Product 3", 800.0, "Electronics"),
+        ])
+
+
+@pytest.fixture
+def snapshot():
+    return AnalyticsSnapshot.from_client(ExportStub())
+
+
+def test_revenue_by_category(snapshot):
+    rows = {row["category"]: row["revenue"] for row in snapshot.revenue_by_category().to_rows()}
+    assert rows == {"Books": 150.0, "Electronics": 950.0}
+
+
+def test_top_products(snapshot):
+    rows = snapshot.top_products(2).to_rows()
+    assert [row["product_id"] for row in rows] == [100, 101]
+    assert rows[0]["quantity"] == 3
+    assert rows[0]["name"] == "Test Product 1"
+
+    rows = snapshot.top_products(1, by="revenue").to_rows()
+    assert [row["product_id"] for row in rows] == [102]
+
+
+def test_orders_per_day(snapshot):
+    rows = snapshot.orders_per_day().to_rows()
+    assert [(str(row["order_date"]), row["orders"], row["revenue"]) for row in rows] == [
+        ("2024-12-20", 2, 1050.0),
+        ("2024-12-21", 1, 100.0),
+    ]
+    assert len(snapshot.orders_per_day(start="2024-12-21").to_rows()) == 1
+
+
+def test_save_and_load_snapshot(snapshot, tmp_path):
+    snapshot.save(tmp_path / "analytics")
+    loaded = AnalyticsSnapshot.load(tmp_path / "analytics")
+    assert isinstance(loaded.orders["total"], np.memmap)
+    assert loaded.revenue_by_category().to_rows() == snapshot.revenue_by_category().to_rows()
+    assert loaded.orders.where("user_id", 10).to_rows()[0]["order_id"] in (1, 3)
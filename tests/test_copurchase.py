@@ -0,0 +1,41 @@
+import pytest
+from analytics.copurchase import CoPurchaseIndex
+
+
+@pytest.fixture
+def index():
+    return CoPurchaseIndex.from_pairs([
+        (1, 10), (1, 11), (1, 12),
+        (2, 10), (2, 11),
+        (3, 12), (3, 13),
+        (4, 13),
+    ])
+
+
+def test_similar_users_by_shared_count(index):
+    similar_users = index.similar_users(1)
+    assert similar_users == [(2, 2), (3, 1)]
+
+
+def test_similar_users_top_k_and_cosine(index):
+    assert index.similar_users(1, top_k=1) == [(2, 2)]
+
+    similar_users = index.similar_users(3, metric="cosine")
+    assert [user_id for user_id, _ in similar_users] == [4, 1]
+    assert similar_users[0][1] == pytest.approx(1 / 2 ** 0.5)
+
+
+def test_add_purchases_updates_index(index):
+    index.add_purchases([(5, 10), (5, 14), (2, 10)])
+    assert index.similar_users(5) == [(1, 1), (2, 1)]
+    assert index.similar_users(2) == [(1, 2), (5, 1)]
+    assert index.similar_users(100) == []
+
+
+def test_save_and_load_snapshot(index, tmp_path):
+    index.save(tmp_path / "copurchase")
+    loaded = CoPurchaseIndex.load(tmp_path / "copurchase")
+    assert loaded.similar_users(1) == index.similar_users(1)
+
+    loaded.add_purchases([("6", 13)])
+    assert loaded.similar_users(4) == [(3, 1), ("6", 1)]
@@ -0,0 +1,45 @@
+import pytest
+from clients.dataset_snapshots import restore, snapshot
+from clients.postgresql_client import PostgreSQLClient
+from clients.redis_client import RedisClient
+
+
+def test_postgresql_snapshot_restores_dataset():
+    client = PostgreSQLClient()
+    client.truncate_all()
+    user_id = client.create_user("Snapshot User", "snapshot@example.com", "2024-12-20")
+    client.connection.close()
+
+    snapshot("postgresql", "test")
+
+    # Changes made after the snapshot are discarded by restore
+    client = PostgreSQLClient()
+    later_id = client.create_user("Later User", "later@example.com", "2024-12-21")
+    client.connection.close()
+
+    restore("postgresql", "test")
+
+    client = PostgreSQLClient()
+    assert client.get_user(user_id) is not None
+    assert client.get_user(later_id) is None
+    client.connection.close()
+
+
+def test_redis_snapshot_restores_dataset(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_SNAPSHOT_DIR", str(tmp_path))
+    client = RedisClient(raw=True)
+    client.truncate_all()
+    client.create_user("1", "Alice", "alice@example.com")
+    client.create_category("1", "Electronics")
+
+    snapshot("redis", "test")
+    client.create_user("2", "Bob", "bob@example.com")
+    restore("redis", "test")
+
+    assert client.get_user("1")["name"] == "Alice"
+    assert not client.get_user("2")
+
+
+def test_unsupported_backend_raises():
+    with pytest.raises(ValueError):
+        snapshot("neo4j", "test")
@@ -0,0 +1,65 @@
+import pytest
+from analytics.graph_projection import BipartiteGraph
+
+
+@pytest.fixture
+def graph():
+    return BipartiteGraph.from_edges(
+        [
+            (1, 10), (1, 11), (1, 12),
+            (2, 10), (2, 11), (2, 11),
+            (3, 12), (3, 13),
+            (4, 13), (4, 10),
+        ],
+        [(10, "a"), (11, "a"), (12, "b"), (13, "b"), (14, None)],
+    )
+
+
+def test_adjacency_and_categories(graph):
+    assert graph.products_of(2) == [10, 11]
+    assert graph.buyers_of(10) == [1, 2, 4]
+    assert graph.category_of(12) == "b"
+    assert graph.category_of(14) is None
+    assert graph.products_in_category("a") == [10, 11]
+    assert graph.products_of(100) == []
+
+
+def test_two_hop_and_copurchase_counts(graph):
+    assert graph.two_hop_users(1) == [2, 3, 4]
+    assert graph.copurchase_counts(1) == [(2, 2), (3, 1), (4, 1)]
+    assert graph.copurchase_counts(1, top_k=1) == [(2, 2)]
+    # Product 10 has three buyers; capping the degree at 2 ignores it as an intermediate hop
+    assert graph.copurchase_counts(1, max_degree=2) == [(2, 1), (3, 1)]
+
+
+def test_also_bought(graph):
+    assert graph.also_bought(10) == [(11, 2), (12, 1), (13, 1)]
+    assert graph.also_bought(10, same_category=True) == [(11, 2)]
+    assert graph.also_bought(10, top_k=1) == [(11, 2)]
+    assert graph.also_bought(99) == []
+
+
+def test_incremental_appends_then_compact(graph):
+    assert graph.add_purchases([(5, 13), (5, 14), (1, 10), (5, 13)]) == 2
+    assert graph.users.delta_size == 2
+    assert graph.copurchase_counts(5) == [(3, 1), (4, 1)]
+    assert graph.buyers_of(13) == [3, 4, 5]
+
+    graph.compact()
+    assert graph.users.delta_size == 0
+    assert graph.copurchase_counts(5) == [(3, 1), (4, 1)]
+    assert graph.also_bought(14) == [(13, 1)]
+
+
+def test_save_and_load_snapshot(graph, tmp_path):
+    graph.add_purchases([(5, 12)])
+    graph.save(tmp_path / "graph")
+    loaded = BipartiteGraph.load(tmp_path / "graph")
+    assert loaded.copurchase_counts(1) == graph.copurchase_counts(1)
+    assert loaded.products_in_category("b") == [12, 13]
+
+    # A memory-mapped snapshot still accepts appends
+    loaded.add_purchases([("6", 12)])
+    loaded.set_categories([(15, "c")])
+    assert loaded.buyers_of(12) == [1, 3, 5, "6"]
+    assert loaded.category_of(15) == "c"
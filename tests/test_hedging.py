@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+from clients.hedging import HedgedClient, HedgingPolicy
+
+
+class FakeClient:
+    def __init__(self, delays=()):
+        # Delays of successive get_user calls; later calls answer immediately
+        self.delays = list(delays)
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def get_user(self, user_id):
+        with self.lock:
+            call = len(self.calls)
+            self.calls.append(user_id)
+        time.sleep(self.delays[call] if call < len(self.delays) else 0)
+        return {"user_id": user_id, "call": call}
+
+    def get_broken(self):
+        raise ValueError("broken")
+
+    def create_user(self, user_id):
+        self.calls.append(("create", user_id))
+
+
+@pytest.fixture
+def policy():
+    policy = HedgingPolicy(delay=0.02, budget=1.0)
+    yield policy
+    policy.close()
+
+
+def test_fast_primary_is_not_hedged(policy):
+    client = HedgedClient(FakeClient(), policy)
+    assert client.get_user(1) == {"user_id": 1, "call": 0}
+    assert policy.stats()["hedges"] == 0
+
+
+def test_slow_primary_is_rescued_by_hedge(policy):
+    client = HedgedClient(FakeClient(delays=[0.5]), policy)
+    start = time.perf_counter()
+    assert client.get_user(1) == {"user_id": 1, "call": 1}
+    assert time.perf_counter() - start < 0.4
+    stats = policy.stats()
+    assert (stats["requests"], stats["hedges"], stats["hedge_wins"]) == (1, 1, 1)
+
+
+def test_budget_caps_hedges():
+    policy = HedgingPolicy(delay=0.0, budget=0.25)
+    try:
+        client = HedgedClient(FakeClient(delays=[0.01] * 16), policy)
+        for user_id in range(8):
+            client.get_user(user_id)
+        # Each request earns a quarter of a hedge
+        assert policy.stats()["hedges"] == 2
+        assert policy.stats()["extra_load"] == 0.25
+    finally:
+        policy.close()
+
+
+def test_adaptive_delay_waits_for_samples():
+    policy = HedgingPolicy(percentile=50, min_samples=50)
+    try:
+        assert policy.hedge_delay() is None
+        for latency in range(1, 101):
+            policy.record(latency / 1000)
+        assert policy.hedge_delay() == pytest.approx(0.051)
+    finally:
+        policy.close()
+
+
+def test_writes_and_errors_pass_through(policy):
+    fake = FakeClient()
+    client = HedgedClient(fake, policy)
+    client.create_user(7)
+    assert fake.calls == [("create", 7)]
+    with pytest.raises(ValueError):
+        client.get_broken()
+    assert not HedgedClient(fake, policy, methods=["get_user"]).hedged("get_broken")
+    assert policy.stats()["requests"] == 1
+    with pytest.raises(ValueError):
+        HedgingPolicy(budget=2)
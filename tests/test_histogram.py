@@ -0,0 +1,48 @@
+import random
+import pytest
+from benchmark.histogram import Histogram
+
+
+def test_small_values_are_exact():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.record(value)
+
+    assert histogram.value_at_percentile(50) == 50
+    assert histogram.value_at_percentile(99) == 99
+    assert histogram.value_at_percentile(100) == 100
+    assert histogram.min == 1
+    assert histogram.mean() == 50.5
+
+
+def test_large_values_within_relative_error():
+    rng = random.Random(1)
+    values = sorted(rng.randint(1, 10_000_000) for _ in range(20000))
+    histogram = Histogram(significant_figures=2)
+    for value in values:
+        histogram.record(value)
+
+    for percentile in (50, 90, 99, 99.9):
+        exact = values[int(len(values) * percentile / 100) - 1]
+        assert histogram.value_at_percentile(percentile) == pytest.approx(exact, rel=0.01)
+    # Память определяется точностью, а не числом измерений
+    assert len(histogram.counts) < 2000
+
+
+def test_merge():
+    first, second, combined = Histogram(), Histogram(), Histogram()
+    for value in range(1000):
+        (first if value % 2 else second).record(value)
+        combined.record(value)
+
+    first.merge(second)
+
+    assert first.counts == combined.counts
+    assert first.total_count == 1000
+    assert (first.min, first.max) == (0, 999)
+    assert first.percentiles() == combined.percentiles()
+
+
+def test_negative_value_rejected():
+    with pytest.raises(ValueError):
+        Histogram().record(-1)
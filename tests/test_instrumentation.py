@@ -0,0 +1,66 @@
+import urllib.request
+import pytest
+from clients.instrumentation import instrument_class, registry, start_http_server
+
+
+class StubClient:
+    def get_orders_by_user_id(self, user_id):
+        return [{"order_id": 1}, {"order_id": 2}]
+
+    def get_user(self, user_id):
+        if user_id is None:
+            raise ValueError("user_id is required")
+        registry.add_bytes(bytes_in=120, bytes_out=40)
+        return {"user_id": user_id}
+
+    def get_orders_by_user_id_page(self, user_id, page_size=None, paging_state=None):
+        return [{"order_id": 1}, {"order_id": 2}, {"order_id": 3}], b"state"
+
+    def iter_products(self):
+        for product_id in range(3):
+            # Each row fetches another batch, like a cursor's getMore
+            registry.add_bytes(bytes_in=10)
+            yield product_id
+
+    def _helper(self):
+        return "not instrumented"
+
+
+@pytest.fixture
+def client():
+    registry.reset()
+    return instrument_class(type("InstrumentedStub", (StubClient,), dict(vars(StubClient))), "stub")()
+
+
+def test_calls_rows_and_errors_are_recorded(client):
+    client.get_orders_by_user_id(1)
+    client.get_user(1)
+    with pytest.raises(ValueError):
+        client.get_user(None)
+    assert list(client.iter_products()) == [0, 1, 2]
+    client.get_orders_by_user_id_page(1)
+    client._helper()
+
+    orders = registry.metrics[("stub", "get_orders_by_user_id")]
+    user = registry.metrics[("stub", "get_user")]
+    products = registry.metrics[("stub", "iter_products")]
+
+    assert (orders.calls, orders.rows, orders.errors) == (1, 2, 0)
+    assert (user.calls, user.rows, user.errors) == (2, 1, 1)
+    assert (user.bytes_in, user.bytes_out) == (120, 40)
+    assert (products.calls, products.rows, products.bytes_in) == (1, 3, 30)
+    assert registry.metrics[("stub", "get_orders_by_user_id_page")].rows == 3
+    assert ("stub", "_helper") not in registry.metrics
+
+
+def test_prometheus_endpoint(client):
+    client.get_user(1)
+    server = start_http_server(0)
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics").read().decode()
+    finally:
+        server.shutdown()
+
+    assert 'db_client_calls_total{backend="stub",method="get_user"} 1' in body
+    assert 'db_client_latency_seconds_bucket{backend="stub",method="get_user",le="+Inf"} 1' in body
+    assert 'db_client_bytes_received_total{backend="stub",method="get_user"} 120' in body
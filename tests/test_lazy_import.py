@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from clients.cassandra_client import CassandraClient
+from clients.lazy_import import lazy_import
+from clients.postgresql_client import PostgreSQLClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENT_MODULES = ("clients.postgresql_client", "clients.postgresql_b_client", "clients.mongo_client",
+                  "clients.redis_client", "clients.neo4j_client", "clients.cassandra_client", "clients.cdc")
+DRIVERS = ("psycopg2", "pymongo", "neo4j", "cassandra", "redis")
+
+
+def test_lazy_module_loads_on_first_attribute():
+    module = lazy_import("json")
+    assert "not loaded" in repr(module)
+    assert module.dumps([1]) == "[1]"
+    assert "not loaded" not in repr(module)
+
+
+def test_client_modules_do_not_import_drivers():
+    # A fresh interpreter, since this process has already loaded the drivers
+    code = (f"import json, sys\nfor name in {CLIENT_MODULES!r}: __import__(name)\n"
+            f"print(json.dumps([name for name in {DRIVERS!r} if name in sys.modules]))")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=ROOT, check=True)
+    assert json.loads(completed.stdout.strip().splitlines()[-1]) == []
+
+
+def test_constructors_do_not_connect(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "postgres://user@127.0.0.1:1/missing?connect_timeout=1")
+    monkeypatch.setenv("CASSANDRA_CONTACT_POINTS", "127.0.0.1")
+    monkeypatch.setenv("CASSANDRA_PORT", "1")
+    client = PostgreSQLClient()
+    CassandraClient().close()
+    with pytest.raises(Exception):
+        client.connection
@@ -0,0 +1,44 @@
+import pytest
+from clients import migrations
+from clients.migrations import COMPONENTS, check_schema, latest_version, migrate, scripts
+
+
+def test_every_component_has_consecutive_scripts():
+    for component in COMPONENTS:
+        versions = [version for version, _, _ in scripts(component)]
+        assert versions == list(range(1, latest_version(component) + 1))
+        assert versions, component
+
+
+def test_statements_skip_comment_lines():
+    script = "-- comment; with semicolon\nCREATE TABLE a (x INT);\n\n// another\nCREATE INDEX b;\n"
+    assert migrations._statements(script) == ["CREATE TABLE a (x INT)", "CREATE INDEX b"]
+
+
+def test_cassandra_script_matches_client_queries():
+    # products_by_user is read by user_id, so user_id must be the partition key
+    _, _, path = scripts("cassandra")[0]
+    statements = migrations._statements(migrations._read(path).replace("{keyspace}", "ks"))
+    products_by_user = next(statement for statement in statements if "ks.products_by_user" in statement)
+    assert "PRIMARY KEY (user_id, product_id)" in products_by_user
+    assert all("{keyspace}" not in statement for statement in statements)
+
+
+@pytest.fixture
+def pg_connection():
+    connection, _, close = migrations.connect("postgresql")
+    yield connection
+    close()
+
+
+def test_postgresql_migrate_is_idempotent(pg_connection):
+    migrate("postgresql", pg_connection)
+    assert migrate("postgresql", pg_connection) == []
+    assert check_schema("postgresql", pg_connection) == latest_version("postgresql")
+
+
+def test_check_schema_rejects_outdated_database(pg_connection, monkeypatch):
+    migrate("postgresql", pg_connection)
+    monkeypatch.setattr(migrations, "latest_version", lambda component: 99)
+    with pytest.raises(RuntimeError):
+        check_schema("postgresql", pg_connection)
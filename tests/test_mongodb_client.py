@@ -1,10 +1,13 @@
 import pytest
+import pymongo.errors
+from clients.migrations import migrate
 from clients.mongo_client import MongoDBClient
 from bson.objectid import ObjectId
 
 @pytest.fixture(scope="module")
 def db_client():
     client = MongoDBClient()
+    client.truncate_all()
     yield client
     client.client.close()
 
@@ -31,13 +34,13 @@ def test_get_orders_by_user_id(db_client, setup_data):
     user_id = setup_data["user_id"]
     orders = db_client.get_orders_by_user_id(user_id)
     assert len(orders) == 1
-    assert orders[0]["_id"] == setup_data["order_id"]
+    assert orders[0].order_id == setup_data["order_id"]
 
 def test_get_purchased_products_by_user_id(db_client, setup_data):
     user_id = setup_data["user_id"]
     products = db_client.get_purchased_products_by_user_id(user_id)
     assert len(products) == 2
-    product_ids = [product["_id"] for product in products]
+    product_ids = [product.product_id for product in products]
     assert ObjectId(setup_data["product_id_1"]) in product_ids
     assert ObjectId(setup_data["product_id_2"]) in product_ids
 
@@ -53,12 +56,111 @@ def test_get_users_with_similar_purchases(db_client, setup_data):
     similar_users = db_client.get_users_with_similar_purchases(user_id)
 
     assert len(similar_users) > 0
-    assert any(user["_id"] == ObjectId(similar_user_id) for user in similar_users)
+    assert any(user.user_id == ObjectId(similar_user_id) for user in similar_users)
 
 def test_get_products_by_category_id(db_client, setup_data):
     category_id = setup_data["category_id"]
     products = db_client.get_products_by_category_id(category_id)
     assert len(products) == 2
-    product_ids = [product["_id"] for product in products]
+    product_ids = [product.product_id for product in products]
     assert ObjectId(setup_data["product_id_1"]) in product_ids
     assert ObjectId(setup_data["product_id_2"]) in product_ids
+
+def test_orders_in_date_range(db_client):
+    user_id = db_client.create_user("Range User", "range@example.com", "2019-01-01")
+    db_client.create_order(user_id, "2019-03-05", 100.0, [])
+    db_client.create_order(user_id, "2019-03-05", 50.0, [])
+    db_client.create_order(user_id, "2019-04-20", 70.0, [])
+    db_client.create_order(user_id, "2019-06-01", 30.0, [])
+
+    orders = db_client.get_orders_by_user_in_range(user_id, "2019-03-01", "2019-04-30")
+    assert [order.order_date for order in orders] == ["2019-03-05", "2019-03-05", "2019-04-20"]
+
+    orders = db_client.get_orders_in_range("2019-04-20", "2019-06-01", fields=["total"])
+    assert [order.total for order in orders] == [70.0, 30.0]
+
+    assert db_client.get_daily_revenue("2019-03-01", "2019-04-30") == [("2019-03-05", 150.0), ("2019-04-20", 70.0)]
+
+def test_bulk_create_and_update(db_client):
+    users = [{"name": f"Bulk User {i}", "email": f"bulk{i}@example.com", "registration_date": "2024-12-20"} for i in range(5)]
+    result = db_client.create_users(iter(users), batch_size=2)
+    assert result.succeeded == 5 and not result.errors
+    assert [db_client.get_user(user_id).email for user_id in result.ids] == [user["email"] for user in users]
+
+    updates = [(user_id, {"name": f"Renamed {i}", "email": None}) for i, user_id in enumerate(result.ids)]
+    updated = db_client.update_users(updates, batch_size=3, write_concern={"w": 1})
+    assert updated.modified == 5
+    assert db_client.get_user(result.ids[4]).name == "Renamed 4"
+    assert db_client.get_user(result.ids[4]).email == "bulk4@example.com"
+
+
+def test_bulk_insert_reports_partial_failures(db_client):
+    collection = db_client.db.bulk_test
+    collection.drop()
+    collection.create_index("key", unique=True)
+    documents = [{"key": key} for key in (1, 2, 2, 3, 1, 4)]
+
+    result = db_client._insert_many("bulk_test", documents, batch_size=4)
+
+    # Duplicates fail individually; the rest of each chunk and the following chunks are still written
+    assert [error["index"] for error in result.errors] == [2, 4]
+    assert [document_id is None for document_id in result.ids] == [False, False, True, False, True, False]
+    assert collection.count_documents({}) == 4
+    collection.drop()
+
+
+def test_bulk_insert_survives_failed_chunk_and_write_concern_errors(db_client, monkeypatch):
+    collection = db_client.db.bulk_test
+    collection.drop()
+    insert_many = type(collection).insert_many
+    calls = []
+
+    def flaky_insert_many(self, documents, *args, **kwargs):
+        calls.append(len(documents))
+        if len(calls) == 1:
+            raise pymongo.errors.AutoReconnect("connection reset")
+        insert_many(self, documents, *args, **kwargs)
+        if len(calls) == 2:
+            raise pymongo.errors.BulkWriteError({"writeErrors": [], "writeConcernErrors": [{"code": 64, "errmsg": "waiting for replication timed out"}]})
+
+    monkeypatch.setattr(type(collection), "insert_many", flaky_insert_many)
+    result = db_client._insert_many("bulk_test", [{"key": key} for key in range(5)], batch_size=2)
+
+    # The first chunk is lost, the rest of the load still runs and is reported
+    assert calls == [2, 2, 1]
+    assert [document_id is None for document_id in result.ids] == [True, True, False, False, False]
+    assert [error["index"] for error in result.errors] == [0, 1]
+    assert result.write_concern_errors == [{"start": 2, "end": 4, "code": 64, "message": "waiting for replication timed out"}]
+    monkeypatch.undo()
+    assert collection.count_documents({}) == 3
+    collection.drop()
+
+
+def test_embedded_product_snapshots():
+    from clients.mongo_snapshots import ProductSnapshotSync
+
+    migrate("mongodb", database="ecommerce_embedded_test")
+    client = MongoDBClient(embed_products=True, database="ecommerce_embedded_test")
+    client.truncate_all()
+    user_id = client.create_user("Embedded User", "embedded@example.com", "2024-12-20")
+    category_id = client.create_category("Embedded Category")
+    product_id = client.create_product("Old Name", 100.0, category_id)
+    order_id = client.create_order(user_id, "2024-12-20", 200.0, [{"product_id": product_id, "quantity": 2}])
+
+    # Item snapshots are stored in the order, so details need no lookup in products
+    item = client.get_order_details(order_id).items[0]
+    assert (item.product_name, item.price) == ("Old Name", 100.0)
+
+    # Price changes do not touch snapshots: the purchase-time price is kept
+    client.update_product(product_id, name="New Name", price=120.0)
+    products = client.get_purchased_products_by_user_id(user_id)
+    assert [(product.name, product.price) for product in products] == [("Old Name", 100.0)]
+
+    sync = ProductSnapshotSync(client)
+    assert sync.drain() == 1
+    assert sync.backlog() == 0
+    products = client.get_purchased_products_by_user_id(user_id)
+    assert [(product.name, product.price) for product in products] == [("New Name", 100.0)]
+
+    client.client.drop_database("ecommerce_embedded_test")
+    client.client.close()
@@ -0,0 +1,29 @@
+from benchmark.histogram import Histogram
+from benchmark.load_generator import RunResult
+from benchmark.multiprocess_driver import process_share
+
+
+def test_process_shares_interleave_into_single_schedule():
+    qps, processes, duration = 100, 4, 1
+    intended = []
+    for index in range(processes):
+        process_qps, phase = process_share(qps, processes, index)
+        intended += [phase + i / process_qps for i in range(int(process_qps * duration))]
+
+    assert sorted(round(value, 6) for value in intended) == [round(i / qps, 6) for i in range(qps * duration)]
+
+
+def test_merge_run_results():
+    results = []
+    for elapsed, values in ((2.0, [100, 200]), (2.5, [300])):
+        histogram = Histogram()
+        for value in values:
+            histogram.record(value)
+        results.append(RunResult("closed", elapsed, {"get_user": histogram}, {"get_user": 1}))
+
+    merged = RunResult.merge(results)
+
+    assert merged.histograms["get_user"].total_count == 3
+    assert merged.errors == {"get_user": 2}
+    assert merged.elapsed == 2.5
+    assert merged.throughput() == 3 / 2.5
@@ -5,6 +5,7 @@ from clients.neo4j_client import Neo4jClient
 @pytest.fixture(scope="module")
 def neo4j_client():
     client = Neo4jClient()
+    client.truncate_all()
     yield client
     client.close()
 
@@ -71,3 +72,27 @@ def test_get_products_by_category_id(neo4j_client, setup_data):
     assert len(products) == 2
     assert "prod1" in product_ids
     assert "prod2" in product_ids
+
+def test_orders_in_date_range(neo4j_client, setup_data):
+    orders = neo4j_client.get_orders_by_user_in_range("user1", "2024-01-12", "2024-01-31")
+    assert [order["order_id"] for order in orders] == ["order2"]
+
+    orders = neo4j_client.get_orders_in_range("2024-01-10", "2024-01-20", fields=["order_id"])
+    assert [order["order_id"] for order in orders] == ["order1", "order2", "order3"]
+
+    assert neo4j_client.get_daily_revenue("2024-01-11", "2024-01-20") == [("2024-01-15", 500.0), ("2024-01-20", 700.0)]
+
+def test_streaming_reads_match_list_reads(setup_data):
+    # A fetch size smaller than the result forces several PULL round trips
+    client = Neo4jClient(fetch_size=1)
+    try:
+        products = list(client.iter_products_by_category_id("cat1", fields=["product_id", "price"]))
+        assert sorted(product["product_id"] for product in products) == ["prod1", "prod2"]
+        assert products == client.get_products_by_category_id("cat1", fields=["product_id", "price"])
+
+        # Closing the generator early releases the session
+        orders = client.iter_orders_in_range("2024-01-01", "2024-01-31")
+        assert next(orders)["order_id"] == "order1"
+        orders.close()
+    finally:
+        client.close()
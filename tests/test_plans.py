@@ -0,0 +1,35 @@
+from clients.plans import _mongo_shape, _neo4j_shape, _postgresql_shape, diff_plans
+
+
+def test_postgresql_shape():
+    plan = {"Node Type": "Hash Join", "Plans": [
+        {"Node Type": "Seq Scan", "Relation Name": "orders"},
+        {"Node Type": "Hash", "Plans": [{"Node Type": "Index Scan", "Index Name": "users_pkey", "Relation Name": "users"}]},
+    ]}
+    assert _postgresql_shape(plan) == "Hash Join(Seq Scan[orders], Hash(Index Scan[users_pkey]))"
+
+
+def test_mongo_and_neo4j_shapes():
+    winning_plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "user_id_1"}}
+    profile = {"operatorType": "ProduceResults@neo4j", "children": [{"operatorType": "NodeIndexSeek@neo4j"}]}
+
+    assert _mongo_shape(winning_plan) == "FETCH(IXSCAN[user_id_1])"
+    assert _neo4j_shape(profile) == "ProduceResults(NodeIndexSeek)"
+
+
+def test_diff_plans_reports_only_changed_shapes():
+    old = {"postgresql": {
+        "get_orders_by_user_id": [{"shape": "Seq Scan[orders]"}],
+        "get_user": [{"shape": "Index Scan[users_pkey]"}],
+    }}
+    new = {"postgresql": {
+        "get_orders_by_user_id": [{"shape": "Index Scan[orders_user_id_idx]"}],
+        "get_user": [{"shape": "Index Scan[users_pkey]"}, {"shape": "Index Scan[users_pkey]"}],
+    }}
+
+    assert diff_plans(old, new) == [{
+        "backend": "postgresql",
+        "method": "get_orders_by_user_id",
+        "old": ["Seq Scan[orders]"],
+        "new": ["Index Scan[orders_user_id_idx]"],
+    }]
@@ -5,6 +5,7 @@ from clients.postgresql_b_client import PostgreSQLBClient
 @pytest.fixture(scope="module")
 def db_client():
     client = PostgreSQLBClient()
+    client.truncate_all()
     yield client
     client.connection.close()
 
@@ -64,3 +65,51 @@ def test_get_products_by_category_id(db_client, setup_data):
     product_ids = [product[0] for product in products]
     assert setup_data["product_id_1"] in product_ids
     assert setup_data["product_id_2"] in product_ids
+
+
+def test_concurrent_streams(db_client, setup_data):
+    # Each iter_* call gets its own server-side cursor, and finishing one does not close the other
+    expected_products, expected_orders = list(db_client.iter_products()), list(db_client.iter_orders())
+    products = db_client.iter_products(batch_size=1)
+    orders = db_client.iter_orders(batch_size=1)
+    first_product = next(products)
+    assert list(orders) == expected_orders
+    assert [first_product, *products] == expected_products
+    assert db_client.streams == 0
+
+
+def test_orders_in_date_range(db_client):
+    user_id = db_client.create_user("Range User", "range@example.com", "2019-01-01")
+    product_id = db_client.create_product("Range Product", 10.0, "Category R")
+    for order_date, total in (("2019-03-05", 100.0), ("2019-03-05", 50.0), ("2019-04-20", 70.0), ("2019-06-01", 30.0)):
+        db_client.create_order(user_id, [{"product_id": product_id, "quantity": 1}], order_date, total)
+
+    orders = db_client.get_orders_by_user_in_range(user_id, "2019-03-01", "2019-04-30")
+    assert [order.order_date for order in orders] == ["2019-03-05", "2019-03-05", "2019-04-20"]
+    assert all(order.user_id == user_id for order in orders)
+
+    orders = db_client.get_orders_in_range("2019-04-20", "2019-06-01", fields=["total"])
+    assert [order.total for order in orders] == [70.0, 30.0]
+
+    assert db_client.get_daily_revenue("2019-03-01", "2019-04-30") == [("2019-03-05", 150.0), ("2019-04-20", 70.0)]
+
+
+
+def test_detach_orders_partitions(db_client):
+    user_id = db_client.create_user("Archive User", "archive@example.com", "2001-01-01")
+    other_client = PostgreSQLBClient()
+    other_client.create_order(user_id, [], "2001-01-15", 10.0)
+    db_client.create_order(user_id, [], "2001-02-15", 20.0)
+
+    assert db_client.detach_orders_partitions("2001-02-01") == ["archived_orders_2001_01"]
+    assert len(db_client.get_orders_in_range("2001-01-01", "2001-02-28")) == 1
+    # End the read transaction: it would block the other client from creating a partition
+    db_client.connection.rollback()
+
+    # The other client's cached partition is stale: the write recreates it,
+    # and detaching the month again archives it under a new name
+    other_client.create_order(user_id, [], "2001-01-20", 30.0)
+    assert len(db_client.get_orders_in_range("2001-01-01", "2001-01-31")) == 1
+    assert db_client.detach_orders_partitions("2001-02-01") == ["archived_orders_2001_01_2"]
+    assert db_client.get_orders_in_range("2001-01-01", "2001-01-31") == []
+    other_client.connection.close()
@@ -1,10 +1,12 @@
 import pytest
+from clients.plans import capture_plans
 from clients.postgresql_client import PostgreSQLClient
 
 
 @pytest.fixture(scope="module")
 def db_client():
     client = PostgreSQLClient()
+    client.truncate_all()
     yield client
     client.connection.close()
 
@@ -67,3 +69,89 @@ def test_get_products_by_category_id(db_client, setup_data):
     product_ids = [product[0] for product in products]
     assert setup_data["product_id_1"] in product_ids
     assert setup_data["product_id_2"] in product_ids
+
+
+def test_get_products_by_category_id_with_fields(db_client, setup_data):
+    products = db_client.get_products_by_category_id(setup_data["category_id"], fields=["product_id", "price"])
+    assert len(products) == 2
+    assert all(product.name is None for product in products)
+    assert sorted(product.price for product in products) == [100.0, 150.0]
+
+    with pytest.raises(ValueError):
+        db_client.get_products_by_category_id(setup_data["category_id"], fields=["password"])
+
+
+def test_concurrent_streams(db_client, setup_data):
+    # Each iter_* call gets its own server-side cursor, and finishing one does not close the other
+    expected_products, expected_orders = list(db_client.iter_products()), list(db_client.iter_orders())
+    products = db_client.iter_products(batch_size=1)
+    orders = db_client.iter_orders(batch_size=1)
+    first_product = next(products)
+    assert list(orders) == expected_orders
+    assert [first_product, *products] == expected_products
+    assert db_client.streams == 0
+
+
+def test_capture_plans(setup_data):
+    client = PostgreSQLClient()
+    recorder = capture_plans(client, "postgresql")
+    orders = client.get_orders_by_user_id(setup_data["user_id"])
+    client.connection.close()
+
+    # The method result is unaffected and the plan is captured with ANALYZE statistics
+    assert len(orders) == 1
+    entry = recorder.plans["postgresql"]["get_orders_by_user_id"][0]
+    assert "orders" in entry["shape"]
+    assert entry["stats"]["analyzed"] is True
+    assert entry["stats"]["actual_rows"] == 1
+
+
+def test_orders_in_date_range(db_client):
+    user_id = db_client.create_user("Range User", "range@example.com", "2019-01-01")
+    db_client.create_order(user_id, "2019-03-05", 100.0)
+    db_client.create_order(user_id, "2019-03-05", 50.0)
+    db_client.create_order(user_id, "2019-04-20", 70.0)
+    db_client.create_order(user_id, "2019-06-01", 30.0)
+
+    orders = db_client.get_orders_by_user_in_range(user_id, "2019-03-01", "2019-04-30")
+    assert [order.order_date for order in orders] == ["2019-03-05", "2019-03-05", "2019-04-20"]
+
+    orders = db_client.get_orders_in_range("2019-04-20", "2019-06-01", fields=["order_id", "total"])
+    assert [order.total for order in orders] == [70.0, 30.0]
+
+    assert db_client.get_daily_revenue("2019-03-01", "2019-04-30") == [("2019-03-05", 150.0), ("2019-04-20", 70.0)]
+
+    with pytest.raises(ValueError):
+        db_client.get_orders_in_range("2019-06-01", "2019-03-01")
+
+
+def test_range_query_prunes_partitions(db_client):
+    db_client.create_order(db_client.create_user("Prune User", "prune@example.com", "2019-01-01"), "2019-05-10", 10.0)
+    db_client.cursor.execute("EXPLAIN SELECT * FROM Orders WHERE order_date BETWEEN '2019-05-01' AND '2019-05-31'")
+    plan = "\n".join(row[0] for row in db_client.cursor.fetchall())
+    db_client.connection.rollback()
+    assert "orders_2019_05" in plan
+    assert "orders_2024_12" not in plan
+
+
+def test_detach_orders_partitions(db_client):
+    user_id = db_client.create_user("Archive User", "archive@example.com", "2001-01-01")
+    db_client.create_order(user_id, "2001-01-15", 10.0)
+    db_client.create_order(user_id, "2001-02-15", 20.0)
+
+    assert db_client.detach_orders_partitions("2001-02-01") == ["archived_orders_2001_01"]
+    assert [order.order_date for order in db_client.get_orders_by_user_id(user_id)] == ["2001-02-15"]
+
+    # A detached month can be written again: its partition is recreated
+    db_client.create_order(user_id, "2001-01-20", 30.0)
+    assert len(db_client.get_orders_in_range("2001-01-01", "2001-01-31")) == 1
+
+    # Detaching it again archives it under a new name
+    other_client = PostgreSQLClient()
+    other_client.create_order(user_id, "2001-01-25", 40.0)
+    assert db_client.detach_orders_partitions("2001-02-01") == ["archived_orders_2001_01_2"]
+
+    # Another client's cached partition for the month is stale: the write recreates the partition
+    other_client.create_order(user_id, "2001-01-28", 50.0)
+    assert [order.total for order in db_client.get_orders_in_range("2001-01-01", "2001-01-31")] == [50.0]
+    other_client.connection.close()
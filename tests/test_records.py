@@ -0,0 +1,34 @@
+import datetime
+from decimal import Decimal
+from clients.records import User, Product, Order, OrderItem, from_row, from_mapping, items_from_mappings
+
+
+def test_record_from_postgresql_row():
+    product = from_row(Product, (1, "Test Product 1", Decimal("100.00"), 2))
+    assert product.price == 100.0
+    assert product[0] == 1
+    assert product["name"] == "Test Product 1"
+    assert product.category_name is None
+    assert from_row(Product, None) is None
+
+
+def test_record_from_mapping_with_aliases():
+    user = from_mapping(User, {"_id": "abc", "name": "Alice", "registration_date": datetime.date(2024, 12, 20)}, {"user_id": "_id"})
+    assert user.user_id == "abc"
+    assert user.registration_date == "2024-12-20"
+    assert user.get("email", "unknown") == "unknown"
+
+
+def test_order_items_decoding():
+    order = from_mapping(Order, {"user_id": "1", "total": "250"}, order_id="7",
+                         items=items_from_mappings([{"product_id": "1", "quantity": "2"}], "7"))
+    assert order.total == 250.0
+    assert order.items == [OrderItem("7", "1", 2)]
+    assert order.items[0]["quantity"] == 2
+    assert order.to_dict()["order_id"] == "7"
+
+
+def test_records_use_slots():
+    user = User(1, "Alice")
+    assert not hasattr(user, "__dict__")
+    assert tuple(user) == (1, "Alice", None, None)
@@ -5,7 +5,7 @@ from clients.redis_client import RedisClient
 @pytest.fixture
 def redis_client():
     client = RedisClient()
-    client.client.flushdb()
+    client.truncate_all()
     return client
 
 
@@ -34,7 +34,7 @@ def test_get_purchased_products_by_user_id(redis_client):
 
     assert len(products) == 1
     assert products[0]["name"] == "Laptop"
-    assert products[0]["price"] == "1200.00"
+    assert products[0]["price"] == 1200.0
 
 
 def test_get_users_with_similar_purchases(redis_client):
@@ -62,3 +62,76 @@ def test_get_products_by_category_id(redis_client):
     assert len(products) == 2
     assert any(product["name"] == "Laptop" for product in products)
     assert any(product["name"] == "Smartphone" for product in products)
+
+
+def test_get_products_by_category_id_with_fields(redis_client):
+    redis_client.create_category("1", "Electronics")
+    redis_client.create_product("1", "Laptop", "1200.00", "1")
+
+    products = redis_client.get_products_by_category_id("1", fields=["name", "price"])
+
+    assert len(products) == 1
+    assert products[0].name == "Laptop"
+    assert products[0].price == 1200.0
+    assert products[0].category_id is None
+
+
+def test_get_products_by_price_range(redis_client):
+    redis_client.create_category("1", "Electronics")
+    redis_client.create_product("1", "Laptop", "1200.00", "1")
+    redis_client.create_product("2", "Mouse", "25.00", "1")
+    redis_client.create_product("3", "Keyboard", "45.00", "1")
+    redis_client.create_product("4", "Cable", "5.00", "1")
+
+    products = redis_client.get_products_by_price_range("1", 10, 50)
+    page = redis_client.get_products_by_price_range("1", offset=1, limit=2, descending=True)
+    rest = redis_client.get_products_by_price_range("1", offset=2)
+
+    assert [product["product_id"] for product in products] == ["2", "3"]
+    assert [product["product_id"] for product in page] == ["3", "2"]
+    # An offset without a limit skips the cheapest products and returns the rest
+    assert [product["product_id"] for product in rest] == ["3", "1"]
+
+
+def test_get_top_products_by_category(redis_client):
+    redis_client.create_user("1", "Alice", "alice@example.com")
+    redis_client.create_category("1", "Electronics")
+    redis_client.create_product("1", "Laptop", "1200.00", "1")
+    redis_client.create_product("2", "Mouse", "25.00", "1")
+    redis_client.create_order("1", "1", [{"product_id": "1", "quantity": 1}, {"product_id": "2", "quantity": 3}])
+    # Повторная запись заказа не должна удваивать популярность
+    redis_client.create_order("1", "1", [{"product_id": "1", "quantity": 1}, {"product_id": "2", "quantity": 3}])
+    redis_client.create_order("2", "1", [{"product_id": "1", "quantity": 1}])
+
+    top_products = redis_client.get_top_products_by_category("1", limit=1)
+
+    assert [product["product_id"] for product in top_products] == ["2"]
+    assert redis_client.get_top_products_by_category("1", limit=0) == []
+    assert redis_client.client.zscore("category:1:products:by_popularity", "2") == 3
+
+    redis_client.delete_order("1")
+    assert redis_client.get_top_products_by_category("1")[0]["product_id"] == "1"
+
+
+def test_orders_in_date_range(redis_client):
+    redis_client.create_user("1", "Alice", "alice@example.com")
+    redis_client.create_user("2", "Bob", "bob@example.com")
+    redis_client.create_order("1", "1", [{"product_id": "1", "quantity": 1}], "2024-03-05", 100.0)
+    redis_client.create_order("2", "1", [{"product_id": "1", "quantity": 1}], "2024-04-20", 70.0)
+    redis_client.create_order("3", "2", [{"product_id": "1", "quantity": 1}], "2024-03-05", 50.0)
+    redis_client.create_order("4", "1", [{"product_id": "1", "quantity": 1}])
+
+    orders = redis_client.get_orders_by_user_in_range("1", "2024-03-01", "2024-04-30")
+    assert [order.order_id for order in orders] == ["1", "2"]
+    assert [order.order_date for order in orders] == ["2024-03-05", "2024-04-20"]
+
+    orders = redis_client.get_orders_in_range("2024-03-01", "2024-03-31", fields=["order_id", "total"])
+    assert sorted(order.total for order in orders) == [50.0, 100.0]
+    assert redis_client.get_daily_revenue("2024-03-01", "2024-04-30") == [("2024-03-05", 150.0), ("2024-04-20", 70.0)]
+
+    # Changing the owner moves the order between per-user indexes; deleting removes it from both
+    redis_client.upsert_order("2", "2", [{"product_id": "1", "quantity": 1}], "2024-04-20", 70.0)
+    assert redis_client.get_orders_by_user_in_range("1", "2024-03-01", "2024-04-30")[0].order_id == "1"
+    assert len(redis_client.get_orders_by_user_in_range("2", "2024-03-01", "2024-04-30")) == 2
+    redis_client.delete_order("3")
+    assert redis_client.get_daily_revenue("2024-03-01", "2024-04-30") == [("2024-03-05", 100.0), ("2024-04-20", 70.0)]
@@ -0,0 +1,65 @@
+import os
+import pytest
+from benchmark.load_generator import warm_up
+from clients.redis_client import RedisClient
+from clients.redis_sharding import HashRing, parse_nodes, routing_key
+
+SHARD_NODES = os.getenv("REDIS_SHARD_NODES", "localhost:6380,localhost:6381")
+
+
+@pytest.fixture
+def sharded_client():
+    client = RedisClient(nodes=SHARD_NODES)
+    client.truncate_all()
+    yield client
+    client.client.close()
+    client.binary_client.close()
+
+
+def test_routing_key_colocates_entity_keys():
+    assert routing_key("user:1") == "user:1"
+    assert routing_key("user:1:orders") == "user:1"
+    assert routing_key("category:5:products") == "category:5"
+    assert routing_key("order:{user:1}:7") == "user:1"
+    assert routing_key("stats") == "stats"
+
+
+def test_parse_nodes():
+    assert parse_nodes("a:6379, b:6380") == [("a", 6379), ("b", 6380)]
+    assert parse_nodes([("a", "6379")]) == [("a", 6379)]
+
+
+def test_hash_ring_moves_few_keys_when_node_added():
+    keys = [f"user:{user_id}" for user_id in range(5000)]
+    before = HashRing(["a:1", "b:1", "c:1"])
+    after = HashRing(["a:1", "b:1", "c:1", "d:1"])
+
+    moved = [key for key in keys if before.node_for(key) != after.node_for(key)]
+
+    # Ожидаемая доля переехавших ключей ~1/4, и все они переезжают только на новый узел
+    assert 0.15 < len(moved) / len(keys) < 0.35
+    assert all(after.node_for(key) == "d:1" for key in moved)
+
+
+def test_sharded_client_warms_up(sharded_client):
+    # The load generator pings every node before measuring
+    assert sharded_client.client.ping()
+    assert warm_up("redis", sharded_client) is sharded_client
+
+
+def test_sharded_client_reads_across_nodes(sharded_client):
+    sharded_client.create_user("1", "Alice", "alice@example.com")
+    sharded_client.create_category("1", "Electronics")
+    for product_id in range(1, 21):
+        sharded_client.create_product(str(product_id), f"Product {product_id}", "10.00", "1")
+    sharded_client.create_order("1", "1", [{"product_id": "1", "quantity": 1}, {"product_id": "2", "quantity": 2}])
+
+    products = sharded_client.get_products_by_category_id("1")
+    purchased = sharded_client.get_purchased_products_by_user_id("1")
+    orders = sharded_client.get_orders_by_user_id("1")
+
+    assert len(products) == 20
+    assert len({sharded_client.client.node_for(f"product:{product_id}") for product_id in range(1, 21)}) > 1
+    assert sorted(product["product_id"] for product in purchased) == ["1", "2"]
+    assert len(orders) == 1
+    assert sharded_client.client.node_for("user:1") == sharded_client.client.node_for("user:1:orders")
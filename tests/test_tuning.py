@@ -0,0 +1,63 @@
+import socket
+import pytest
+from cassandra.cluster import EXEC_PROFILE_DEFAULT
+from benchmark.tuning_sweep import parse_sweep, sweep_settings
+from clients.tuning import cassandra_options, load_profiles, mongo_options, resolve_profile, tuning_for
+
+
+def test_profile_inheritance_merges_backend_settings():
+    profiles = {
+        "base": {"mongodb": {"maxPoolSize": 10, "compressors": ["zstd"]}, "redis": {"socket_timeout": 5}},
+        "child": {"extends": "base", "mongodb": {"compressors": []}},
+    }
+    assert resolve_profile(profiles, "child") == {
+        "mongodb": {"maxPoolSize": 10, "compressors": []},
+        "redis": {"socket_timeout": 5},
+    }
+    with pytest.raises(ValueError):
+        resolve_profile(profiles, "missing")
+    with pytest.raises(ValueError):
+        resolve_profile({"a": {"extends": "b"}, "b": {"extends": "a"}}, "a")
+
+
+def test_shipped_profiles(monkeypatch):
+    profiles = load_profiles()
+    assert all(resolve_profile(profiles, name) is not None for name in profiles)
+    monkeypatch.delenv("DB_TUNING_PROFILE", raising=False)
+    assert tuning_for("mongodb") == {}
+    monkeypatch.setenv("DB_TUNING_PROFILE", "tuned")
+    assert tuning_for("postgresql_b") == tuning_for("postgresql")
+    # An explicit dict bypasses the profile file
+    assert tuning_for("redis", {"socket_timeout": 1}) == {"socket_timeout": 1}
+
+
+def test_driver_options():
+    assert mongo_options({"compressors": ["zstd", "snappy"], "maxPoolSize": 5}) == {"compressors": "zstd,snappy", "maxPoolSize": 5}
+    assert mongo_options({"compressors": []}) == {}
+
+    cluster, session = cassandra_options({"compression": "lz4", "keepalive": True, "fetch_size": 500, "request_timeout": 3})
+    assert cluster == {"compression": "lz4", "sockopts": [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]}
+    assert session == {"default_fetch_size": 500, "default_timeout": 3}
+
+    # Speculative execution moves the request timeout into the default execution profile
+    cluster, session = cassandra_options({"speculative_execution": {"delay": 0.05, "max_attempts": 2}, "request_timeout": 3})
+    profile = cluster["execution_profiles"][EXEC_PROFILE_DEFAULT]
+    assert profile.request_timeout == 3 and session == {}
+    assert profile.speculative_execution_policy.delay == 0.05
+    assert profile.speculative_execution_policy.max_attempts == 2
+
+
+def test_sweep_combinations():
+    sweeps = parse_sweep(['compressors=[],["zstd","zlib"]', "maxPoolSize=10,null"])
+    assert sweeps == [("compressors", [[], ["zstd", "zlib"]]), ("maxPoolSize", [10, None])]
+    combinations = sweep_settings({"maxPoolSize": 50, "minPoolSize": 1}, sweeps)
+    assert [settings for _, settings in combinations] == [
+        {"maxPoolSize": 10, "minPoolSize": 1, "compressors": []},
+        {"minPoolSize": 1, "compressors": []},
+        {"maxPoolSize": 10, "minPoolSize": 1, "compressors": ["zstd", "zlib"]},
+        {"minPoolSize": 1, "compressors": ["zstd", "zlib"]},
+    ]
+    assert combinations[0][0] == "compressors=[] maxPoolSize=10"
+    assert parse_sweep(["compression=lz4"]) == [("compression", ["lz4"])]
+    with pytest.raises(ValueError):
+        parse_sweep(["compression"])